@@ -3,7 +3,8 @@ Admin Module - Admin panel and operations
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import db
+from async_database import db
+from outbox import outbox
 from utils import (
     build_admin_keyboard, build_approval_keyboard, 
     build_admin_nav_keyboard, format_currency, format_datetime,
@@ -46,12 +47,12 @@ class AdminHandler:
             )
     
     @staticmethod
-    async def show_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Show admin dashboard with statistics"""
+    async def show_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE, fresh: bool = False):
+        """Show admin dashboard with statistics (fresh=True, from Refresh, skips the cached snapshot)"""
         query = update.callback_query
         await query.answer()
         
-        stats = db.get_stats()
+        stats = await db.get_stats(fresh=fresh)
         
         message = (
             "📊 **Admin Dashboard**\n\n"
@@ -68,7 +69,7 @@ class AdminHandler:
         keyboard = [[]]
         from telegram import InlineKeyboardButton, InlineKeyboardMarkup
         keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_dashboard")],
+            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_dashboard_refresh")],
             [InlineKeyboardButton("⬅️ Back", callback_data="admin_panel")]
         ]
         
@@ -86,7 +87,7 @@ class AdminHandler:
         
         try:
             # Get all sellers with their stats
-            sellers_stats = db.get_all_sellers_with_stats()
+            sellers_stats = await db.get_all_sellers_with_stats()
             
             if not sellers_stats or len(sellers_stats) == 0:
                 await query.edit_message_text(
@@ -175,16 +176,16 @@ class AdminHandler:
             )
     
     @staticmethod
-    async def approve_seller(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_id: int):
+    async def approve_seller(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_id: str):
         """Approve seller"""
         query = update.callback_query
         await query.answer("✅ Seller approved!")
         
         admin_id = update.effective_user.id
-        db.approve_seller(seller_id, admin_id, approved=True)
+        await db.approve_seller(seller_id, admin_id, approved=True)
         
         # Get seller info and notify
-        seller = db.get_seller_by_id(seller_id) if hasattr(db, 'get_seller_by_id') else None
+        seller = await db.get_seller_by_id(seller_id) if hasattr(db, 'get_seller_by_id') else None
         
         await query.edit_message_caption(
             caption="✅ **Seller Approved!**\n\nUser has been notified.",
@@ -195,13 +196,13 @@ class AdminHandler:
         await AdminHandler.show_pending_sellers(update, context)
     
     @staticmethod
-    async def reject_seller(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_id: int):
+    async def reject_seller(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_id: str):
         """Reject seller"""
         query = update.callback_query
         await query.answer("❌ Seller rejected!")
         
         admin_id = update.effective_user.id
-        db.approve_seller(seller_id, admin_id, approved=False)
+        await db.approve_seller(seller_id, admin_id, approved=False)
         
         await query.edit_message_caption(
             caption="❌ **Seller Rejected!**\n\nUser has been notified.",
@@ -218,7 +219,7 @@ class AdminHandler:
         
         try:
             # Get all sellers with their Gmail stats
-            sellers = db.get_all_sellers_with_stats()
+            sellers = await db.get_all_sellers_with_stats()
             
             if not sellers or len(sellers) == 0:
                 await query.edit_message_text(
@@ -284,15 +285,15 @@ class AdminHandler:
         await query.answer()
         
         try:
-            seller = db.get_seller(user_id)
-            user = db.get_user(user_id)
+            seller = await db.get_seller(user_id)
+            user = await db.get_user(user_id)
             
             if not seller:
                 await query.answer("Seller not found!", show_alert=True)
                 return
             
             # Get Gmail batches for this seller
-            batches = db.get_seller_gmail_batches(seller['seller_id'])
+            batches = await db.get_seller_gmail_batches(seller['seller_id'])
             
             username = user.get('username', 'Unknown') if user else 'Unknown'
             if username != 'Unknown':
@@ -309,7 +310,7 @@ class AdminHandler:
                     message += f"   Count: {batch['count']} | Status: {batch['status']}\n\n"
             
             # Get sold gmails info
-            sold_gmails = db.get_sold_gmails_by_seller(seller['seller_id'])
+            sold_gmails = await db.get_sold_gmails_by_seller(seller['seller_id'])
             if sold_gmails:
                 message += f"\n**Sold Gmails ({len(sold_gmails)}):**\n"
                 for gmail in sold_gmails[:3]:
@@ -341,7 +342,7 @@ class AdminHandler:
         await query.answer()
         
         try:
-            batches = db.get_pending_gmail_batches()
+            batches = await db.get_pending_gmail_batches()
             
             if not batches or len(batches) == 0:
                 await query.edit_message_text(
@@ -419,7 +420,7 @@ class AdminHandler:
         query = update.callback_query
         await query.answer("✅ Batch approved!")
         
-        db.approve_gmail_batch(batch_id, approved=True)
+        await db.approve_gmail_batch(batch_id, approved=True)
         
         await query.edit_message_text(
             f"✅ **Batch Approved!**\n\nGmails are now available for purchase.\n\n🆔 `{batch_id}`",
@@ -434,7 +435,7 @@ class AdminHandler:
         query = update.callback_query
         await query.answer("❌ Batch rejected!")
         
-        db.approve_gmail_batch(batch_id, approved=False)
+        await db.approve_gmail_batch(batch_id, approved=False)
         
         await query.edit_message_text(
             f"❌ **Batch Rejected!**\n\nSeller has been notified.\n\n🆔 `{batch_id}`",
@@ -450,7 +451,7 @@ class AdminHandler:
         await query.answer()
         
         # Get withdrawals only from sellers who have sold Gmails
-        withdrawals = db.get_pending_withdrawals_with_sales()
+        withdrawals = await db.get_pending_withdrawals_with_sales()
         
         if not withdrawals:
             await query.edit_message_text(
@@ -518,13 +519,13 @@ class AdminHandler:
             )
     
     @staticmethod
-    async def approve_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, withdrawal_id: int):
+    async def approve_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, withdrawal_id: str):
         """Approve withdrawal and mark as paid"""
         query = update.callback_query
         await query.answer("✅ Marked as paid!")
         
         admin_id = update.effective_user.id
-        db.process_withdrawal(withdrawal_id, admin_id, approved=True)
+        await db.process_withdrawal(withdrawal_id, admin_id, approved=True)
         
         await query.edit_message_caption(
             caption="✅ **Payment Processed!**\n\nSeller has been notified.",
@@ -534,13 +535,13 @@ class AdminHandler:
         await AdminHandler.show_pending_withdrawals(update, context)
     
     @staticmethod
-    async def reject_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, withdrawal_id: int):
+    async def reject_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE, withdrawal_id: str):
         """Reject withdrawal request"""
         query = update.callback_query
         await query.answer("❌ Withdrawal declined!")
         
         admin_id = update.effective_user.id
-        db.process_withdrawal(withdrawal_id, admin_id, approved=False)
+        await db.process_withdrawal(withdrawal_id, admin_id, approved=False)
         
         await query.edit_message_caption(
             caption="❌ **Withdrawal Declined!**\n\nSeller has been notified.",
@@ -555,7 +556,7 @@ class AdminHandler:
         query = update.callback_query
         await query.answer()
         
-        users = db.get_all_users()
+        users = await db.get_all_users()
         
         if not users:
             await query.edit_message_text(
@@ -570,7 +571,7 @@ class AdminHandler:
         # Show last 15 users to avoid message length limits
         for user in users[:15]:
             status = "🚫 Banned" if user.get('is_banned') else "✅ Active"
-            is_seller_data = db.get_seller(user['user_id'])
+            is_seller_data = await db.get_seller(user['user_id'])
             is_seller = "💼 Seller" if is_seller_data else "👤 Buyer"
             
             # Escape underscores in username for Markdown
@@ -598,7 +599,7 @@ class AdminHandler:
     @staticmethod
     async def manage_user(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Manage a specific user"""
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if not user:
             await update.message.reply_text("❌ User not found.")
             return
@@ -628,7 +629,7 @@ class AdminHandler:
         query = update.callback_query
         await query.answer("Processing...")
         
-        if db.ban_user(user_id, ban):
+        if await db.ban_user(user_id, ban):
             action = "banned" if ban else "unbanned"
             await query.edit_message_text(
                 text=f"✅ User `{user_id}` has been **{action}**.",
@@ -645,7 +646,7 @@ class AdminHandler:
         await query.answer()
         
         try:
-            sellers_awaiting_payment = db.get_sellers_awaiting_payment()
+            sellers_awaiting_payment = await db.get_sellers_awaiting_payment()
             
             if not sellers_awaiting_payment:
                 await query.edit_message_text(
@@ -732,4 +733,122 @@ class AdminHandler:
                 parse_mode='Markdown'
             )
 
+    @staticmethod
+    async def navigate_pending_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, step: int):
+        """Move to the previous (-1) or next (+1) pending payment"""
+        query = update.callback_query
+        payments = context.user_data.get('pending_payments', [])
+        index = context.user_data.get('payment_index', 0) + step
+        if 0 <= index < len(payments):
+            context.user_data['payment_index'] = index
+            await AdminHandler.display_pending_payment(query, payments[index], index, len(payments))
+
+    @staticmethod
+    async def mark_seller_paid(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_user_id: int):
+        """Mark all of a seller's sold Gmails as paid and notify them"""
+        query = update.callback_query
+        await query.answer("Processing payment...")
+        
+        # Mark all sold Gmails for this seller as paid
+        count = await db.mark_seller_gmails_as_paid(seller_user_id)
+        
+        if count > 0:
+            await query.edit_message_caption(
+                caption=f"✅ **Payment Confirmed!**\n\n{count} Gmail(s) marked as paid.\nSeller has been notified.",
+                parse_mode='Markdown'
+            )
+            
+            # Notify seller
+            outbox.send_message(
+                context.bot, seller_user_id,
+                "💸 **Payment Received!**\n\nYour payment has been processed by admin.\n"
+                f"Amount for {count} sold Gmail(s) has been cleared.\n\nThank you!"
+            )
+        else:
+            await query.answer("❌ No unpaid Gmails found for this seller.")
+
+    @staticmethod
+    async def request_payment_proof(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_user_id: int):
+        """Expect a payment screenshot for a seller as the admin's next photo"""
+        query = update.callback_query
+        context.user_data['awaiting_payment_proof'] = seller_user_id
+        await query.answer("📸 Please send the payment screenshot now", show_alert=True)
+        await query.message.reply_text(
+            f"📸 **Upload Payment Proof**\n\n"
+            f"Please send the payment screenshot for seller ID: `{seller_user_id}`\n\n"
+            f"The screenshot will be sent to the seller as proof of payment.",
+            parse_mode='Markdown'
+        )
+
+    @staticmethod
+    async def change_gmail_page(update: Update, context: ContextTypes.DEFAULT_TYPE, step: int):
+        """Page the pending Gmails list back (-1) or forward (+1)"""
+        page = context.user_data.get('gmail_page', 0)
+        context.user_data['gmail_page'] = max(0, page + step)
+        await AdminHandler.show_pending_gmails(update, context)
+
+    @staticmethod
+    async def complete_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE, ticket_id: int, ticket_user_id: int):
+        """Mark a support ticket resolved and notify the user"""
+        query = update.callback_query
+        await db.update_ticket_status(ticket_id, 'resolved', 'Ticket resolved by admin.')
+        await query.edit_message_text(
+            query.message.text + "\n\n✅ **RESOLVED**",
+            parse_mode='Markdown'
+        )
+        
+        # Notify user
+        outbox.send_message(
+            context.bot, ticket_user_id,
+            f"✅ **Ticket #{ticket_id} Resolved**\n\n"
+            "Your support ticket has been resolved.\n"
+            "Thank you for contacting us!",
+            parse_mode='Markdown'
+        )
+        await query.answer("Ticket resolved!")
+
+    @staticmethod
+    async def start_ticket_reply(update: Update, context: ContextTypes.DEFAULT_TYPE, ticket_id: int, ticket_user_id: int):
+        """Expect the admin's reply to a support ticket as their next message"""
+        query = update.callback_query
+        context.user_data['awaiting_ticket_reply'] = {'ticket_id': ticket_id, 'user_id': ticket_user_id}
+        await query.answer("Send your reply message now", show_alert=True)
+        await query.message.reply_text(
+            f"💬 **Reply to Ticket #{ticket_id}**\n\n"
+            f"Type your reply message for user `{ticket_user_id}`:\n\n"
+            "The message will be sent to the user via Telegram.",
+            parse_mode='Markdown'
+        )
+
+    @staticmethod
+    def register_routes(router):
+        """Add the admin panel's callback routes to a CallbackRouter"""
+        router.add("admin_panel", AdminHandler.show_admin_panel)
+        router.add("admin_dashboard", AdminHandler.show_dashboard)
+        router.add("admin_dashboard_refresh", AdminHandler.show_dashboard, defaults={'fresh': True})
+        router.add("admin_sellers", AdminHandler.show_pending_sellers)
+        router.add("admin_gmails", AdminHandler.show_pending_gmails)
+        router.add("admin_withdrawals", AdminHandler.show_pending_withdrawals)
+        router.add("admin_pending_payments", AdminHandler.show_pending_payments)
+        router.add("admin_users", AdminHandler.show_users)
+        router.add("pending_batches", AdminHandler.show_pending_batches)
+        router.add("payment_prev", AdminHandler.navigate_pending_payment, defaults={'step': -1})
+        router.add("payment_next", AdminHandler.navigate_pending_payment, defaults={'step': 1})
+        router.add("gmail_page_prev", AdminHandler.change_gmail_page, defaults={'step': -1})
+        router.add("gmail_page_next", AdminHandler.change_gmail_page, defaults={'step': 1})
+        router.add("mark_paid_<int:seller_user_id>", AdminHandler.mark_seller_paid)
+        router.add("upload_proof_<int:seller_user_id>", AdminHandler.request_payment_proof)
+        router.add("seller_gmails_<int:user_id>", AdminHandler.show_seller_gmails)
+        router.add("ticket_complete_<int:ticket_id>_<int:ticket_user_id>", AdminHandler.complete_ticket)
+        router.add("ticket_reply_<int:ticket_id>_<int:ticket_user_id>", AdminHandler.start_ticket_reply)
+        # Seller/withdrawal ids stay strings: SQLite matches them against its integer keys, MongoDB needs ObjectId text
+        router.add("approve_seller_<seller_id>", AdminHandler.approve_seller)
+        router.add("reject_seller_<seller_id>", AdminHandler.reject_seller)
+        router.add("approve_batch_<batch_id>", AdminHandler.approve_gmail_batch)
+        router.add("reject_batch_<batch_id>", AdminHandler.reject_gmail_batch)
+        router.add("approve_withdrawal_<withdrawal_id>", AdminHandler.approve_withdrawal)
+        router.add("reject_withdrawal_<withdrawal_id>", AdminHandler.reject_withdrawal)
+        router.add("ban_<int:user_id>", AdminHandler.toggle_ban, defaults={'ban': True})
+        router.add("unban_<int:user_id>", AdminHandler.toggle_ban, defaults={'ban': False})
+
 admin_handler = AdminHandler()
@@ -0,0 +1,45 @@
+"""
+Async data-access layer for the bot's asyncio handlers
+Every database method does blocking SQLite/pymongo I/O, so calling it from a
+handler stalls the event loop for every other user. AsyncDatabase exposes the
+same method surface as an awaitable and runs the call on a dedicated, bounded
+worker pool instead.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import config
+import storage
+
+
+class AsyncDatabase:
+    """Awaitable facade over a synchronous storage backend (Database / MongoDatabase)"""
+
+    def __init__(self, backend, max_workers: int = None):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.DB_EXECUTOR_WORKERS,
+            thread_name_prefix='db-worker'
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(attr, *args, **kwargs))
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool (pending calls finish first when wait=True)"""
+        self.executor.shutdown(wait=wait)
+
+
+# Global async database instance (wraps the configured storage backend)
+db = AsyncDatabase(storage.db)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Rebuild the revenue_daily rollup from existing transactions
+Run once after upgrading, or any time the rollup looks out of step.
+
+Usage: python backfill_revenue.py [--mongo]
+"""
+import argparse
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the revenue_daily analytics rollup")
+    parser.add_argument('--mongo', action='store_true', help="rebuild the MongoDB rollup instead of SQLite")
+    args = parser.parse_args()
+
+    if args.mongo:
+        from mongodb import db
+    else:
+        from database import db
+
+    days = db.rebuild_revenue_daily()
+    print(f"✓ revenue_daily rebuilt: {days} day(s) of successful transactions")
+    for label, window in db.get_time_based_analytics().items():
+        print(f"  {label:<8} ₹{window['total_amount']:.2f} across {window['count']} transaction(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Offline end-to-end throughput benchmark for the bot's update handlers
+Builds the real Application from bot.create_bot_application() on a fake Bot API
+transport, seeds a scratch database and replays scripted update streams from
+many simulated users at once:
+
+    buyers   /start -> 💰 Wallet -> 🛒 Buy Gmails -> buy_qty -> confirm_purchase
+    sellers  /start -> 📤 Sell Gmails -> Gmail list -> UPI QR photo
+    admins   /start -> ⚙️ Admin Panel -> dashboard -> pending batches -> approve batch (xN)
+
+Every Bot API call is answered locally (after --api-latency ms, to mimic the
+round-trip to Telegram) and counted, so nothing leaves the machine. Each user's
+updates go through Application.process_update in order, users run concurrently.
+Reports updates/sec and p50/p95/p99 latency per step, and exits non-zero if any
+handler raised.
+
+Usage:
+    python bench_bot_replay.py
+    python bench_bot_replay.py --buyers 5000 --sellers 500 --admins 5 --api-latency 30
+    python bench_bot_replay.py --mongo        # scratch database at MONGODB_URI (needs a replica set)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+import config
+
+BUYER_BASE = 100_000_000
+SELLER_BASE = 200_000_000
+ADMIN_BASE = 900_000_000
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Replay", "username": "replay_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+# Bot API methods that return True instead of a Message
+TRUE_RESULTS = {'answerCallbackQuery', 'deleteMessage', 'sendChatAction', 'setMyCommands',
+                'deleteWebhook', 'setWebhook', 'close', 'logOut'}
+# Stand-in for a downloaded UPI QR photo
+QR_IMAGE = b'\xff\xd8\xff\xe0' + b'\x00' * 256
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API transport that answers every call locally and counts them by method"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if '/file/bot' in url:
+            self.calls['(file download)'] += 1
+            return 200, QR_IMAGE
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint: str, params: dict):
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint == 'getFile':
+            return {"file_id": str(params.get('file_id')), "file_unique_id": "qr",
+                    "file_size": len(QR_IMAGE), "file_path": "photos/qr.jpg"}
+        if endpoint in TRUE_RESULTS:
+            return True
+        # sendMessage, editMessageText, sendPhoto, ...: echo back a plain message
+        text = params.get('text') or params.get('caption')
+        return {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": int(params.get('chat_id') or 0), "type": "private"},
+                "from": BOT_USER, "text": text if isinstance(text, str) else ""}
+
+
+class UpdateFactory:
+    """Builds Bot API update payloads for simulated private chats"""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Replay", "last_name": str(user_id),
+                "username": f"replay{user_id}"}
+
+    def _message(self, user_id: int, **fields) -> dict:
+        return {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), **fields}
+
+    def build(self, user_id: int, kind: str, payload: str = None) -> dict:
+        update = {"update_id": next(self._update_ids)}
+        if kind == 'message':
+            fields = {"text": payload}
+            if payload.startswith('/'):
+                fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(payload.split()[0])}]
+            update["message"] = self._message(user_id, **fields)
+        elif kind == 'photo':
+            update["message"] = self._message(user_id, photo=[
+                {"file_id": f"qr{user_id}", "file_unique_id": f"qr{user_id}", "width": 320, "height": 320}
+            ])
+        else:
+            update["callback_query"] = {
+                "id": str(update["update_id"]), "from": self._user(user_id), "chat_instance": str(user_id),
+                "data": payload,
+                "message": {"message_id": next(self._message_ids), "date": int(time.time()),
+                            "chat": {"id": user_id, "type": "private"}, "from": BOT_USER, "text": "menu"},
+            }
+        return update
+
+
+# ==================== SCRIPTS ====================
+# Each step is (label, kind, payload); a callable payload is awaited at replay
+# time and the step is skipped when it returns None.
+
+def buyer_script(quantity: int) -> list:
+    return [
+        ('/start', 'message', '/start'),
+        ('wallet', 'message', '💰 Wallet'),
+        ('buy menu', 'message', '🛒 Buy Gmails'),
+        ('buy_qty', 'callback', f'buy_qty_{quantity}'),
+        ('confirm_purchase', 'callback', f'confirm_purchase_{quantity}'),
+    ]
+
+
+def seller_script(user_id: int, count: int) -> list:
+    gmails = '\n'.join(f"replay{user_id}x{i}@gmail.com:password{i}" for i in range(count))
+    return [
+        ('/start', 'message', '/start'),
+        ('sell', 'message', '📤 Sell Gmails'),
+        ('gmail list', 'message', gmails),
+        ('upi qr', 'photo', None),
+    ]
+
+
+def admin_script(approvals: int, db) -> list:
+    async def next_batch():
+        batches = await db.get_pending_gmail_batches()
+        return f"approve_batch_{batches[0]['batch_id']}" if batches else None
+
+    return [
+        ('/start', 'message', '/start'),
+        ('admin panel', 'message', '⚙️ Admin Panel'),
+        ('admin_dashboard', 'callback', 'admin_dashboard'),
+        ('pending_batches', 'callback', 'pending_batches'),
+    ] + [('approve_batch', 'callback', next_batch)] * approvals
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def replay(app, factory: UpdateFactory, scripts: dict, timings: dict):
+    """Run every user's script concurrently, each user's updates strictly in order"""
+
+    async def run_user(user_id: int, script: list):
+        for label, kind, payload in script:
+            if callable(payload):
+                payload = await payload()
+                if payload is None:
+                    continue
+            update = Update.de_json(factory.build(user_id, kind, payload), app.bot)
+            started = time.perf_counter()
+            await app.process_update(update)
+            timings[label].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(run_user(user_id, script) for user_id, script in scripts.items()))
+
+
+def seed(backend, buyers: list, stock: int, balance: float):
+    """Available stock from a synthetic marketplace plus funded buyer accounts"""
+    from generate_data import Marketplace, populate
+
+    populate(backend, Marketplace(users=50, gmails=stock, pending=0, rejected=0, sold=0,
+                                  transactions=0, withdrawals=0, messages=0, tickets=0))
+    for user_id in buyers:
+        backend.create_user(user_id, f"replay{user_id}", "Replay Buyer")
+        backend.update_wallet(user_id, balance)
+
+
+async def run(args) -> int:
+    import bot
+    import storage
+    from async_database import db
+    from outbox import outbox
+
+    backend = storage.get_backend()
+    buyers = [BUYER_BASE + i for i in range(args.buyers)]
+    sellers = [SELLER_BASE + i for i in range(args.sellers)]
+    admins = config.ADMIN_IDS
+    seed(backend, buyers, args.stock or args.buyers * args.quantity, args.quantity * config.BUY_RATE)
+
+    scripts = {user_id: buyer_script(args.quantity) for user_id in buyers}
+    scripts.update({user_id: seller_script(user_id, args.gmails_per_seller) for user_id in sellers})
+    scripts.update({user_id: admin_script(args.approvals, db) for user_id in admins})
+
+    transport = FakeBotAPI(args.api_latency / 1000)
+    app = bot.create_bot_application(request=transport)
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(repr(context.error))
+    app.add_error_handler(count_error)
+
+    timings = defaultdict(list)
+    await app.initialize()
+    try:
+        started = time.perf_counter()
+        await replay(app, UpdateFactory(), scripts, timings)
+        elapsed = time.perf_counter() - started
+        # Notifications and deliveries queued by the handlers go out after them
+        await outbox.drain()
+        drained = time.perf_counter() - started - elapsed
+    finally:
+        await outbox.stop()
+        await app.shutdown()
+
+    total = sum(len(values) for values in timings.values())
+    print(f"  {len(scripts):,} users, {total:,} updates in {elapsed:.2f}s: {total / elapsed:,.0f} updates/sec")
+    print(f"  {'step':<18} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, values in timings.items():
+        values.sort()
+        print(f"  {label:<18} {len(values):>7,} {percentile(values, 50) * 1000:>9.1f} "
+              f"{percentile(values, 95) * 1000:>9.1f} {percentile(values, 99) * 1000:>9.1f}")
+    print(f"  Bot API calls: {sum(transport.calls.values()):,} "
+          f"({', '.join(f'{method} {count:,}' for method, count in transport.calls.most_common())})")
+    sent = outbox.stats()
+    print(f"  outbox: {sent['sent']:,} sent, {sent['failed']:,} failed, drained {drained:.2f}s after the last handler, "
+          f"queued-to-sent p50 {sent['latency_p50_ms']:.1f} ms / p95 {sent['latency_p95_ms']:.1f} ms")
+    print(f"  inventory after replay: {backend.get_inventory_counts()}")
+    for error in Counter(errors).most_common(5):
+        print(f"  ✗ {error[1]}x {error[0]}")
+    print("=" * 50)
+    print("REPLAY COMPLETE" if not errors else f"{len(errors)} HANDLER ERROR(S)")
+    return 1 if errors else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay scripted Telegram updates through the bot offline")
+    parser.add_argument('--buyers', type=int, default=1000)
+    parser.add_argument('--sellers', type=int, default=100)
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--quantity', type=int, default=5, help="Gmails each buyer purchases")
+    parser.add_argument('--gmails-per-seller', type=int, default=20)
+    parser.add_argument('--approvals', type=int, default=10, help="batches each admin approves")
+    parser.add_argument('--stock', type=int, help="available Gmails to seed (default: enough for every buyer)")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="simulated Bot API round-trip in ms")
+    parser.add_argument('--mongo', action='store_true', help="use a scratch MongoDB database at MONGODB_URI")
+    args = parser.parse_args()
+
+    cwd, tmp = os.getcwd(), tempfile.mkdtemp()
+    # Handlers save UPI QR downloads relative to the working directory
+    os.chdir(tmp)
+    # Never touch live data or Telegram: scratch storage and a dummy token
+    config.TELEGRAM_BOT_TOKEN = "123456:REPLAY"
+    config.ADMIN_IDS = [ADMIN_BASE + i for i in range(args.admins)]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_REPLAY"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "replay"
+    # The fake Bot API has no flood limits; lift the outbox's so draining it measures the queue alone
+    config.OUTBOX_GLOBAL_RATE = config.OUTBOX_CHAT_RATE = config.OUTBOX_GROUP_RATE = 1e6
+    config.OUTBOX_CHAT_BURST = 1000
+    if args.mongo:
+        config.STORAGE_BACKEND = 'mongodb'
+        config.DATABASE_NAME = f"{config.DATABASE_NAME}_replay"
+    else:
+        config.STORAGE_BACKEND = 'sqlite'
+        config.DATABASE_PATH = os.path.join(tmp, 'replay.db')
+
+    print("=" * 50)
+    print("BOT UPDATE REPLAY")
+    print("=" * 50)
+    try:
+        return asyncio.run(run(args))
+    finally:
+        if args.mongo:
+            import storage
+            storage.get_backend().client.drop_database(config.DATABASE_NAME)
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark get_users_with_stats: correlated per-user counts vs pre-aggregated joins
+Seeds a scratch database (50k users / 1M gmails by default), then times the
+previous per-user query shape against the current Database method, both for
+the full list and for one /api/users page. SQLite runs twice: with today's
+indexes, and with the gmails indexes the schema had before migration 0002.
+
+Usage:
+    python bench_users_with_stats.py                 # SQLite, temp file
+    python bench_users_with_stats.py --mongo         # MongoDB at MONGODB_URI, scratch database
+    python bench_users_with_stats.py --users 5000 --gmails 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import config
+from generate_data import Marketplace, populate
+
+PAGE_SIZE = 50
+
+# The per-user query shape get_users_with_stats used before pre-aggregation
+LEGACY_SQL = '''
+    SELECT
+        u.*,
+        (SELECT COUNT(*) FROM gmails WHERE buyer_id = u.user_id) as total_bought,
+        (SELECT COUNT(*) FROM gmails g JOIN sellers s ON g.seller_id = s.seller_id WHERE s.user_id = u.user_id) as total_provided,
+        (SELECT COUNT(*) FROM gmails g JOIN sellers s ON g.seller_id = s.seller_id WHERE s.user_id = u.user_id AND g.status = 'sold') as total_sold
+    FROM users u
+    ORDER BY u.created_at DESC, u.user_id DESC
+'''
+
+# gmails indexes as they were before migrations 0002/0003
+BASELINE_INDEXES_SQL = '''
+    DROP INDEX IF EXISTS idx_gmails_buyer_sold;
+    DROP INDEX IF EXISTS idx_gmails_seller_status_sold;
+    DROP INDEX IF EXISTS idx_gmails_seller_batch;
+    DROP INDEX IF EXISTS idx_gmails_available;
+    DROP INDEX IF EXISTS idx_gmails_pending_batch;
+    DROP INDEX IF EXISTS idx_gmails_sold;
+    CREATE INDEX IF NOT EXISTS idx_gmails_status ON gmails(status);
+    CREATE INDEX IF NOT EXISTS idx_gmails_seller ON gmails(seller_id);
+    CREATE INDEX IF NOT EXISTS idx_gmails_buyer ON gmails(buyer_id);
+    ANALYZE;
+'''
+
+LEGACY_PIPELINE = [
+    {"$lookup": {
+        "from": "gmails",
+        "let": {"user_id": "$user_id"},
+        "pipeline": [{"$match": {"$expr": {"$eq": ["$buyer_id", "$$user_id"]}}}],
+        "as": "purchases"
+    }},
+    {"$lookup": {"from": "sellers", "localField": "user_id", "foreignField": "user_id", "as": "seller_info"}},
+    {"$lookup": {
+        "from": "gmails",
+        "let": {"seller_id_obj": {"$arrayElemAt": ["$seller_info._id", 0]}},
+        "pipeline": [{"$match": {"$expr": {"$eq": ["$seller_id", "$$seller_id_obj"]}}}],
+        "as": "provisions"
+    }},
+    {"$project": {
+        "user_id": 1,
+        "total_bought": {"$size": "$purchases"},
+        "total_provided": {"$size": "$provisions"},
+        "total_sold": {"$size": {"$filter": {"input": "$provisions", "cond": {"$eq": ["$$this.status", "sold"]}}}}
+    }}
+]
+
+
+def best_of(fn, runs: int = 3) -> float:
+    """Fastest wall-clock time of fn() in seconds"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def report(label: str, legacy: float, current: float):
+    speedup = legacy / current if current else float('inf')
+    print(f"  {label:<12} legacy {legacy * 1000:>10.1f} ms   current {current * 1000:>10.1f} ms   ({speedup:.1f}x)")
+
+
+def bench_sqlite(users: int, gmails: int):
+    tmp = tempfile.mkdtemp()
+    config.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+    from database import Database
+
+    db = Database(config.DATABASE_PATH)
+    print(f"Seeding SQLite: {users:,} users / {gmails:,} gmails ...")
+    started = time.perf_counter()
+    populate(db, Marketplace(users=users, gmails=gmails))
+    print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    def legacy(limit=None):
+        conn = db.get_connection()
+        try:
+            sql = LEGACY_SQL + (f' LIMIT {limit}' if limit else '')
+            # Same row conversion as the Database method so only the query differs
+            return [dict(row) for row in conn.execute(sql).fetchall()]
+        finally:
+            conn.close()
+
+    stats_key = lambda row: (row['user_id'], row['total_bought'], row['total_provided'], row['total_sold'])
+    if [stats_key(row) for row in legacy()] != [stats_key(row) for row in db.get_users_with_stats()]:
+        print("  ✗ results differ from the legacy query")
+        return 1
+
+    for label in ("current indexes", "pre-0002 gmails indexes"):
+        if label != "current indexes":
+            conn = db.get_connection()
+            try:
+                conn.executescript(BASELINE_INDEXES_SQL)
+            finally:
+                conn.close()
+        print(f"get_users_with_stats (SQLite, {label})")
+        report("full list", best_of(legacy), best_of(db.get_users_with_stats))
+        report(f"page of {PAGE_SIZE}", best_of(lambda: legacy(PAGE_SIZE)),
+               best_of(lambda: db.get_users_with_stats(limit=PAGE_SIZE)))
+    db.pool.close_all()
+    return 0
+
+
+def bench_mongo(users: int, gmails: int):
+    # Never touch the live database: seed a throwaway one next to it
+    config.DATABASE_NAME = f"{config.DATABASE_NAME}_bench"
+    import mongodb
+
+    db = mongodb.db
+    db.client.drop_database(config.DATABASE_NAME)
+    db = mongodb.MongoDatabase()
+    print(f"Seeding MongoDB ({config.DATABASE_NAME}): {users:,} users / {gmails:,} gmails ...")
+    started = time.perf_counter()
+    populate(db, Marketplace(users=users, gmails=gmails))
+    print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    def legacy():
+        pipeline = [{"$sort": {"created_at": -1}}, {"$limit": PAGE_SIZE}] + LEGACY_PIPELINE
+        return list(db.users.aggregate(pipeline))
+
+    print("get_users_with_stats (MongoDB)")
+    # The legacy pipeline scans gmails once per user; the full list is impractical at this size
+    report(f"page of {PAGE_SIZE}", best_of(legacy, 1), best_of(lambda: db.get_users_with_stats(limit=PAGE_SIZE)))
+    print(f"  full list    current {best_of(db.get_users_with_stats, 1) * 1000:>10.1f} ms")
+    db.client.drop_database(config.DATABASE_NAME)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark get_users_with_stats")
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--gmails', type=int, default=1000000)
+    parser.add_argument('--mongo', action='store_true', help="benchmark MongoDB (scratch database at MONGODB_URI)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("GET_USERS_WITH_STATS BENCHMARK")
+    print("=" * 50)
+    if args.mongo:
+        return bench_mongo(args.users, args.gmails)
+    return bench_sqlite(args.users, args.gmails)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
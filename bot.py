@@ -6,11 +6,12 @@ from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
     filters, ContextTypes
 )
+from telegram.request import BaseRequest
 
 import io
 import qrcode
 import config
-from database import db
+from async_database import db
 from utils import (
     build_main_menu, welcome_message, help_message,
     build_wallet_keyboard, build_amount_keyboard, build_my_activity_keyboard,
@@ -20,6 +21,10 @@ from payment import payment_manager
 from seller import seller_handler
 from buyer import buyer_handler
 from admin import admin_handler
+from update_processor import PerUserUpdateProcessor
+from router import CallbackRouter
+from outbox import outbox
+from payment_scheduler import payment_scheduler
 
 # Enable logging
 logging.basicConfig(
@@ -35,7 +40,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Create or update user
-    db.create_user(user.id, user.username or str(user.id), user.full_name or "User")
+    await db.create_user(user.id, user.username or str(user.id), user.full_name or "User")
     
     # Check if admin
     is_admin = admin_handler.is_admin(user.id)
@@ -51,64 +56,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = update.message.text
     
-    # Check if it's a menu button press - these should ALWAYS work, interrupting any flow
-    menu_buttons = ["💰 Wallet", "🛒 Buy Gmails", "📤 Sell Gmails", "📊 My Activity", "ℹ️ Help", "⬅️ Back", "⚙️ Admin Panel"]
-    if text in menu_buttons:
-        # For Buy and Sell, don't clear state - they set their own state
-        # For other menu buttons, clear state to interrupt flows
-        if text not in ["🛒 Buy Gmails", "📤 Sell Gmails"]:
-            # Clear all pending states
+    # Menu button presses ALWAYS work, interrupting any flow
+    menu_handler = MENU_ROUTES.get(text)
+    if menu_handler:
+        # Other buttons clear pending states to interrupt flows
+        if text not in MENU_KEEPS_STATE:
             for key in ['seller_step', 'withdrawal_step', 'awaiting_custom_amount', 'awaiting_quantity', 'awaiting_support_message', 'buy_quantity', 'pending_payment']:
                 context.user_data.pop(key, None)
-        
-        # Handle the menu button
-        if text == "💰 Wallet":
-            await show_wallet(update, context)
-            return
-        elif text == "🛒 Buy Gmails":
-            await buyer_handler.show_buy_menu(update, context)
-            return
-        elif text == "📤 Sell Gmails":
-            await seller_handler.start_selling(update, context)
-            return
-        elif text == "📊 My Activity":
-            await show_my_activity(update, context)
-            return
-        elif text == "ℹ️ Help":
-            await update.message.reply_text(help_message(), parse_mode='Markdown')
-            return
-        elif text == "⬅️ Back":
-            await update.message.reply_text(
-                welcome_message(),
-                reply_markup=build_main_menu(admin_handler.is_admin(user_id)),
-                parse_mode='Markdown'
-            )
-            return
-        elif text == "🎫 Create Ticket":
-            context.user_data['ticket_step'] = 1
-            await update.message.reply_text(
-                "🎫 **Create Support Ticket**\n\n"
-                "Please enter the **subject** of your issue:\n"
-                "(e.g., 'Payment Issue', 'Gmail Problem', 'Account Help')",
-                parse_mode='Markdown'
-            )
-            return
-
-        elif text == "❌ Cancel Payment":
-            # Cancel any pending payment
-            if context.user_data.get('pending_payment'):
-                order_id = context.user_data.pop('pending_payment')
-                await payment_manager.cancel_payment(order_id)
-                await update.message.reply_text(
-                    "✅ Payment cancelled successfully!",
-                    reply_markup=build_main_menu(admin_handler.is_admin(user_id))
-                )
-            else:
-                await update.message.reply_text("ℹ️ No active payment to cancel.")
-            return
-        elif text == "⚙️ Admin Panel":
-            await admin_handler.show_admin_panel(update, context)
-            return
+        await menu_handler(update, context)
+        return
     
     # Now handle awaiting states (only if NOT a menu button)
     if context.user_data.get('seller_step') == 1:
@@ -139,11 +95,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Support message check
     if context.user_data.get('awaiting_support_message'):
         message = update.message.text
-        if db.save_support_message(user_id, message):
+        if await db.save_support_message(user_id, message):
             await update.message.reply_text("✅ Message sent successfully! Admin will review it soon.")
-            for admin_id in config.ADMIN_IDS:
-                try: await context.bot.send_message(admin_id, f"✉️ **New Support Message**\n\n👤 User ID: `{user_id}`\n💬 Message: {message}", parse_mode='Markdown')
-                except: pass
+            outbox.notify_admins(context.bot, f"✉️ **New Support Message**\n\n👤 User ID: `{user_id}`\n💬 Message: {message}", parse_mode='Markdown')
         else:
             await update.message.reply_text("❌ Failed to send message. Please try again.")
         context.user_data.pop('awaiting_support_message', None)
@@ -157,24 +111,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_text = update.message.text
         
         # Update ticket in database
-        db.update_ticket_status(ticket_id, 'resolved', reply_text)
+        await db.update_ticket_status(ticket_id, 'resolved', reply_text)
         
         # Send reply to user
-        try:
-            await context.bot.send_message(
-                ticket_user_id,
-                f"💬 **Reply to Ticket #{ticket_id}**\n\n"
-                f"Admin says:\n{reply_text}\n\n"
-                "Thank you for contacting support!",
-                parse_mode='Markdown'
-            )
-            await update.message.reply_text(
-                f"✅ Reply sent to user `{ticket_user_id}`!\n"
-                f"Ticket #{ticket_id} marked as resolved.",
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            await update.message.reply_text(f"❌ Failed to send reply: {e}")
+        async def reply_failed(error):
+            outbox.send_message(context.bot, user_id, f"❌ Failed to send reply to ticket #{ticket_id}: {error}")
+        
+        outbox.send_message(
+            context.bot, ticket_user_id,
+            f"💬 **Reply to Ticket #{ticket_id}**\n\n"
+            f"Admin says:\n{reply_text}\n\n"
+            "Thank you for contacting support!",
+            on_failure=reply_failed,
+            parse_mode='Markdown'
+        )
+        await update.message.reply_text(
+            f"✅ Reply sent to user `{ticket_user_id}`!\n"
+            f"Ticket #{ticket_id} marked as resolved.",
+            parse_mode='Markdown'
+        )
         return
 
     # Support ticket creation flow
@@ -194,7 +149,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         subject = context.user_data.pop('ticket_subject', 'No Subject')
         context.user_data.pop('ticket_step', None)
         
-        ticket_id = db.create_support_ticket(user_id, subject, text)
+        ticket_id = await db.create_support_ticket(user_id, subject, text)
         
         await update.message.reply_text(
             f"✅ **Ticket Created!**\n\n"
@@ -215,18 +170,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ]
         ])
         
-        for admin_id in config.ADMIN_IDS:
-            try:
-                await context.bot.send_message(
-                    admin_id,
-                    f"🎫 **New Support Ticket #{ticket_id}**\n\n"
-                    f"👤 User: `{user_id}`\n"
-                    f"📋 Subject: {subject}\n"
-                    f"💬 Message: {text[:300]}",
-                    reply_markup=admin_keyboard,
-                    parse_mode='Markdown'
-                )
-            except: pass
+        outbox.notify_admins(
+            context.bot,
+            f"🎫 **New Support Ticket #{ticket_id}**\n\n"
+            f"👤 User: `{user_id}`\n"
+            f"📋 Subject: {subject}\n"
+            f"💬 Message: {text[:300]}",
+            reply_markup=admin_keyboard,
+            parse_mode='Markdown'
+        )
         return
 
 
@@ -271,7 +223,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         photo = update.message.photo[-1]
         
         # Mark as paid
-        count = db.mark_seller_gmails_as_paid(seller_user_id)
+        count = await db.mark_seller_gmails_as_paid(seller_user_id)
         
         # Send confirmation to admin
         await update.message.reply_text(
@@ -283,20 +235,20 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Forward screenshot to seller with message
-        try:
-            await context.bot.send_photo(
-                chat_id=seller_user_id,
-                photo=photo.file_id,
-                caption="💸 **Payment Received!**\n\n"
-                        "Your payment has been processed by admin.\n"
-                        f"Amount for {count} sold Gmail(s) has been cleared.\n\n"
-                        "📸 Payment proof attached above.\n"
-                        "Thank you for selling on our platform!",
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            print(f"Failed to notify seller: {e}")
-            await update.message.reply_text(f"⚠️ Could not notify seller: {e}")
+        async def notify_failed(error):
+            outbox.send_message(context.bot, user_id, f"⚠️ Could not notify seller `{seller_user_id}`: {error}",
+                                parse_mode='Markdown')
+        
+        outbox.send_photo(
+            context.bot, seller_user_id, photo.file_id,
+            on_failure=notify_failed,
+            caption="💸 **Payment Received!**\n\n"
+                    "Your payment has been processed by admin.\n"
+                    f"Amount for {count} sold Gmail(s) has been cleared.\n\n"
+                    "📸 Payment proof attached above.\n"
+                    "Thank you for selling on our platform!",
+            parse_mode='Markdown'
+        )
         
         return
     
@@ -337,7 +289,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show wallet information"""
     user_id = update.effective_user.id
-    balance = db.get_wallet_balance(user_id)
+    balance = await db.get_wallet_balance(user_id)
     
     message = (
         f"💰 **Your Wallet**\n\n"
@@ -427,8 +379,10 @@ async def initiate_direct_payment(update: Update, context: ContextTypes.DEFAULT_
             reply_markup=build_payment_mode_keyboard()
         )
         
-        # Monitor for payment success
-        asyncio.create_task(monitor_payment(context, user_id, order_id, sent_msg.message_id))
+        # Watch for the payment (one scheduler checks every pending order)
+        async def on_result(status: str):
+            await payment_result(context, user_id, order_id, sent_msg.message_id, status)
+        payment_scheduler.watch(order_id, on_result)
             
     except Exception as e:
         logger.error(f"Failed to create payment: {e}")
@@ -486,89 +440,64 @@ async def run_qr_timer(context, chat_id, message_id, duration):
     except Exception:
         pass
 
-async def monitor_payment(context: ContextTypes.DEFAULT_TYPE, user_id: int, order_id: str, message_id: int, qr_path: str = None):
-    """Monitor payment status and update message"""
-    import time
-    start_time = time.time()
-    timeout = config.PAYMENT_TIMEOUT
-    
-    while time.time() - start_time < timeout:
-        if context.user_data.get('pending_payment') != order_id:
-            return
+async def payment_result(context: ContextTypes.DEFAULT_TYPE, user_id: int, order_id: str, message_id: int,
+                         status: str):
+    """Tell the user how a watched top-up ended (called by payment_scheduler)"""
+    if status == 'SUCCESS':
+        # Status was just fetched: credit without asking Cashfree again
+        verified = await payment_manager.verify_payment(order_id, status='SUCCESS')
         
-        # Check payment status
-        result = await payment_manager.check_payment_status(order_id)
-        
-        if result.get('success') and result.get('status') == 'SUCCESS':
-            # Payment successful
-            verified = await payment_manager.verify_payment(order_id)
+        if verified:
+            txn = await db.get_transaction_by_order_id(order_id)
             
-            if verified:
-                txn = db.get_transaction_by_order_id(order_id)
-                
-                # Try to delete the QR message if it still exists
-                try:
-                    await context.bot.delete_message(chat_id=user_id, message_id=message_id)
-                except:
-                    pass
-                
-                # Send FRESH success message with details
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=(
-                        f"✅ **Payment Successful!**\n"
-                        f"👤 Paid to: **OTT4YOU**\n"
-                        f"💰 Amount: {format_currency(txn['amount'])}\n"
-                        f"🆔 Transaction ID: `{txn['txn_id']}`\n"
-                        f"📅 Date: {str(txn['created_at'])[:16]}\n\n"
-                        f"Funds have been added to your wallet!"
-                    ),
-                    parse_mode='Markdown'
-                )
-                context.user_data.pop('pending_payment', None)
-                return
-        
-        elif result.get('status') == 'FAILED':
-            # Payment failed
+            # Try to delete the QR message if it still exists
             try:
-                await context.bot.edit_message_caption(
-                    chat_id=user_id,
-                    message_id=message_id,
-                    caption="❌ **Payment Failed**\n\nThe payment was declined or failed. Please try again."
-                )
+                await context.bot.delete_message(chat_id=user_id, message_id=message_id)
             except:
-                # If QR message deleted, maybe send a text? User said "I DONT NEED ANY ERROR", so maybe silent is okay?
-                # But let's notify if possible.
-                await context.bot.send_message(chat_id=user_id, text="❌ **Payment Failed**")
-                
-            context.user_data.pop('pending_payment', None)
-            return
-        
-        await asyncio.sleep(5)
+                pass
+            
+            # Send FRESH success message with details, directly: the wallet has been
+            # credited, so this must not be dropped by a full outbox queue
+            await context.bot.send_message(
+                user_id,
+                f"✅ **Payment Successful!**\n"
+                f"👤 Paid to: **OTT4YOU**\n"
+                f"💰 Amount: {format_currency(txn['amount'])}\n"
+                f"🆔 Transaction ID: `{txn['txn_id']}`\n"
+                f"📅 Date: {str(txn['created_at'])[:16]}\n\n"
+                f"Funds have been added to your wallet!",
+                parse_mode='Markdown'
+            )
     
-    # Timeout
-    await payment_manager.cancel_payment(order_id)
-    try:
-        await context.bot.delete_message(chat_id=user_id, message_id=message_id)
-    except:
-        pass
+    elif status == 'FAILED':
+        # Payment failed
+        try:
+            await context.bot.edit_message_text(
+                "❌ **Payment Failed**\n\nThe payment was declined or failed. Please try again.",
+                chat_id=user_id,
+                message_id=message_id,
+                parse_mode='Markdown'
+            )
+        except:
+            outbox.send_message(context.bot, user_id, "❌ **Payment Failed**", parse_mode='Markdown')
+    
+    elif status == 'TIMEOUT':
+        await payment_manager.cancel_payment(order_id)
+        try:
+            await context.bot.delete_message(chat_id=user_id, message_id=message_id)
+        except:
+            pass
         
-    # Send timeout notification
-    await context.bot.send_message(
-        chat_id=user_id,
-        text="⏱️ **Payment Timeout**\n\nThe payment request has expired.",
-        parse_mode='Markdown'
-    )
-    context.user_data.pop('pending_payment', None)
+        # Send timeout notification
+        outbox.send_message(
+            context.bot, user_id,
+            "⏱️ **Payment Timeout**\n\nThe payment request has expired.",
+            parse_mode='Markdown'
+        )
     
-    # Timeout
-    await payment_manager.cancel_payment(order_id)
-    await context.bot.edit_message_text(
-        "⏱️ **Payment Timeout**\n\nThe payment link has expired. Please try again.",
-        chat_id=user_id,
-        message_id=message_id
-    )
-    context.user_data.pop('pending_payment', None)
+    # CANCELLED: the user already got "Payment cancelled"
+    if context.user_data.get('pending_payment') == order_id:
+        context.user_data.pop('pending_payment', None)
 
 async def handle_custom_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle custom amount input"""
@@ -604,7 +533,7 @@ async def show_transaction_history(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     
     user_id = update.effective_user.id
-    txns = db.get_user_transactions(user_id, 10)
+    txns = await db.get_user_transactions(user_id, 10)
     
     if not txns:
         await query.edit_message_text("📜 No transactions yet!")
@@ -638,261 +567,145 @@ async def show_my_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
 
-# ==================== CALLBACK QUERY HANDLER ====================
+# ==================== MENU BUTTONS ====================
 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all callback queries"""
-    query = update.callback_query
-    data = query.data
-    user_id = query.from_user.id
-    
-    # Wallet callbacks
-    if data == "wallet_add":
-        await show_add_money(update, context)
-    elif data == "wallet_history":
-        await show_transaction_history(update, context)
-    elif data.startswith("amount_"):
-        if data == "amount_custom":
-            await query.answer()
-            context.user_data['awaiting_custom_amount'] = True
-            await query.edit_message_text(
-                f"✏️ Enter custom amount ({format_currency(config.MIN_WALLET_ADD)} - {format_currency(config.MAX_WALLET_ADD)}):",
-                reply_markup=InlineKeyboardMarkup([[]])  # Empty keyboard
-            )
-        else:
-            amount = int(data.split('_')[1])
-            await initiate_direct_payment(update, context, amount)
-    elif data.startswith("cancel_payment_"):
-        order_id = data.replace("cancel_payment_", "")
+async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(help_message(), parse_mode='Markdown')
+
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(
+        welcome_message(),
+        reply_markup=build_main_menu(admin_handler.is_admin(update.effective_user.id)),
+        parse_mode='Markdown'
+    )
+
+async def start_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['ticket_step'] = 1
+    await update.message.reply_text(
+        "🎫 **Create Support Ticket**\n\n"
+        "Please enter the **subject** of your issue:\n"
+        "(e.g., 'Payment Issue', 'Gmail Problem', 'Account Help')",
+        parse_mode='Markdown'
+    )
+
+async def cancel_pending_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if context.user_data.get('pending_payment'):
+        order_id = context.user_data.pop('pending_payment')
         await payment_manager.cancel_payment(order_id)
-        context.user_data.pop('pending_payment', None)
-        
-        # Delete the payment message entirely
-        try:
-            await query.message.delete()
-        except:
-            pass
-        
-        # Send new message with restored keyboard
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="✅ Payment cancelled successfully!",
+        payment_scheduler.discard(order_id)
+        await update.message.reply_text(
+            "✅ Payment cancelled successfully!",
             reply_markup=build_main_menu(admin_handler.is_admin(user_id))
         )
+    else:
+        await update.message.reply_text("ℹ️ No active payment to cancel.")
+
+# Reply-keyboard buttons -> handler, looked up before any awaiting state
+MENU_ROUTES = {
+    "💰 Wallet": show_wallet,
+    "🛒 Buy Gmails": buyer_handler.show_buy_menu,
+    "📤 Sell Gmails": seller_handler.start_selling,
+    "📊 My Activity": show_my_activity,
+    "ℹ️ Help": show_help,
+    "⬅️ Back": show_main_menu,
+    "🎫 Create Ticket": start_ticket,
+    "❌ Cancel Payment": cancel_pending_payment,
+    "⚙️ Admin Panel": admin_handler.show_admin_panel,
+}
+# Buttons that manage their own state (Cancel Payment needs pending_payment)
+MENU_KEEPS_STATE = {"🛒 Buy Gmails", "📤 Sell Gmails", "❌ Cancel Payment"}
+
+# ==================== CALLBACK QUERY HANDLER ====================
+
+async def ask_custom_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Prompt for a custom wallet top-up amount"""
+    query = update.callback_query
+    await query.answer()
+    context.user_data['awaiting_custom_amount'] = True
+    await query.edit_message_text(
+        f"✏️ Enter custom amount ({format_currency(config.MIN_WALLET_ADD)} - {format_currency(config.MAX_WALLET_ADD)}):",
+        reply_markup=InlineKeyboardMarkup([[]])  # Empty keyboard
+    )
+
+async def cancel_direct_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id: str):
+    """Cancel a pending wallet top-up from its payment message"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    await payment_manager.cancel_payment(order_id)
+    payment_scheduler.discard(order_id)
+    context.user_data.pop('pending_payment', None)
     
-    # Buy callbacks
-    elif data == "buy_gmails":
-        await buyer_handler.show_buy_menu(update, context)
-    elif data.startswith("buy_qty_"):
-        qty = int(data.split('_')[2])
-        await buyer_handler.handle_quantity_selection(update, context, qty)
-    elif data == "buy_custom":
-        await buyer_handler.handle_custom_quantity(update, context)
-    elif data.startswith("confirm_purchase_"):
-        await buyer_handler.process_purchase(update, context)
-    
-    # Activity callbacks
-    elif data == "my_activity":
-        await show_my_activity(update, context)
-    elif data == "activity_purchases":
-        await buyer_handler.show_purchases(update, context)
-    elif data == "activity_sales":
-        await seller_handler.show_sales_stats(update, context)
-    elif data == "activity_withdrawals" or data == "withdrawal_request":
-        await seller_handler.request_withdrawal(update, context)
-    
-    # Seller callbacks
-    elif data == "seller_submit":
-        await seller_handler.submit_for_approval(update, context)
-    
-    # Admin callbacks
-    elif data == "admin_panel":
-        await admin_handler.show_admin_panel(update, context)
-    elif data == "admin_dashboard":
-        await admin_handler.show_dashboard(update, context)
-    elif data == "admin_sellers":
-        await admin_handler.show_pending_sellers(update, context)
-    elif data == "admin_gmails":
-        await admin_handler.show_pending_gmails(update, context)
-    elif data == "admin_withdrawals":
-        await admin_handler.show_pending_withdrawals(update, context)
-    elif data == "admin_pending_payments":
-        await admin_handler.show_pending_payments(update, context)
-    elif data == "payment_prev":
-        # Navigate to previous pending payment
-        payments = context.user_data.get('pending_payments', [])
-        index = context.user_data.get('payment_index', 0)
-        if index > 0:
-            context.user_data['payment_index'] = index - 1
-            await admin_handler.display_pending_payment(query, payments[index - 1], index - 1, len(payments))
-    elif data == "payment_next":
-        # Navigate to next pending payment
-        payments = context.user_data.get('pending_payments', [])
-        index = context.user_data.get('payment_index', 0)
-        if index < len(payments) - 1:
-            context.user_data['payment_index'] = index + 1
-            await admin_handler.display_pending_payment(query, payments[index + 1], index + 1, len(payments))
-    elif data.startswith("mark_paid_"):
-        # Mark seller as paid
-        seller_user_id = int(data.replace("mark_paid_", ""))
-        await query.answer("Processing payment...")
-        
-        # Mark all sold Gmails for this seller as paid
-        count = db.mark_seller_gmails_as_paid(seller_user_id)
-        
-        if count > 0:
-            await query.edit_message_caption(
-                caption=f"✅ **Payment Confirmed!**\n\n{count} Gmail(s) marked as paid.\nSeller has been notified.",
-                parse_mode='Markdown'
-            )
-            
-            # Notify seller
-            try:
-                await context.bot.send_message(
-                    chat_id=seller_user_id,
-                    text="💸 **Payment Received!**\n\nYour payment has been processed by admin.\n"
-                         f"Amount for {count} sold Gmail(s) has been cleared.\n\nThank you!"
-                )
-            except:
-                pass
-        else:
-            await query.answer("❌ No unpaid Gmails found for this seller.")
-    
-    # Gmail section pagination and navigation
-    elif data == "gmail_page_prev":
-        page = context.user_data.get('gmail_page', 0)
-        if page > 0:
-            context.user_data['gmail_page'] = page - 1
-        await admin_handler.show_pending_gmails(update, context)
-    elif data == "gmail_page_next":
-        page = context.user_data.get('gmail_page', 0)
-        context.user_data['gmail_page'] = page + 1
-        await admin_handler.show_pending_gmails(update, context)
-    elif data.startswith("seller_gmails_"):
-        user_id = int(data.replace("seller_gmails_", ""))
-        await admin_handler.show_seller_gmails(update, context, user_id)
-    elif data == "pending_batches":
-        await admin_handler.show_pending_batches(update, context)
-    
-    # Payment proof upload - set state to expect photo
-    elif data.startswith("upload_proof_"):
-        seller_user_id = int(data.replace("upload_proof_", ""))
-        context.user_data['awaiting_payment_proof'] = seller_user_id
-        await query.answer("📸 Please send the payment screenshot now", show_alert=True)
-        await query.message.reply_text(
-            f"📸 **Upload Payment Proof**\n\n"
-            f"Please send the payment screenshot for seller ID: `{seller_user_id}`\n\n"
-            f"The screenshot will be sent to the seller as proof of payment.",
-            parse_mode='Markdown'
-        )
-    
-    # Ticket Complete button - mark as resolved and notify user
-    elif data.startswith("ticket_complete_"):
-        parts = data.split("_")
-        ticket_id = int(parts[2])
-        ticket_user_id = int(parts[3])
-        
-        db.update_ticket_status(ticket_id, 'resolved', 'Ticket resolved by admin.')
-        await query.edit_message_text(
-            query.message.text + "\n\n✅ **RESOLVED**",
-            parse_mode='Markdown'
-        )
-        
-        # Notify user
-        try:
-            await context.bot.send_message(
-                ticket_user_id,
-                f"✅ **Ticket #{ticket_id} Resolved**\n\n"
-                "Your support ticket has been resolved.\n"
-                "Thank you for contacting us!",
-                parse_mode='Markdown'
-            )
-        except: pass
-        await query.answer("Ticket resolved!")
-    
-    # Ticket Reply button - set state to expect reply message
-    elif data.startswith("ticket_reply_"):
-        parts = data.split("_")
-        ticket_id = int(parts[2])
-        ticket_user_id = int(parts[3])
-        
-        context.user_data['awaiting_ticket_reply'] = {'ticket_id': ticket_id, 'user_id': ticket_user_id}
-        await query.answer("Send your reply message now", show_alert=True)
-        await query.message.reply_text(
-            f"💬 **Reply to Ticket #{ticket_id}**\n\n"
-            f"Type your reply message for user `{ticket_user_id}`:\n\n"
-            "The message will be sent to the user via Telegram.",
-            parse_mode='Markdown'
-        )
+    # Delete the payment message entirely
+    try:
+        await query.message.delete()
+    except:
+        pass
     
+    # Send new message with restored keyboard
+    await context.bot.send_message(
+        chat_id=user_id,
+        text="✅ Payment cancelled successfully!",
+        reply_markup=build_main_menu(admin_handler.is_admin(user_id))
+    )
 
-    elif data.startswith("approve_seller_"):
-
-
-        seller_id = int(data.split('_')[2])
-        await admin_handler.approve_seller(update, context, seller_id)
-    elif data.startswith("reject_seller_"):
-        seller_id = int(data.split('_')[2])
-        await admin_handler.reject_seller(update, context, seller_id)
-    elif data.startswith("approve_batch_"):
-        batch_id = data.replace("approve_batch_", "")
-        await admin_handler.approve_gmail_batch(update, context, batch_id)
-    elif data.startswith("reject_batch_"):
-        batch_id = data.replace("reject_batch_", "")
-        await admin_handler.reject_gmail_batch(update, context, batch_id)
-    elif data == "admin_users":
-        await admin_handler.show_users(update, context)
-    elif data.startswith("ban_"):
-        user_id = int(data.split('_')[1])
-        await admin_handler.toggle_ban(update, context, user_id, True)
-    elif data.startswith("unban_"):
-        user_id = int(data.split('_')[1])
-        await admin_handler.toggle_ban(update, context, user_id, False)
-    elif data.startswith("approve_withdrawal_"):
-        withdrawal_id = int(data.split('_')[2])
-        await admin_handler.approve_withdrawal(update, context, withdrawal_id)
-    elif data.startswith("reject_withdrawal_"):
-        withdrawal_id = int(data.split('_')[2])
-        await admin_handler.reject_withdrawal(update, context, withdrawal_id)
-    
-    # Support callbacks
-    elif data == "contact_support":
-        context.user_data['awaiting_support_message'] = True
-        await query.edit_message_text(
-            "📞 **Contact Support**\n\n"
-            "Please write your **entire message in one text only**.\n"
-            "Include your order details or question.",
-            reply_markup=build_contact_keyboard(),
-            parse_mode='Markdown'
-        )
+async def ask_support_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Prompt for a message to the support team"""
+    context.user_data['awaiting_support_message'] = True
+    await update.callback_query.edit_message_text(
+        "📞 **Contact Support**\n\n"
+        "Please write your **entire message in one text only**.\n"
+        "Include your order details or question.",
+        reply_markup=build_contact_keyboard(),
+        parse_mode='Markdown'
+    )
+
+async def cancel_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reset all pending states and show the welcome message"""
+    for key in ['seller_step', 'withdrawal_step', 'awaiting_custom_amount', 'awaiting_quantity', 'awaiting_support_message', 'buy_quantity', 'pending_payment']:
+        context.user_data.pop(key, None)
     
-    # Global Navigation
-    elif data == "cancel":
-        # Reset all states
-        for key in ['seller_step', 'withdrawal_step', 'awaiting_custom_amount', 'awaiting_quantity', 'awaiting_support_message', 'buy_quantity', 'pending_payment']:
-            context.user_data.pop(key, None)
-        
-        # Show welcome message
-        await query.edit_message_text(
-            welcome_message(),
-            parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup([[]])  # Empty keyboard
-        )
+    await update.callback_query.edit_message_text(
+        welcome_message(),
+        parse_mode='Markdown',
+        reply_markup=InlineKeyboardMarkup([[]])  # Empty keyboard
+    )
+
+def log_slow_callback(route, seconds: float):
+    """Timing hook: log callbacks slower than SLOW_CALLBACK_MS"""
+    if seconds * 1000 >= config.SLOW_CALLBACK_MS:
+        logger.warning(f"Slow callback {route.name}: {seconds * 1000:.0f} ms")
 
-    elif data == "wallet_main":
-        await show_wallet(update, context)
+def build_callback_router() -> CallbackRouter:
+    """All inline-button routes: wallet and navigation here, the rest from each handler"""
+    router = CallbackRouter()
     
-    elif data == "buy_main":
-        await buyer_handler.show_buy_menu(update, context)
+    # Wallet callbacks
+    router.add("wallet_add", show_add_money)
+    router.add("wallet_main", show_wallet)
+    router.add("wallet_history", show_transaction_history)
+    router.add("amount_custom", ask_custom_amount)
+    router.add("amount_<int:amount>", initiate_direct_payment)
+    router.add("cancel_payment_<order_id>", cancel_direct_payment)
+    
+    # Activity, support and global navigation
+    router.add("my_activity", show_my_activity)
+    router.add("contact_support", ask_support_message)
+    router.add("cancel", cancel_flow)
+    
+    buyer_handler.register_routes(router)
+    seller_handler.register_routes(router)
+    admin_handler.register_routes(router)
+    
+    router.timing_hooks.append(log_slow_callback)
+    return router
 
-    elif data == "my_activity":
-        await show_my_activity(update, context)
+callback_router = build_callback_router()
 
-    elif data == "seller_step1":
-        context.user_data['seller_step'] = 1
-        await seller_handler.start_selling(update, context)
-    else:
-        await query.answer("Feature not implemented yet!")
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle all callback queries"""
+    if not await callback_router.dispatch(update, context):
+        await update.callback_query.answer("Feature not implemented yet!")
 
 # ==================== ERROR HANDLER ====================
 
@@ -966,18 +779,77 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
-def create_bot_application():
-    """Create and configure the bot application"""
+async def routes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Per-route latency of inline-button handlers since startup"""
+    user_id = update.effective_user.id
+    if not admin_handler.is_admin(user_id):
+        return
+    
+    rows = callback_router.stats()[:20]
+    if not rows:
+        await update.message.reply_text("No callbacks handled yet.")
+        return
+    
+    lines = [f"{'route':<34} {'count':>6} {'avg ms':>7} {'max ms':>7} {'err':>4}"]
+    for row in rows:
+        lines.append(f"{row['route'][:34]:<34} {row['count']:>6} {row['avg_ms']:>7.1f} "
+                     f"{row['max_ms']:>7.1f} {row['errors']:>4}")
+    table = "\n".join(lines)
+    await update.message.reply_text(
+        f"🧭 **Callback Route Timings**\n\n```\n{table}\n```",
+        parse_mode='Markdown'
+    )
+
+async def outbox_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Outbound notification queue depth and delivery latency"""
+    user_id = update.effective_user.id
+    if not admin_handler.is_admin(user_id):
+        return
+    
+    stats = outbox.stats()
+    await update.message.reply_text(
+        "📬 **Outbound Queue**\n\n"
+        f"⏳ Queued: {stats['queued']} ({stats['chats_waiting']} chats, {stats['in_flight']} sending)\n"
+        f"✅ Sent: {stats['sent']}\n"
+        f"❌ Failed: {stats['failed']} (dropped: {stats['dropped']})\n"
+        f"🔁 Retried: {stats['retried']} (429s: {stats['rate_limited']})\n"
+        f"⏱️ Latency p50/p95/max: {stats['latency_p50_ms']:.0f} / {stats['latency_p95_ms']:.0f} / "
+        f"{stats['latency_max_ms']:.0f} ms",
+        parse_mode='Markdown'
+    )
+
+async def stop_background_tasks(application: Application):
+    """Stop payment checks, then deliver queued notifications before the bot shuts down"""
+    await payment_scheduler.stop()
+    await outbox.stop()
+
+def create_bot_application(request: BaseRequest = None):
+    """Create and configure the bot application
+    
+    request replaces the HTTP transport to the Bot API (bench_bot_replay.py passes
+    a local fake so handlers can be load-tested offline).
+    """
     # Validate configuration
     config.validate_config()
     
     # Create application
-    app = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder().token(config.TELEGRAM_BOT_TOKEN)
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    if config.BOT_CONCURRENT_UPDATES > 1:
+        # Parallel across users, strictly ordered within each user's flow
+        builder = builder.concurrent_updates(PerUserUpdateProcessor())
+    if config.BOT_MODE == 'webhook':
+        # No getUpdates poller; webhook.py feeds this bounded queue and answers 503 when it is full
+        builder = builder.updater(None).update_queue(asyncio.Queue(maxsize=config.WEBHOOK_QUEUE_SIZE))
+    app = builder.post_stop(stop_background_tasks).build()
     
     # Add handlers
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("check", check_command))
     app.add_handler(CommandHandler("logs", logs_command))
+    app.add_handler(CommandHandler("routes", routes_command))
+    app.add_handler(CommandHandler("outbox", outbox_command))
     app.add_handler(CommandHandler("help", lambda u, c: u.message.reply_text(help_message(), parse_mode='Markdown')))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
@@ -990,6 +862,10 @@ def create_bot_application():
 
 def main():
     """Start the bot"""
+    if config.BOT_MODE == 'webhook':
+        # Webhook updates arrive over HTTP, which the dashboard server provides
+        print(">> BOT_MODE=webhook: start with `python run.py` (it serves the webhook next to the dashboard)")
+        return
     try:
         app = create_bot_application()
         
@@ -0,0 +1,139 @@
+"""
+Background sender for dashboard broadcasts
+/admin/broadcast only records a job: one broadcasts row plus a pending
+broadcast_recipients row per user. BroadcastWorker sends it from a daemon thread
+with its own event loop, through an Outbox paced at BROADCAST_RATE with at most
+BROADCAST_CONCURRENCY sends in flight, and marks each recipient sent or failed
+as soon as Telegram answers. Jobs left queued or running by a restart are picked
+up again from their pending recipients, so users already sent to are skipped;
+only the few sends in flight at a hard kill can be repeated.
+"""
+import asyncio
+import threading
+from typing import Optional
+
+from telegram import Bot
+
+import config
+from outbox import Outbox
+from storage import db
+
+
+class BroadcastWorker:
+    """Sends queued broadcast jobs one page of recipients at a time"""
+
+    def __init__(self, request=None, rate: float = None, concurrency: int = None,
+                 batch_size: int = None, poll_interval: float = 30.0):
+        # request: optional telegram BaseRequest (tests pass a fake Bot API transport)
+        self.request = request
+        self.rate = rate or config.BROADCAST_RATE
+        self.concurrency = concurrency or config.BROADCAST_CONCURRENCY
+        self.batch_size = batch_size or config.BROADCAST_BATCH_SIZE
+        # Also catches jobs queued by another process (wake() only reaches this one)
+        self.poll_interval = poll_interval
+        self.outbox = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop = None
+        self._wake = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    # ==================== CONTROL (any thread) ====================
+
+    def start(self):
+        """Start the worker thread (does nothing if it is already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="broadcast-worker", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Look for new jobs now instead of at the next poll"""
+        loop, wake = self._loop, self._wake
+        if loop and wake:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def stop(self, timeout: float = 10.0):
+        """Finish the page being sent and stop; unsent recipients stay pending"""
+        self._stopping.set()
+        self.wake()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    # ==================== WORKER THREAD ====================
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            print(f"Error in broadcast worker: {e}")
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # Per-chat limits do not matter here: every recipient gets one message
+        self.outbox = Outbox(global_rate=self.rate, workers=self.concurrency,
+                             max_queued=self.batch_size * 2)
+        bot = Bot(config.TELEGRAM_BOT_TOKEN, request=self.request)
+        await bot.initialize()
+        try:
+            while not self._stopping.is_set():
+                # Cleared before listing, so a job queued meanwhile still wakes the next round
+                self._wake.clear()
+                for job in db.get_unfinished_broadcasts():
+                    if self._stopping.is_set():
+                        break
+                    await self._send_job(bot, job)
+                if self._stopping.is_set():
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.outbox.stop()
+            await bot.shutdown()
+            self._loop = self._wake = None
+
+    async def _send_job(self, bot, job: dict):
+        broadcast_id = job['broadcast_id']
+        if not db.update_broadcast_status(broadcast_id, 'running'):
+            return  # Cancelled since it was listed
+        after_id = None
+        while not self._stopping.is_set():
+            recipients = db.get_pending_broadcast_recipients(broadcast_id, after_id, self.batch_size)
+            if not recipients:
+                db.update_broadcast_status(broadcast_id, 'completed')
+                return
+            for user_id in recipients:
+                on_sent, on_failure = self._recorder(broadcast_id, user_id)
+                self.outbox.send_message(bot, user_id, job['message'], parse_mode='Markdown',
+                                         on_sent=on_sent, on_failure=on_failure)
+            await self.outbox.drain()
+            after_id = recipients[-1]
+            current = db.get_broadcast(broadcast_id)
+            if current is None or current['status'] == 'cancelled':
+                return
+
+    @staticmethod
+    def _recorder(broadcast_id: int, user_id: int):
+        """on_sent / on_failure callbacks that store one recipient's result right away"""
+
+        async def on_sent(message):
+            db.record_broadcast_results(broadcast_id, [(user_id, 'sent', None)])
+
+        async def on_failure(error):
+            db.record_broadcast_results(broadcast_id, [(user_id, 'failed', str(error)[:200])])
+
+        return on_sent, on_failure
+
+
+broadcast_worker = BroadcastWorker()
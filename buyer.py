@@ -8,7 +8,7 @@ from utils import (
     format_gmail_credentials, build_contact_keyboard
 )
 import config
-from database import db
+from async_database import db
 
 class BuyerHandler:
     
@@ -18,7 +18,7 @@ class BuyerHandler:
         user_id = update.effective_user.id
         
         # Get available count
-        available = db.get_available_gmails_count()
+        available = await db.get_available_gmails_count()
         
         if available < config.MIN_BUY_QUANTITY:
             message = (
@@ -35,7 +35,7 @@ class BuyerHandler:
             return
         
         # Get user wallet balance
-        balance = db.get_wallet_balance(user_id)
+        balance = await db.get_wallet_balance(user_id)
         min_cost = config.MIN_BUY_QUANTITY * config.BUY_RATE
         
         message = (
@@ -70,7 +70,7 @@ class BuyerHandler:
         user_id = update.effective_user.id
         
         # Validate quantity
-        available = db.get_available_gmails_count()
+        available = await db.get_available_gmails_count()
         
         if quantity < config.MIN_BUY_QUANTITY:
             await query.answer(f"❌ Minimum {config.MIN_BUY_QUANTITY} Gmails required!", show_alert=True)
@@ -82,7 +82,7 @@ class BuyerHandler:
         
         # Calculate cost
         total_cost = quantity * config.BUY_RATE
-        balance = db.get_wallet_balance(user_id)
+        balance = await db.get_wallet_balance(user_id)
         
         if balance < total_cost:
             await query.edit_message_text(
@@ -127,45 +127,22 @@ class BuyerHandler:
             await query.edit_message_text("❌ Error: Invalid purchase request.")
             return
         
-        # Double-check availability and balance
-        available = db.get_available_gmails_count()
-        balance = db.get_wallet_balance(user_id)
         total_cost = quantity * config.BUY_RATE
         
-        if quantity > available:
-            await query.edit_message_text(f"❌ Only {available} Gmails available now!")
-            return
+        # Reserve stock, debit wallet, record the purchase and pay sellers in one transaction
+        result = await db.checkout(user_id, quantity, config.BUY_RATE)
         
-        if balance < total_cost:
-            await query.edit_message_text("❌ Insufficient balance!")
-            return
-        
-        # Purchase Gmails
-        gmails = db.purchase_gmails(user_id, quantity)
-        
-        if not gmails:
-            await query.edit_message_text("❌ Purchase failed. Please try again.")
+        if not result.get('success'):
+            error = result.get('error')
+            if error == 'insufficient_stock':
+                await query.edit_message_text(f"❌ Only {result.get('available', 0)} Gmails available now!")
+            elif error == 'insufficient_balance':
+                await query.edit_message_text("❌ Insufficient balance!")
+            else:
+                await query.edit_message_text("❌ Purchase failed. Please try again.")
             return
         
-        # Deduct from wallet
-        db.update_wallet(user_id, -total_cost)
-        
-        # Create transaction record
-        db.create_transaction(
-            user_id=user_id,
-            txn_type='purchase',
-            amount=-total_cost,
-            description=f"Purchased {quantity} Gmail(s)"
-        )
-        db.update_transaction_status(
-            db.get_user_transactions(user_id, 1)[0]['txn_id'],
-            'success'
-        )
-        
-        # Update seller earnings
-        for gmail in gmails:
-            seller_id = gmail['seller_id']
-            db.update_seller_earnings(seller_id, config.SELL_RATE)
+        gmails = result['gmails']
         
         # Send credentials
         credentials_msg = format_gmail_credentials(gmails)
@@ -177,7 +154,8 @@ class BuyerHandler:
             "Sending credentials..."
         )
         
-        # Send credentials in a separate message
+        # Send credentials in a separate message, directly: the buyer has paid, so this
+        # must not be dropped by a full outbox queue or lost to an unretried timeout
         await context.bot.send_message(
             user_id,
             credentials_msg,
@@ -195,7 +173,7 @@ class BuyerHandler:
         query = update.callback_query
         await query.answer()
         
-        purchases = db.get_user_purchases(user_id)
+        purchases = await db.get_user_purchases(user_id)
         
         if not purchases:
             await query.edit_message_text(
@@ -261,4 +239,15 @@ class BuyerHandler:
                 "❌ Invalid quantity. Please enter a valid number."
             )
 
+    @staticmethod
+    def register_routes(router):
+        """Add the buying flow's callback routes to a CallbackRouter"""
+        router.add("buy_gmails", BuyerHandler.show_buy_menu)
+        router.add("buy_main", BuyerHandler.show_buy_menu)
+        router.add("buy_custom", BuyerHandler.handle_custom_quantity)
+        router.add("buy_qty_<int:quantity>", BuyerHandler.handle_quantity_selection)
+        # The quantity is taken from user_data, so the one in the button is not passed on
+        router.add("confirm_purchase_<_quantity>", BuyerHandler.process_purchase)
+        router.add("activity_purchases", BuyerHandler.show_purchases)
+
 buyer_handler = BuyerHandler()
@@ -0,0 +1,40 @@
+"""
+Small in-process caches shared by the database backends
+"""
+import threading
+import time
+from typing import Any, Callable
+
+
+class SnapshotCache:
+    """Holds one computed value, reloading it after ttl seconds or on invalidate()"""
+
+    def __init__(self, loader: Callable[[], Any], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, fresh: bool = False) -> Any:
+        """Return the cached snapshot, reloading it if it is stale, invalidated or fresh=True"""
+        with self._lock:
+            if not fresh and self._loaded_at and time.monotonic() - self._loaded_at < self.ttl:
+                return self._value
+            generation = self._generation
+
+        # Load outside the lock so a slow query never blocks invalidate()
+        value = self.loader()
+        with self._lock:
+            # A write that landed mid-load makes this snapshot stale: serve it once, don't keep it
+            if generation == self._generation:
+                self._value = value
+                self._loaded_at = time.monotonic()
+        return value
+
+    def invalidate(self):
+        """Drop the snapshot so the next get() reloads it"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = 0.0
@@ -0,0 +1,456 @@
+"""
+Backend conformance and performance check
+Drives a scratch SQLite Database and a scratch MongoDatabase through the same
+scenario over the StorageBackend surface, and fails if any method's results
+differ between them. Ids, timestamps and other backend-specific fields are left
+out of the comparison. It also seeds each backend through generate_data and
+checks the inventory counters and revenue rollup against the seeded rows.
+Exits non-zero on failure so it can gate CI.
+
+MongoDB checkout() needs transactions, so point MONGODB_URI at a replica set
+(a single-node one is enough: mongod --replSet rs0, then rs.initiate()).
+Without MONGODB_URI the MongoDB side runs on mongomock (pip install mongomock),
+skipping on both backends the steps mongomock cannot run; with neither, the
+check fails rather than compare SQLite with itself.
+
+--bench times the hot methods on each backend at synthetic sizes instead.
+
+Usage:
+    python check_backends.py                       # SQLite, plus MongoDB when MONGODB_URI is set
+    python check_backends.py --bench               # timings at 10k / 100k / 1M gmails
+    python check_backends.py --bench --sizes 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import config
+from bench_users_with_stats import best_of
+from generate_data import Marketplace, populate
+
+
+def project(rows, fields):
+    """Keep only the compared fields of a row or list of rows, normalising types"""
+    def one(row):
+        out = {}
+        for field in fields:
+            value = row.get(field)
+            if isinstance(value, float):
+                value = round(value, 2)
+            elif field.startswith('is_'):
+                value = bool(value)
+            out[field] = value
+        return out
+    if rows is None:
+        return None
+    if isinstance(rows, dict):
+        return one(rows)
+    return [one(row) for row in rows]
+
+
+# Steps mongomock cannot run, and why; without a real MongoDB they are skipped on
+# both backends, so the data the later steps see stays the same on each
+MONGOMOCK_UNSUPPORTED = {
+    'checkout': 'needs sessions',
+    'checkout (insufficient balance)': 'needs sessions',
+    'checkout (insufficient stock)': 'needs sessions',
+    'get_all_sellers_with_stats': 'takes $sum of an array as 0',
+    'get_stats': 'needs $unionWith',
+    'get_stats (cached, after new user/seller/batch)': 'needs $unionWith',
+    'get_pending_withdrawals_with_sales': 'takes $sum of an array as 0',
+    'get_sellers_awaiting_payment': 'needs $lookup with let',
+}
+SKIPPED = 'SKIPPED'
+
+
+def scenario(db, skip=()) -> list:
+    """Run the shared scenario against one backend; returns [(step, result)]"""
+    results = []
+    ids = {}
+
+    def step(name, fn):
+        if name in skip:
+            results.append((name, SKIPPED))
+            return
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            results.append((name, f"ERROR: {type(e).__name__}: {e}"))
+
+    # ==================== USERS ====================
+    step('create_user', lambda: [bool(db.create_user(uid, f"user{uid}", f"User {uid}")) for uid in (1001, 1002, 1003)])
+    step('get_user', lambda: project(db.get_user(1001), ('user_id', 'username', 'full_name', 'wallet_balance', 'role', 'is_banned')))
+    step('get_user (missing)', lambda: db.get_user(9999))
+    step('update_wallet', lambda: bool(db.update_wallet(1001, 100.0)))
+    step('get_wallet_balance', lambda: round(db.get_wallet_balance(1001), 2))
+    step('ban_user', lambda: [bool(db.ban_user(1003, True)), bool(db.get_user(1003)['is_banned']),
+                              bool(db.ban_user(1003, False)), bool(db.get_user(1003)['is_banned'])])
+
+    # ==================== SELLERS ====================
+    step('create_seller', lambda: [bool(db.create_seller(1002, 'qr.png')), bool(db.create_seller(1003, None))])
+
+    def sellers():
+        ids['s1'] = db.get_seller(1002)['seller_id']
+        ids['s2'] = db.get_seller(1003)['seller_id']
+        return project(db.get_seller(1002), ('user_id', 'status', 'total_earnings', 'upi_qr_path'))
+    step('get_seller', sellers)
+    step('get_pending_sellers', lambda: project(db.get_pending_sellers(), ('user_id', 'username', 'status')))
+    step('approve_seller', lambda: [bool(db.approve_seller(ids['s1'], 1, True)), bool(db.approve_seller(ids['s2'], 1, True))])
+    step('get_seller_by_id', lambda: project(db.get_seller_by_id(ids['s1']), ('user_id', 'status', 'username')))
+
+    # ==================== GMAILS ====================
+    batch_a = [(f"a{i}@gmail.com", "pw") for i in range(10)]
+    step('ingest_gmails', lambda: project(db.ingest_gmails(ids['s1'], batch_a, 'batch_a'), ('success', 'inserted', 'duplicates')))
+    step('ingest_gmails (duplicates)', lambda: project(
+        db.ingest_gmails(ids['s1'], batch_a[:3] + [("a10@gmail.com", "pw")], 'batch_a'), ('success', 'inserted', 'duplicates')))
+    step('add_gmails', lambda: bool(db.add_gmails(ids['s2'], [(f"b{i}@gmail.com", "pw") for i in range(5)], 'batch_b')))
+    step('add_gmails (rejected batch)', lambda: bool(db.add_gmails(ids['s2'], [("c0@gmail.com", "pw")], 'batch_c')))
+    step('get_pending_gmail_batches', lambda: sorted(
+        (b['batch_id'], b['count'], b['user_id'], b['username']) for b in db.get_pending_gmail_batches()))
+    step('approve_gmail_batch', lambda: [bool(db.approve_gmail_batch('batch_a')), bool(db.approve_gmail_batch('batch_b')),
+                                         bool(db.approve_gmail_batch('batch_c', approved=False))])
+
+    def resubmit_rejected():
+        result = db.ingest_gmails(ids['s2'], [("c0@gmail.com", "pw"), ("b0@gmail.com", "pw")], 'batch_c2')
+        # c0 was rejected with batch_c, so it is no longer listed; b0 is still on sale
+        if (result['inserted'], result['duplicates']) != (1, 1):
+            raise AssertionError(f"rejected email not accepted again: {result}")
+        return project(result, ('success', 'inserted', 'duplicates'))
+
+    step('ingest_gmails (rejected email resubmitted)', resubmit_rejected)
+    step('get_available_gmails_count', lambda: db.get_available_gmails_count())
+    step('get_inventory_counts', lambda: db.get_inventory_counts())
+    step('get_inventory_counts (seller)', lambda: db.get_inventory_counts(ids['s1']))
+    step('purchase_gmails', lambda: len(db.purchase_gmails(1001, 2)))
+    step('purchase_gmails (too many)', lambda: len(db.purchase_gmails(1001, 1000)))
+    step('checkout', lambda: project(db.checkout(1001, 3, 5.0), ('success', 'total_cost', 'balance')))
+    step('checkout (insufficient balance)', lambda: project(db.checkout(1001, 5, 1000.0), ('success', 'error')))
+    step('checkout (insufficient stock)', lambda: project(db.checkout(1001, 1000, 0.0), ('success', 'error')))
+    step('get_seller_sales', lambda: db.get_seller_sales(ids['s1']))
+    step('get_user_purchases', lambda: len(db.get_user_purchases(1001)))
+    step('get_all_purchases', lambda: sorted(
+        (p['buyer_id'], p['buyer_username'], p['seller_username']) for p in db.get_all_purchases()))
+    step('get_sold_gmails_by_seller', lambda: sorted(
+        (g['buyer_id'], g['buyer_username']) for g in db.get_sold_gmails_by_seller(ids['s1'])))
+    step('get_seller_gmail_batches', lambda: sorted(
+        (b['batch_id'], b['count']) for b in db.get_seller_gmail_batches(ids['s1'])))
+    # Which Gmails a purchase claims is backend-specific (MongoDB samples at random), so compare tallies
+    step('get_all_gmails', lambda: sorted(Counter(g['status'] for g in db.get_all_gmails()).items()))
+
+    # ==================== STATS PAGES ====================
+    step('get_users_with_stats', lambda: project(
+        db.get_users_with_stats(), ('user_id', 'total_bought', 'total_provided', 'total_sold')))
+    step('get_all_sellers_with_stats', lambda: project(
+        db.get_all_sellers_with_stats(), ('user_id', 'username', 'total_earnings', 'pending_gmails', 'available_gmails', 'sold_gmails')))
+    step('get_user_detail', lambda: {
+        key: len(value) for key, value in db.get_user_detail(1002).items() if isinstance(value, list)})
+
+    # ==================== TRANSACTIONS ====================
+    def transactions():
+        ids['t1'] = db.create_transaction(1001, 'deposit', 50.0, 'order_1', 'https://pay/1', 'Wallet top-up')
+        return project(db.get_transaction_by_order_id('order_1'),
+                       ('user_id', 'type', 'amount', 'status', 'cashfree_order_id', 'description'))
+    step('create_transaction', transactions)
+    step('update_transaction_status', lambda: [bool(db.update_transaction_status(ids['t1'], 'success')),
+                                               db.get_transaction_by_order_id('order_1')['status']])
+    step('get_user_transactions', lambda: project(db.get_user_transactions(1001), ('type', 'amount', 'status')))
+    step('get_all_transactions', lambda: len(db.get_all_transactions()))
+    step('get_time_based_analytics', lambda: {
+        window: project(totals, ('total_amount', 'count')) for window, totals in db.get_time_based_analytics().items()})
+    step('get_stats', lambda: project(db.get_stats(fresh=True), tuple(sorted(db.get_stats(fresh=True)))))
+
+    # ==================== WITHDRAWALS ====================
+    def withdrawals():
+        db.create_withdrawal(ids['s1'], 1002, 9.0, 'qr.png')
+        db.create_withdrawal(ids['s2'], 1003, 4.0, None)
+        return project(db.get_pending_withdrawals(), ('user_id', 'amount', 'username', 'total_earnings'))
+    step('get_pending_withdrawals', withdrawals)
+    step('get_pending_withdrawals_with_sales', lambda: project(db.get_pending_withdrawals_with_sales(), ('user_id', 'total_sold')))
+
+    def process():
+        withdrawal = db.get_pending_withdrawals()[0]
+        db.process_withdrawal(withdrawal['withdrawal_id'], 1, approved=True)
+        return project(db.get_pending_withdrawals(), ('user_id',))
+    step('process_withdrawal', process)
+    step('get_sellers_awaiting_payment', lambda: project(
+        db.get_sellers_awaiting_payment(), ('user_id', 'username', 'sold_count', 'amount_owed', 'upi_qr_path')))
+    step('mark_seller_gmails_as_paid', lambda: db.mark_seller_gmails_as_paid(1002))
+
+    # ==================== SUPPORT ====================
+    step('save_support_message', lambda: [bool(db.save_support_message(1001, 'help')),
+                                          bool(db.save_support_message(1003, 'again'))])
+    step('get_support_messages', lambda: project(db.get_support_messages(), ('user_id', 'message', 'username')))
+    step('get_support_messages (all)', lambda: len(db.get_support_messages(unread_only=False)))
+
+    def tickets():
+        first = db.create_support_ticket(1001, 'Login', 'Cannot log in')
+        db.create_support_ticket(1002, 'Payout', 'Where is it?')
+        db.update_ticket_status(first, 'resolved', 'Fixed')
+        return project(db.get_all_tickets(), ('user_id', 'subject', 'status', 'admin_reply', 'username'))
+    step('support tickets', tickets)
+    step('get_all_tickets (open)', lambda: project(db.get_all_tickets('open'), ('user_id', 'subject')))
+
+    # ==================== BROADCASTS ====================
+    BROADCAST_FIELDS = ('message', 'created_by', 'status', 'total_count', 'sent_count', 'failed_count', 'pending_count')
+
+    def broadcasts():
+        ids['broadcast'] = db.create_broadcast('*Hello*', created_by=1001)
+        return [project(db.get_broadcast(ids['broadcast']), BROADCAST_FIELDS),
+                db.get_pending_broadcast_recipients(ids['broadcast']),
+                db.get_pending_broadcast_recipients(ids['broadcast'], after_id=1001, limit=1)]
+    step('create_broadcast', broadcasts)
+
+    def broadcast_progress():
+        running = db.update_broadcast_status(ids['broadcast'], 'running')
+        recorded = [db.record_broadcast_results(ids['broadcast'], [(1001, 'sent', None), (1002, 'failed', 'Forbidden')]),
+                    # Already recorded: counted once
+                    db.record_broadcast_results(ids['broadcast'], [(1001, 'sent', None)])]
+        unfinished = project(db.get_unfinished_broadcasts(), ('status', 'pending_count'))
+        return [running, recorded, unfinished, db.get_pending_broadcast_recipients(ids['broadcast'])]
+    step('record_broadcast_results', broadcast_progress)
+
+    def broadcast_finish():
+        done = [db.update_broadcast_status(ids['broadcast'], 'cancelled'),
+                # Finished jobs stay finished
+                db.update_broadcast_status(ids['broadcast'], 'running')]
+        return [done, project(db.get_broadcasts(), BROADCAST_FIELDS), db.get_unfinished_broadcasts(),
+                db.get_broadcast(10 ** 6)]
+    step('update_broadcast_status', broadcast_finish)
+
+    # ==================== KEYSET PAGES ====================
+    def pages(fetch, id_key, limit=2):
+        seen, after_id = [], None
+        while True:
+            page = fetch(after_id=after_id, limit=limit)
+            seen.append(len(page))
+            if len(page) < limit:
+                return seen
+            after_id = page[-1][id_key]
+    step('get_all_users pages', lambda: pages(db.get_all_users, 'user_id'))
+    step('get_users_with_stats pages', lambda: pages(db.get_users_with_stats, 'user_id'))
+    step('get_all_gmails pages', lambda: pages(db.get_all_gmails, 'gmail_id' if 'gmail_id' in db.get_all_gmails(limit=1)[0] else '_id', 5))
+    step('get_all_tickets pages', lambda: pages(db.get_all_tickets, 'ticket_id', 1))
+
+    # ==================== DASHBOARD API ====================
+    def api_pages(client, path):
+        """Page sizes of /api/<path> walked by next_cursor; every page must serialise to JSON"""
+        seen, after_id = [], ''
+        while True:
+            response = client.get(f'/api/{path}?limit=2&after_id={after_id}')
+            if response.status_code != 200:
+                return [response.status_code, response.get_data(as_text=True)[:200]]
+            data = response.get_json()
+            seen.append(len(data['items']))
+            if data['next_cursor'] is None:
+                return seen
+            after_id = data['next_cursor']
+
+    def dashboard_api():
+        import dashboard
+        backend, dashboard.db = dashboard.db, db
+        try:
+            client = dashboard.app.test_client()
+            with client.session_transaction() as session:
+                session['admin_id'] = config.ADMIN_IDS[0]
+            paged = {path: api_pages(client, path)
+                     for path in ('users', 'sellers', 'gmails', 'transactions', 'withdrawals', 'support')}
+            single = {path: client.get(f'/api/{path}').status_code
+                      for path in ('stats', 'analytics', 'user/1002') if path != 'stats' or 'get_stats' not in skip}
+            malformed = {path: client.get(f'/api/{path}?after_id=bogus').status_code for path in paged}
+            return [paged, single, malformed]
+        finally:
+            dashboard.db = backend
+    step('dashboard /api routes', dashboard_api)
+
+    def seller_order():
+        db.create_user(1005, 'user1005', 'User 1005')
+        db.create_seller(1005, None)
+        seen, after_id = [], None
+        while True:
+            page = db.get_all_sellers_with_stats(after_id=after_id, limit=1)
+            if not page:
+                break
+            seen.append((page[0]['user_id'], page[0]['status']))
+            after_id = page[0]['seller_id']
+        # The dashboard lists sellers grouped by status (approved before pending), newest first
+        if [status for _, status in seen] != sorted(status for _, status in seen):
+            raise AssertionError(f"not grouped by status: {seen}")
+        return seen
+    step('get_all_sellers_with_stats pages (by status)', seller_order)
+
+    # ==================== STATS SNAPSHOT ====================
+    def cached_stats():
+        fields = ('total_users', 'pending_sellers', 'pending_batches')
+        before = project(db.get_stats(), fields)
+        db.create_user(1004, 'user1004', 'User 1004')
+        db.create_seller(1004, None)
+        db.ingest_gmails(db.get_seller(1004)['seller_id'], [("d0@gmail.com", "pw")], 'batch_d')
+        # Not fresh=True: each write above must have dropped the cached snapshot
+        after, expected = project(db.get_stats(), fields), {field: before[field] + 1 for field in fields}
+        if after != expected:
+            raise AssertionError(f"stale snapshot {after}, expected {expected}")
+        return after
+    step('get_stats (cached, after new user/seller/batch)', cached_stats)
+    return results
+
+
+def seeded(db, skip=()) -> list:
+    """Load a small synthetic marketplace into an empty backend and check its counters against the rows
+
+    generate_data inserts rows directly rather than through ingest_gmails and
+    checkout, so this is what shows the counters and revenue rollup come out as
+    the write paths would leave them. Returns [(step, result)] like scenario().
+    """
+    name = 'populate (counters and revenue rollup match the rows)'
+    if name in skip:
+        return [(name, SKIPPED)]
+    try:
+        populate(db, Marketplace(users=200, gmails=3000, seed=7))
+        counts = {status: count for status, count in db.get_inventory_counts().items() if count}
+        rows = dict(Counter(g['status'] for g in db.get_all_gmails()))
+        if counts != rows:
+            raise AssertionError(f"inventory counters {counts}, rows {rows}")
+        analytics = db.get_time_based_analytics()
+        db.rebuild_revenue_daily()
+        if db.get_time_based_analytics() != analytics:
+            raise AssertionError(f"revenue rollup {analytics} differs from a rebuild")
+        return [(name, {'inventory': sorted(counts.items()), 'analytics': analytics})]
+    except Exception as e:
+        return [(name, f"ERROR: {type(e).__name__}: {e}")]
+
+
+def sqlite_backend(tmp: str, name: str):
+    """Fresh SQLite Database in tmp"""
+    config.DATABASE_PATH = os.path.join(tmp, f'{name}.db')
+    from database import Database
+    return Database(config.DATABASE_PATH)
+
+
+def use_mongomock() -> bool:
+    """Stand mongomock in for pymongo's client (before mongodb is imported); False if not installed"""
+    try:
+        import mongomock
+        from mongomock.collection import BulkOperationBuilder
+    except ImportError:
+        return False
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+    # pymongo 4.9+ passes sort= to UpdateOne's bulk hook; mongomock's does not take it
+    add_update = BulkOperationBuilder.add_update
+    BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    return True
+
+
+def mongo_backend(suffix: str):
+    """Fresh MongoDatabase on a scratch database next to the configured one"""
+    base = config.DATABASE_NAME.split('__')[0]
+    config.DATABASE_NAME = f"{base}__{suffix}"
+    import mongodb
+    client = mongodb.MongoClient(config.MONGODB_URI)
+    client.drop_database(config.DATABASE_NAME)
+    client.close()
+    return mongodb.MongoDatabase()
+
+
+def close(db):
+    if hasattr(db, 'pool'):
+        db.pool.close_all()
+    else:
+        db.client.drop_database(db.db.name)
+        db.client.close()
+
+
+def check_conformance(tmp: str) -> int:
+    print("=" * 50)
+    print("BACKEND CONFORMANCE CHECK")
+    print("=" * 50)
+    # The dashboard /api step signs in as an admin
+    config.ADMIN_IDS = config.ADMIN_IDS or [999_000_001]
+    skip = {}
+    if not config.MONGODB_URI:
+        if not use_mongomock():
+            print("  ✗ MONGODB_URI not set and mongomock not installed: nothing to compare SQLite with")
+            print("=" * 50)
+            return 1
+        skip = MONGOMOCK_UNSUPPORTED
+        print(f"  (MONGODB_URI not set: MongoDB side runs on mongomock, {len(skip)} steps skipped)")
+    backends = {'sqlite': sqlite_backend(tmp, 'conformance'), 'mongodb': mongo_backend('conformance')}
+
+    runs = {}
+    for name, db in backends.items():
+        try:
+            runs[name] = scenario(db, skip)
+        finally:
+            close(db)
+    for name, db in {'sqlite': sqlite_backend(tmp, 'seeded'), 'mongodb': mongo_backend('seeded')}.items():
+        try:
+            runs[name] += seeded(db, skip)
+        finally:
+            close(db)
+
+    failures = 0
+    for (step, value), (_, other) in zip(runs['sqlite'], runs['mongodb']):
+        if value == SKIPPED:
+            print(f"  - {step} (skipped: mongomock {skip[step]})")
+            continue
+        errored = any(isinstance(v, str) and v.startswith('ERROR:') for v in (value, other))
+        if value == other and not errored:
+            print(f"  ✓ {step}")
+            continue
+        failures += 1
+        print(f"  ✗ {step}")
+        print(f"      sqlite:  {value}")
+        print(f"      mongodb: {other}")
+
+    print("=" * 50)
+    print("BACKENDS AGREE" if not failures else f"{failures} STEP(S) DIFFER OR FAIL")
+    return 1 if failures else 0
+
+
+def bench(tmp: str, sizes: list) -> int:
+    print("=" * 50)
+    print("BACKEND PERFORMANCE")
+    print("=" * 50)
+    names = ['sqlite'] + (['mongodb'] if config.MONGODB_URI else [])
+    for size in sizes:
+        users = max(size // 20, 10)
+        for name in names:
+            db = sqlite_backend(tmp, f'bench_{size}') if name == 'sqlite' else mongo_backend(f'bench_{size}')
+            try:
+                started = time.perf_counter()
+                populate(db, Marketplace(users=users, gmails=size))
+                print(f"{name} @ {size:,} gmails / {users:,} users (seeded in {time.perf_counter() - started:.1f}s)")
+                seller_id = db.get_seller(db.get_all_sellers_with_stats(limit=1)[0]['user_id'])['seller_id']
+                batches = iter(range(10 ** 6))
+                timings = {
+                    'purchase_gmails(5)': best_of(lambda: db.purchase_gmails(1, 5), 5),
+                    'get_stats(fresh)': best_of(lambda: db.get_stats(fresh=True), 5),
+                    'get_users_with_stats(50)': best_of(lambda: db.get_users_with_stats(limit=50), 5),
+                    'add_gmails(1000)': best_of(lambda: db.add_gmails(seller_id, [
+                        (f"new{batch}_{i}@gmail.com", "pw") for batch in [next(batches)] for i in range(1000)
+                    ], 'bench'), 3),
+                }
+                for label, seconds in timings.items():
+                    print(f"  {label:<26} {seconds * 1000:>10.2f} ms")
+            finally:
+                close(db)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare and time the SQLite and MongoDB backends")
+    parser.add_argument('--bench', action='store_true', help="time hot methods instead of checking conformance")
+    parser.add_argument('--sizes', default='10000,100000,1000000', help="comma-separated gmail counts for --bench")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.bench:
+            return bench(tmp, [int(size) for size in args.sizes.split(',')])
+        return check_conformance(tmp)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
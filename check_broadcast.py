@@ -0,0 +1,182 @@
+"""
+Background broadcast check for /admin/broadcast (broadcast.py)
+Queues broadcasts through the dashboard's Flask test client against a scratch
+SQLite database, with the worker sending through a real telegram.Bot on the
+fake Bot API transport from check_outbox.py. Fails unless the POST returns
+before anything is sent, the worker keeps to its rate and concurrency limits,
+every user gets the message exactly once with blocked users marked failed, the
+progress endpoint reports the counts, a cancelled job stops, and a job
+interrupted by a worker restart finishes without resending to anyone already
+sent to. Exits non-zero on failure so it can gate CI.
+
+Usage:
+    python check_broadcast.py
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import config
+
+USERS = 300
+BLOCKED = 7          # users answering 403 (blocked the bot)
+RATE = 100
+CONCURRENCY = 4
+BATCH = 50
+API_LATENCY = 0.02
+ADMIN_ID = 999_000_001
+
+
+def make_api():
+    from check_outbox import make_api as recording_api
+
+    class BroadcastBotAPI(recording_api()):
+        """RecordingBotAPI that also tracks how many sends are in flight at once"""
+
+        def __init__(self, latency: float = 0.0):
+            super().__init__(latency)
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                return await super().do_request(url, method, request_data, **kwargs)
+            finally:
+                self.in_flight -= 1
+
+    return BroadcastBotAPI
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    config.DATABASE_PATH = os.path.join(tmp, 'broadcast.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:BROADCAST"
+    config.ADMIN_IDS = [ADMIN_ID]
+
+    from check_outbox import max_in_window
+    from dashboard import app
+    from broadcast import BroadcastWorker, broadcast_worker
+    from storage import db
+
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(bool(ok))
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("BROADCAST CHECK")
+    print("=" * 50)
+
+    users = [400_000_001 + i for i in range(USERS)]
+    for user_id in users:
+        db.create_user(user_id, f"user{user_id}", "Broadcast User")
+    blocked = set(users[::USERS // BLOCKED][:BLOCKED])
+
+    api = make_api()(latency=API_LATENCY)
+    for user_id in blocked:
+        api.refuse[user_id] = [403] * 10
+    # The dashboard's worker, pointed at the fake transport and the check's limits
+    for name, value in dict(request=api, rate=RATE, concurrency=CONCURRENCY,
+                            batch_size=BATCH, poll_interval=0.2).items():
+        setattr(broadcast_worker, name, value)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = ADMIN_ID
+
+    def received(text):
+        return Counter(chat for chat, sends in api.sent.items() for _, sent_text in sends if sent_text == text)
+
+    def progress(broadcast_id):
+        return client.get(f'/admin/broadcast/{broadcast_id}').get_json()['broadcast']
+
+    try:
+        # ==================== SEND ====================
+        started = time.perf_counter()
+        response = client.post('/admin/broadcast', json={'message': 'first'})
+        post_ms = (time.perf_counter() - started) * 1000
+        data = response.get_json()
+        first = data['broadcast']['broadcast_id']
+        check("POST queues the job and returns before sending", data['success'] and post_ms < 500
+              and data['broadcast']['total_count'] == USERS, f"{post_ms:.0f} ms, {data}")
+        check("progress endpoint answers while sending", progress(first)['status'] in ('queued', 'running'))
+
+        done = wait_for(lambda: progress(first)['status'] == 'completed', USERS / RATE * 3 + 5)
+        job = progress(first)
+        check("job completes", done, job)
+        counts = received('first')
+        check(f"every reachable user sent to exactly once ({USERS - BLOCKED})",
+              set(counts) == set(users) - blocked and set(counts.values()) == {1},
+              f"{len(counts)} users, max {max(counts.values(), default=0)}")
+        check("progress counts: sent, failed (blocked users), nothing pending",
+              (job['sent_count'], job['failed_count'], job['pending_count']) == (USERS - BLOCKED, BLOCKED, 0), job)
+        times = [t for sends in api.sent.values() for t, text in sends if text == 'first']
+        busiest = max_in_window(times, 1.0)
+        check(f"rate: at most {RATE} (+1 for clock skew) in any second", busiest <= RATE + 1, busiest)
+        check(f"at most {CONCURRENCY} sends in flight", api.max_in_flight <= CONCURRENCY, api.max_in_flight)
+        page = client.get('/admin/broadcast')
+        check("broadcast page lists the job", page.status_code == 200 and f'<td>{first}</td>'.encode() in page.data)
+
+        # ==================== CANCEL ====================
+        second = client.post('/admin/broadcast', json={'message': 'second'}).get_json()['broadcast']['broadcast_id']
+        wait_for(lambda: progress(second)['sent_count'] >= BATCH, 10)
+        cancelled = client.post(f'/admin/broadcast/{second}/cancel').get_json()
+        wait_for(lambda: not api.in_flight and sum(received('second').values()) == progress(second)['sent_count'], 5)
+        settled = sum(received('second').values())
+        time.sleep(1)
+        job = progress(second)
+        check("cancel stops the job after the page in flight",
+              cancelled['success'] and job['status'] == 'cancelled' and job['pending_count'] > 0
+              and sum(received('second').values()) == settled, job)
+        check("cancelling a finished job is refused",
+              client.post(f'/admin/broadcast/{first}/cancel').status_code == 400)
+
+        # ==================== RESUME ====================
+        third = client.post('/admin/broadcast', json={'message': 'third'}).get_json()['broadcast']['broadcast_id']
+        wait_for(lambda: progress(third)['sent_count'] >= BATCH, 10)
+        broadcast_worker.stop()
+        interrupted = progress(third)
+        check("stopped worker leaves the job running with recipients pending",
+              not broadcast_worker.is_running() and interrupted['status'] == 'running'
+              and interrupted['pending_count'] > 0, interrupted)
+        # A fresh worker (as after a restart) picks it up without being told
+        restarted = BroadcastWorker(request=api, rate=RATE, concurrency=CONCURRENCY,
+                                    batch_size=BATCH, poll_interval=0.2)
+        restarted.start()
+        try:
+            wait_for(lambda: progress(third)['status'] == 'completed', USERS / RATE * 3 + 5)
+        finally:
+            restarted.stop()
+        counts = received('third')
+        job = progress(third)
+        check("restarted worker finishes the job", job['status'] == 'completed' and job['pending_count'] == 0, job)
+        check("nobody sent to twice across the restart",
+              set(counts) == set(users) - blocked and set(counts.values()) == {1},
+              f"{len(counts)} users, repeats {[c for c, n in counts.items() if n > 1][:5]}")
+    finally:
+        broadcast_worker.stop()
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("BROADCAST OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
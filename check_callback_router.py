@@ -0,0 +1,252 @@
+"""
+Routing check for inline-button callbacks
+Resolves every callback_data the bot's keyboards produce against the router built
+by bot.build_callback_router() and compares handler and typed arguments with what
+the old if/elif chain in handle_callback called. Also checks that unknown or
+malformed data falls through to "Feature not implemented yet!", that timings and
+hooks are recorded per route, that admin callbacks work end to end through the
+Application on the fake Bot API transport from bench_bot_replay.py, and that
+lookup cost does not grow with the number of routes. Exits non-zero on failure so
+it can gate CI.
+
+Usage:
+    python check_callback_router.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import config
+
+ADMIN_ID = 999_000_001
+USER_ID = 300_000_001
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    config.DATABASE_PATH = os.path.join(tmp, 'router.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:ROUTER"
+    config.ADMIN_IDS = [ADMIN_ID]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_ROUTER"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "router"
+    config.BOT_MODE = 'polling'
+
+    import bot
+    from admin import AdminHandler
+    from buyer import BuyerHandler
+    from seller import SellerHandler
+    from router import CallbackRouter
+
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(bool(ok))
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("CALLBACK ROUTER CHECK")
+    print("=" * 50)
+
+    router = bot.build_callback_router()
+    # callback_data -> (handler, kwargs) the old handle_callback chain would have called
+    expected = {
+        'wallet_add': (bot.show_add_money, {}),
+        'wallet_main': (bot.show_wallet, {}),
+        'wallet_history': (bot.show_transaction_history, {}),
+        'amount_custom': (bot.ask_custom_amount, {}),
+        'amount_500': (bot.initiate_direct_payment, {'amount': 500}),
+        'cancel_payment_order_17_ab12': (bot.cancel_direct_payment, {'order_id': 'order_17_ab12'}),
+        'my_activity': (bot.show_my_activity, {}),
+        'contact_support': (bot.ask_support_message, {}),
+        'cancel': (bot.cancel_flow, {}),
+        'buy_gmails': (BuyerHandler.show_buy_menu, {}),
+        'buy_main': (BuyerHandler.show_buy_menu, {}),
+        'buy_custom': (BuyerHandler.handle_custom_quantity, {}),
+        'buy_qty_25': (BuyerHandler.handle_quantity_selection, {'quantity': 25}),
+        'confirm_purchase_25': (BuyerHandler.process_purchase, {}),
+        'activity_purchases': (BuyerHandler.show_purchases, {}),
+        'seller_step1': (SellerHandler.restart_selling, {}),
+        'seller_submit': (SellerHandler.submit_for_approval, {}),
+        'activity_sales': (SellerHandler.show_sales_stats, {}),
+        'activity_withdrawals': (SellerHandler.request_withdrawal, {}),
+        'withdrawal_request': (SellerHandler.request_withdrawal, {}),
+        'admin_panel': (AdminHandler.show_admin_panel, {}),
+        'admin_dashboard': (AdminHandler.show_dashboard, {}),
+        'admin_dashboard_refresh': (AdminHandler.show_dashboard, {'fresh': True}),
+        'admin_sellers': (AdminHandler.show_pending_sellers, {}),
+        'admin_gmails': (AdminHandler.show_pending_gmails, {}),
+        'admin_withdrawals': (AdminHandler.show_pending_withdrawals, {}),
+        'admin_pending_payments': (AdminHandler.show_pending_payments, {}),
+        'admin_users': (AdminHandler.show_users, {}),
+        'pending_batches': (AdminHandler.show_pending_batches, {}),
+        'payment_prev': (AdminHandler.navigate_pending_payment, {'step': -1}),
+        'payment_next': (AdminHandler.navigate_pending_payment, {'step': 1}),
+        'gmail_page_prev': (AdminHandler.change_gmail_page, {'step': -1}),
+        'gmail_page_next': (AdminHandler.change_gmail_page, {'step': 1}),
+        'mark_paid_123456': (AdminHandler.mark_seller_paid, {'seller_user_id': 123456}),
+        'upload_proof_123456': (AdminHandler.request_payment_proof, {'seller_user_id': 123456}),
+        'seller_gmails_123456': (AdminHandler.show_seller_gmails, {'user_id': 123456}),
+        'ticket_complete_42_123456': (AdminHandler.complete_ticket, {'ticket_id': 42, 'ticket_user_id': 123456}),
+        'ticket_reply_42_123456': (AdminHandler.start_ticket_reply, {'ticket_id': 42, 'ticket_user_id': 123456}),
+        'approve_seller_65f0c0ffee0000000000abcd': (AdminHandler.approve_seller, {'seller_id': '65f0c0ffee0000000000abcd'}),
+        'reject_seller_7': (AdminHandler.reject_seller, {'seller_id': '7'}),
+        'approve_batch_batch_123456_20260101': (AdminHandler.approve_gmail_batch, {'batch_id': 'batch_123456_20260101'}),
+        'reject_batch_batch_123456_20260101': (AdminHandler.reject_gmail_batch, {'batch_id': 'batch_123456_20260101'}),
+        'approve_withdrawal_9': (AdminHandler.approve_withdrawal, {'withdrawal_id': '9'}),
+        'reject_withdrawal_9': (AdminHandler.reject_withdrawal, {'withdrawal_id': '9'}),
+        'ban_123456': (AdminHandler.toggle_ban, {'user_id': 123456, 'ban': True}),
+        'unban_123456': (AdminHandler.toggle_ban, {'user_id': 123456, 'ban': False}),
+    }
+    wrong = []
+    for data, (handler, kwargs) in expected.items():
+        route, params = router.resolve(data)
+        if route is None or route.handler is not handler or {**params, **route.defaults} != kwargs:
+            wrong.append(f"{data} -> {route.pattern if route else None} {params}")
+    check(f"all {len(expected)} callback_data values reach the same handler and arguments", not wrong, wrong)
+
+    types_ok = all(type(value) is type(kwargs[name])
+                   for data, (_, kwargs) in expected.items()
+                   for name, value in router.resolve(data)[1].items())
+    check("placeholders are converted to their declared types", types_ok)
+
+    # Never handled by the old chain either: must still fall through to the fallback answer
+    unrouted = ['main_menu', 'seller_step2', 'seller_step3', 'amount_abc', 'buy_qty_', 'ticket_reply_42',
+                'ticket_reply_x_1', 'approve_', 'unknown', '']
+    leaked = [data for data in unrouted if router.resolve(data)[0] is not None]
+    check("unknown and malformed callback_data match no route", not leaked, leaked)
+
+    duplicate = False
+    try:
+        router.add('admin_panel', AdminHandler.show_admin_panel)
+    except ValueError:
+        duplicate = True
+    check("registering the same exact route twice is refused", duplicate)
+
+    asyncio.run(check_dispatch(check, CallbackRouter))
+    asyncio.run(check_application(check, bot))
+    check_lookup_cost(check, router, CallbackRouter)
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("ROUTER OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+class _Query:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Update:
+    def __init__(self, data):
+        self.callback_query = _Query(data)
+
+
+async def check_dispatch(check, CallbackRouter):
+    router = CallbackRouter()
+    calls, hooked, route_hooked = [], [], []
+
+    async def handler(update, context, ticket_id, ticket_user_id):
+        calls.append((ticket_id, ticket_user_id))
+        await asyncio.sleep(0.01)
+
+    async def broken(update, context):
+        raise RuntimeError("boom")
+
+    router.add('ticket_reply_<int:ticket_id>_<int:ticket_user_id>', handler,
+               on_timing=lambda route, seconds: route_hooked.append(seconds))
+    router.add('broken', broken)
+    router.timing_hooks.append(lambda route, seconds: hooked.append(route.name))
+
+    handled = await router.dispatch(_Update('ticket_reply_7_99'), None)
+    check("dispatch calls the handler with typed arguments", handled and calls == [(7, 99)], calls)
+    check("per-route and router timing hooks both fire", route_hooked and route_hooked[0] >= 0.01
+          and hooked == ['ticket_reply_<int:ticket_id>_<int:ticket_user_id>'], (route_hooked, hooked))
+
+    raised = False
+    try:
+        await router.dispatch(_Update('broken'), None)
+    except RuntimeError:
+        raised = True
+    check("handler errors propagate to the error handler", raised)
+    check("unmatched data is reported, not dispatched", not await router.dispatch(_Update('nope'), None))
+
+    stats = {row['route']: row for row in router.stats()}
+    check("stats record count, errors and latency per route",
+          stats['broken']['errors'] == 1 and stats['broken']['count'] == 1
+          and stats['ticket_reply_<int:ticket_id>_<int:ticket_user_id>']['max_ms'] >= 10, stats)
+
+
+async def check_application(check, bot):
+    from telegram import Update
+    from bench_bot_replay import FakeBotAPI, UpdateFactory
+
+    transport = FakeBotAPI()
+    application = bot.create_bot_application(request=transport)
+    factory = UpdateFactory()
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(repr(context.error))
+    application.add_error_handler(count_error)
+
+    await application.initialize()
+    try:
+        for user_id, data in [(ADMIN_ID, 'admin_panel'), (ADMIN_ID, 'admin_dashboard'),
+                              (ADMIN_ID, 'pending_batches'), (ADMIN_ID, 'gmail_page_next')]:
+            await application.process_update(Update.de_json(factory.build(user_id, 'callback', data), application.bot))
+        answered = transport.calls['answerCallbackQuery']
+        await application.process_update(Update.de_json(factory.build(USER_ID, 'callback', 'main_menu'),
+                                                        application.bot))
+        fallback_answered = transport.calls['answerCallbackQuery'] == answered + 1
+        await application.process_update(Update.de_json(factory.build(USER_ID, 'message', '🎫 Create Ticket'),
+                                                        application.bot))
+        ticket_started = application.user_data[USER_ID].get('ticket_step') == 1
+    finally:
+        await application.shutdown()
+
+    check("admin callbacks run through the Application without errors", not errors, errors)
+    check("unrouted callback gets the fallback answer", fallback_answered)
+    routed = {row['route'] for row in bot.callback_router.stats()}
+    check("live router collected timings for the routes used",
+          {'admin_panel', 'admin_dashboard', 'pending_batches', 'gmail_page_next'} <= routed, routed)
+    check("🎫 Create Ticket menu button starts a ticket", ticket_started)
+
+
+def check_lookup_cost(check, router, CallbackRouter):
+    """Resolve time with the bot's routes vs. with thousands of extra routes"""
+
+    async def noop(update, context, **kwargs):
+        pass
+
+    big = CallbackRouter()
+    for route in router.routes:
+        big.add(route.pattern, route.handler, defaults=route.defaults)
+    for i in range(5000):
+        big.add(f"extra_exact_{i}", noop)
+        big.add(f"extra{i}_item_<int:item_id>", noop)
+
+    samples = ['reject_withdrawal_9', 'ticket_reply_42_123456', 'wallet_add', 'admin_pending_payments']
+
+    def cost(r):
+        best = float('inf')
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(2000):
+                for data in samples:
+                    r.resolve(data)
+            best = min(best, time.perf_counter() - started)
+        return best / (2000 * len(samples)) * 1e6
+
+    small_us, big_us = cost(router), cost(big)
+    print(f"  resolve: {small_us:.2f} µs with {len(router.routes)} routes, "
+          f"{big_us:.2f} µs with {len(big.routes):,} routes")
+    check("lookup cost does not grow with the number of routes", big_us < small_us * 3, (small_us, big_us))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
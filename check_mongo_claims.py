@@ -0,0 +1,99 @@
+"""
+Concurrent purchase check for the MongoDB backend
+Seeds a scratch database at MONGODB_URI with a fixed stock of available
+Gmails, then runs many purchase_gmails() calls at once. Fails if any Gmail is
+sold twice, a buyer gets a partial order, the sold documents disagree with
+what buyers received, or the inventory counters drift. Near the end of the
+stock, buyers racing for the last few Gmails may each release a partial claim,
+so the number left unsold is reported rather than checked. Exits non-zero on
+failure so it can gate CI.
+
+Usage:
+    python check_mongo_claims.py
+    python check_mongo_claims.py --buyers 500 --quantity 3 --stock 1000
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+
+import config
+
+
+def seed(db, stock: int):
+    """Replace the scratch inventory with stock available Gmails across a few sellers"""
+    for collection in (db.gmails, db.sellers, db.users):
+        collection.delete_many({})
+    seller_ids = [ObjectId() for _ in range(4)]
+    db.sellers.insert_many([
+        {"_id": seller_id, "user_id": i, "status": "approved", "total_earnings": 0.0, "created_at": datetime.now()}
+        for i, seller_id in enumerate(seller_ids, start=1)
+    ])
+    db.gmails.insert_many([
+        {"seller_id": seller_ids[i % len(seller_ids)], "email": f"claim{i}@gmail.com", "password": "claim",
+         "batch_id": "claim", "status": "available", "created_at": datetime.now()}
+        for i in range(stock)
+    ])
+    db.rebuild_inventory_counters()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check purchase_gmails under concurrent buyers")
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--quantity', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=800)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    # Never touch the live database: seed a throwaway one next to it
+    config.DATABASE_NAME = f"{config.DATABASE_NAME}_claims"
+    import mongodb
+
+    db = mongodb.db
+    print("=" * 50)
+    print("MONGODB CONCURRENT CLAIM CHECK")
+    print("=" * 50)
+    try:
+        seed(db, args.stock)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            orders = list(pool.map(
+                lambda buyer_id: (buyer_id, db.purchase_gmails(buyer_id, args.quantity)),
+                range(1, args.buyers + 1)
+            ))
+        elapsed = time.perf_counter() - started
+
+        problems = []
+        received = {}
+        for buyer_id, gmails in orders:
+            if gmails and len(gmails) != args.quantity:
+                problems.append(f"buyer {buyer_id} got {len(gmails)} of {args.quantity}")
+            for gmail in gmails:
+                if gmail["_id"] in received:
+                    problems.append(f"{gmail['email']} sold to buyers {received[gmail['_id']]} and {buyer_id}")
+                received[gmail["_id"]] = buyer_id
+
+        sold = {doc["_id"]: doc.get("buyer_id") for doc in db.gmails.find({"status": "sold"}, {"buyer_id": 1})}
+        if sold != received:
+            problems.append(f"{len(sold)} Gmails marked sold, buyers received {len(received)}")
+        counts = db.get_inventory_counts()
+        if counts.get("sold", 0) != len(sold) or counts.get("available", 0) != args.stock - len(sold):
+            problems.append(f"inventory counters {counts} disagree with the collection")
+    finally:
+        db.client.drop_database(config.DATABASE_NAME)
+
+    filled = sum(1 for _, gmails in orders if gmails)
+    print(f"  {args.buyers} buyers x {args.quantity} from {args.stock} in stock: "
+          f"{filled} orders filled in {elapsed * 1000:.0f} ms, {args.stock - len(received)} left unsold")
+    for problem in problems:
+        print(f"  ✗ {problem}")
+    print("=" * 50)
+    print("NO DUPLICATE SALES" if not problems else f"{len(problems)} PROBLEM(S)")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Query plan regression check (index advisor) for the MongoDB backend
+Runs each hot MongoDatabase method against a seeded scratch database at
+MONGODB_URI, captures the commands it sends and explains them. Fails if any
+winning plan does a COLLSCAN or an in-memory SORT, or a $lookup scans its
+foreign collection. Exits non-zero on failure so it can gate CI.
+
+With --stale it instead lists indexes on the configured database that are no
+longer in MongoDatabase.INDEXES (--drop removes them).
+
+Usage:
+    python check_mongo_query_plans.py
+    python check_mongo_query_plans.py --stale [--drop]
+"""
+import argparse
+import copy
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import monitoring
+
+import config
+
+USERS = 20
+SELLERS = 5
+GMAILS = 200
+
+
+def oid(n: int) -> ObjectId:
+    """Deterministic ObjectId so checks can name seeded documents"""
+    return ObjectId(f"{n:024x}")
+
+
+SELLER = str(oid(1))
+
+# (method, args, allow_collscan)
+# allow_collscan: the method reads a whole counters collection by design
+# (a handful of documents), or folds a whole collection into one statistic
+CHECKS = [
+    ('get_user', (1001,), False),
+    ('get_wallet_balance', (1001,), False),
+    ('get_all_users', (), False),
+    ('get_seller', (1001,), False),
+    ('get_seller_by_id', (SELLER,), False),
+    ('get_pending_sellers', (), False),
+    ('get_all_sellers_with_stats', (), False),
+    ('get_users_with_stats', (), False),
+    ('get_user_detail', (1001,), False),
+    ('get_inventory_counts', (), True),
+    ('get_inventory_counts', (SELLER,), False),
+    ('get_available_gmails_count', (), False),
+    ('get_seller_sales', (SELLER,), False),
+    ('get_seller_gmail_batches', (SELLER,), False),
+    ('get_sold_gmails_by_seller', (SELLER,), False),
+    ('get_sellers_awaiting_payment', (), True),
+    ('get_pending_gmail_batches', (), False),
+    ('get_user_purchases', (1001,), False),
+    ('get_all_purchases', (), False),
+    ('get_all_gmails', (), False),
+    ('get_transaction_by_order_id', ('order_5',), False),
+    ('get_user_transactions', (1001, 10), False),
+    ('get_all_transactions', (), False),
+    ('get_pending_withdrawals', (), False),
+    ('get_pending_withdrawals_with_sales', (), False),
+    ('get_time_based_analytics', (), False),
+    ('get_support_messages', (), False),
+    ('get_support_messages', (False,), False),
+    ('get_all_tickets', (), False),
+    ('get_all_tickets', ('open',), False),
+    ('get_broadcast', (1,), False),
+    ('get_broadcasts', (), False),
+    ('get_unfinished_broadcasts', (), False),
+    ('get_pending_broadcast_recipients', (1,), False),
+    ('get_stats', (True,), True),
+    # Keyset pages: (after_id, limit)
+    ('get_all_users', (1005, 10), False),
+    ('get_users_with_stats', (1005, 10), False),
+    ('get_all_sellers_with_stats', (SELLER, 10), False),
+    ('get_all_purchases', (str(oid(5)), 10), False),
+    ('get_all_gmails', (str(oid(5)), 10), False),
+    ('get_all_transactions', (str(oid(5)), 10), False),
+    ('get_pending_withdrawals', (str(oid(1)), 10), False),
+    ('get_support_messages', (True, str(oid(5)), 10), False),
+    ('get_all_tickets', (None, 5, 10), False),
+    ('get_pending_broadcast_recipients', (1, 1005, 10), False),
+    # Writes with a filter
+    ('approve_gmail_batch', ('batch_1',), False),
+]
+
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+# Session/transport fields that explain rejects or ignores
+STRIP_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+
+
+class CommandCapture(monitoring.CommandListener):
+    """Records explainable commands sent while capturing is on"""
+
+    def __init__(self):
+        self.capturing = False
+        self.commands = []
+
+    def started(self, event):
+        if self.capturing and event.command_name in EXPLAINABLE:
+            command = {k: v for k, v in event.command.items()
+                       if not k.startswith('$') and k not in STRIP_FIELDS}
+            self.commands.append((event.command_name, copy.deepcopy(command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db):
+    """Fill the scratch database with a small marketplace"""
+    start = datetime.now() - timedelta(days=30)
+    db.users.insert_many([
+        {"user_id": user_id, "username": f"user{user_id}", "full_name": "Plan User", "wallet_balance": 100.0,
+         "role": "buyer", "is_banned": False, "created_at": start + timedelta(hours=user_id - 1000)}
+        for user_id in range(1001, 1001 + USERS)
+    ])
+    db.sellers.insert_many([
+        {"_id": oid(i), "user_id": 1000 + i, "status": "approved" if i % 2 else "pending",
+         "total_earnings": 10.0 * i, "created_at": start + timedelta(hours=i)}
+        for i in range(1, SELLERS + 1)
+    ])
+    gmails = []
+    for i in range(1, GMAILS + 1):
+        status = ('available', 'sold', 'pending')[i % 3]
+        gmails.append({
+            "_id": oid(i), "seller_id": oid(i % SELLERS + 1), "email": f"plan{i}@gmail.com", "password": "plan",
+            "batch_id": f"batch_{i % 4}", "status": status, "created_at": start + timedelta(minutes=i),
+            "buyer_id": 1001 + i % USERS if status == 'sold' else None,
+            "sold_at": start + timedelta(minutes=i, seconds=30) if status == 'sold' else None
+        })
+    db.gmails.insert_many(gmails)
+    db.rebuild_inventory_counters()
+    db.transactions.insert_many([
+        {"_id": oid(i), "user_id": 1001 + i % USERS, "type": "deposit", "amount": 50.0,
+         "cashfree_order_id": f"order_{i}", "status": "success" if i % 2 else "pending",
+         "created_at": start + timedelta(hours=i)}
+        for i in range(1, 41)
+    ])
+    db.rebuild_revenue_daily()
+    db.withdrawals.insert_many([
+        {"_id": oid(i), "seller_id": oid(i), "user_id": 1000 + i, "amount": 25.0, "upi_qr_path": None,
+         "status": "pending", "created_at": start + timedelta(hours=i)}
+        for i in range(1, SELLERS + 1)
+    ])
+    db.support_messages.insert_many([
+        {"_id": oid(i), "user_id": 1001 + i % USERS, "message": "help", "status": "unread" if i % 2 else "read",
+         "created_at": start + timedelta(hours=i)}
+        for i in range(1, 21)
+    ])
+    db.support_tickets.insert_many([
+        {"ticket_id": i, "user_id": 1001 + i % USERS, "subject": "plan", "message": "help",
+         "status": "open" if i % 2 else "resolved", "admin_reply": None,
+         "created_at": start + timedelta(hours=i), "updated_at": start + timedelta(hours=i)}
+        for i in range(1, 21)
+    ])
+    broadcast_id = db.create_broadcast("plan", created_by=1001)
+    db.record_broadcast_results(broadcast_id, [(1001, 'sent', None), (1002, 'failed', 'Forbidden')])
+
+
+def plan_problems(explain: dict, allow_collscan: bool) -> list:
+    """Problems in the winning plan(s) of one explain() result"""
+    problems = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            stage = node.get('stage')
+            if stage == 'COLLSCAN' and not allow_collscan:
+                problems.append("COLLSCAN")
+            elif stage == 'SORT':
+                problems.append("in-memory SORT")
+            lookup = node.get('$lookup')
+            if isinstance(lookup, dict) and node.get('collectionScans') and not allow_collscan:
+                problems.append(f"$lookup from {lookup.get('from')} scans the collection")
+            for key, value in node.items():
+                if key != 'rejectedPlans':
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return sorted(set(problems))
+
+
+def check_plans() -> int:
+    capture = CommandCapture()
+    # Register before mongodb builds its client so every command is seen
+    monitoring.register(capture)
+    # Never touch the live database: seed a throwaway one next to it
+    config.DATABASE_NAME = f"{config.DATABASE_NAME}_plans"
+    import mongodb
+
+    db = mongodb.db
+    failures = 0
+    print("=" * 50)
+    print("MONGODB QUERY PLAN CHECK")
+    print("=" * 50)
+    try:
+        db.client.drop_database(config.DATABASE_NAME)
+        db = mongodb.MongoDatabase()
+        seed(db)
+        for method, args, allow_collscan in CHECKS:
+            capture.commands = []
+            capture.capturing = True
+            try:
+                getattr(db, method)(*args)
+            finally:
+                capture.capturing = False
+
+            problems = []
+            for name, command in capture.commands:
+                explain = db.db.command({"explain": command, "verbosity": "executionStats"})
+                problems.extend(f"{name} {command[name]}: {problem}"
+                                for problem in plan_problems(explain, allow_collscan))
+            if problems:
+                failures += 1
+                print(f"  ✗ {method}{args}")
+                for detail in problems:
+                    print(f"      {detail}")
+            else:
+                print(f"  ✓ {method}{args}")
+    finally:
+        db.client.drop_database(config.DATABASE_NAME)
+
+    print("=" * 50)
+    print("ALL PLANS USE INDEXES" if not failures else f"{failures} METHOD(S) NEED AN INDEX")
+    return 1 if failures else 0
+
+
+def check_stale(drop: bool) -> int:
+    from mongodb import db
+
+    stale = db.stale_indexes()
+    print("=" * 50)
+    print("STALE MONGODB INDEXES")
+    print("=" * 50)
+    for collection, names in stale.items():
+        for name in names:
+            if drop:
+                db.db[collection].drop_index(name)
+            print(f"  {'dropped' if drop else 'stale'}: {collection}.{name}")
+    if not stale:
+        print("  none: every index is in MongoDatabase.INDEXES")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Explain MongoDatabase queries against the declared indexes")
+    parser.add_argument('--stale', action='store_true', help="list indexes not in MongoDatabase.INDEXES")
+    parser.add_argument('--drop', action='store_true', help="with --stale, drop them")
+    args = parser.parse_args()
+
+    if args.stale:
+        return check_stale(args.drop)
+    return check_plans()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Round-trip regression check for the MongoDB backend
+Seeds a scratch database at two queue lengths and counts the commands each
+admin queue method sends to the server. A method that looks rows up one by
+one (N+1) issues more commands for the longer queue; every method here must
+issue the same number either way. Exits non-zero on failure so it can gate CI.
+
+getMore is not counted: it tracks result size, not lookups per row.
+
+Usage: python check_mongo_round_trips.py      # MongoDB at MONGODB_URI, scratch database
+"""
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import monitoring
+
+import config
+
+QUEUE_LENGTHS = (3, 30)
+
+CHECKS = [
+    ('get_pending_sellers', ()),
+    ('get_pending_withdrawals', ()),
+    ('get_pending_withdrawals_with_sales', ()),
+    ('get_pending_gmail_batches', ()),
+    ('get_support_messages', ()),
+    ('get_support_messages', (False,)),
+]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server, excluding getMore"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name != 'getMore':
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, n: int):
+    """Replace the scratch data with n entries in every admin queue"""
+    for collection in (db.users, db.sellers, db.gmails, db.withdrawals, db.support_messages):
+        collection.delete_many({})
+    start = datetime(2025, 1, 1)
+    db.users.insert_many([
+        {"user_id": user_id, "username": f"user{user_id}", "full_name": "Check User",
+         "wallet_balance": 0.0, "role": "seller", "is_banned": False, "created_at": start}
+        for user_id in range(1, n + 1)
+    ])
+    seller_ids = [
+        db.sellers.insert_one({
+            "user_id": user_id, "status": "pending" if user_id % 2 else "approved",
+            "total_earnings": 100.0, "created_at": start + timedelta(minutes=user_id)
+        }).inserted_id
+        for user_id in range(1, n + 1)
+    ]
+    db.gmails.insert_many([
+        {"seller_id": seller_id, "email": f"check{i}_{j}@gmail.com", "password": "check",
+         "status": status, "batch_id": f"batch{i}" if status == 'pending' else None,
+         "buyer_id": 1 if status == 'sold' else None, "created_at": start + timedelta(minutes=i)}
+        for i, seller_id in enumerate(seller_ids)
+        for j, status in enumerate(('pending', 'pending', 'sold'))
+    ])
+    db.rebuild_inventory_counters()
+    db.withdrawals.insert_many([
+        {"user_id": i + 1, "seller_id": seller_id, "amount": 50.0, "upi_id": "check@upi",
+         "upi_qr_path": None, "status": "pending", "created_at": start + timedelta(minutes=i)}
+        for i, seller_id in enumerate(seller_ids)
+    ])
+    db.support_messages.insert_many([
+        {"user_id": user_id, "message": "help", "status": "unread",
+         "created_at": start + timedelta(minutes=user_id)}
+        for user_id in range(1, n + 1)
+    ])
+
+
+def main() -> int:
+    counter = CommandCounter()
+    # Register before mongodb builds its client so every command is seen
+    monitoring.register(counter)
+    # Never touch the live database: seed a throwaway one next to it
+    config.DATABASE_NAME = f"{config.DATABASE_NAME}_roundtrips"
+    import mongodb
+
+    db = mongodb.db
+    print("=" * 50)
+    print("MONGODB ROUND-TRIP CHECK")
+    print("=" * 50)
+
+    counts = {}
+    try:
+        for n in QUEUE_LENGTHS:
+            seed(db, n)
+            for method, args in CHECKS:
+                counter.count = 0
+                rows = getattr(db, method)(*args)
+                counts.setdefault((method, args), []).append((counter.count, len(rows)))
+    finally:
+        db.client.drop_database(config.DATABASE_NAME)
+
+    failures = 0
+    for (method, args), runs in counts.items():
+        detail = ", ".join(f"{rows} rows: {commands} command(s)" for commands, rows in runs)
+        if len({commands for commands, _ in runs}) == 1:
+            print(f"  ✓ {method}{args}  {detail}")
+        else:
+            failures += 1
+            print(f"  ✗ {method}{args}  {detail}")
+
+    print("=" * 50)
+    print("ROUND-TRIPS ARE CONSTANT" if not failures else f"{failures} METHOD(S) SCALE WITH QUEUE LENGTH")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Rate-limit, retry and latency check for the outbound message queue (outbox.py)
+Sends through a real telegram.Bot on the fake Bot API transport from
+bench_bot_replay.py, which records when each message reaches "Telegram" and can
+answer 429 (with retry_after) or 403 for chosen chats. Fails unless the global
+and per-chat rates hold, one chat's messages keep their order, a 429 pauses
+sending and the message still gets through, undeliverable messages reach their
+on_failure callback (dropped ones too), a full queue drops instead of blocking, and a seller's UPI QR
+step no longer waits for the admin notification fan-out. Exits non-zero on
+failure so it can gate CI.
+
+Usage:
+    python check_outbox.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import config
+
+GLOBAL_RATE = 40
+CHAT_RATE = 10
+CHAT_BURST = 1
+ADMINS = 40
+API_LATENCY = 0.02
+
+
+def make_api():
+    from bench_bot_replay import FakeBotAPI
+
+    class RecordingBotAPI(FakeBotAPI):
+        """FakeBotAPI that timestamps sends per chat and can refuse them"""
+
+        def __init__(self, latency: float = 0.0):
+            super().__init__(latency)
+            self.sent = defaultdict(list)       # chat_id -> [(monotonic time, text)]
+            self.refuse = {}                    # chat_id -> [status, ...] answered before succeeding
+
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            params = request_data.parameters if request_data else {}
+            chat_id = params.get('chat_id')
+            if url.endswith(('/sendMessage', '/sendPhoto')) and self.refuse.get(int(chat_id)):
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status = self.refuse[int(chat_id)].pop(0)
+                error = {"ok": False, "error_code": status,
+                         "description": "Too Many Requests: retry after 1" if status == 429 else "Forbidden: bot was blocked by the user"}
+                if status == 429:
+                    error["parameters"] = {"retry_after": 1}
+                return status, json.dumps(error).encode()
+            result = await super().do_request(url, method, request_data, **kwargs)
+            if url.endswith(('/sendMessage', '/sendPhoto')):
+                self.sent[int(chat_id)].append((time.monotonic(), params.get('text') or params.get('caption')))
+            return result
+
+    return RecordingBotAPI
+
+
+def max_in_window(times: list, window: float) -> int:
+    times = sorted(times)
+    start, best = 0, 0
+    for end, t in enumerate(times):
+        while t - times[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def check_limits(check, RecordingBotAPI):
+    from telegram import Bot
+    from outbox import Outbox
+
+    api = RecordingBotAPI(latency=0.005)
+    bot = Bot("123456:OUTBOX", request=api)
+    await bot.initialize()
+    box = Outbox(global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST, workers=8, max_queued=100_000)
+
+    # 3x the global rate over many chats, plus a run of messages to one chat
+    started = time.perf_counter()
+    for i in range(GLOBAL_RATE * 3):
+        box.send_message(bot, 10_000 + i, f"fan-out {i}")
+    for i in range(15):
+        box.send_message(bot, 777, f"seq {i}")
+    enqueue_ms = (time.perf_counter() - started) * 1000
+    check("queueing returns immediately", enqueue_ms < 50, f"{enqueue_ms:.1f} ms")
+    check("nothing delivered yet while the handler is still running", not api.sent)
+    await box.drain(30)
+
+    everything = [t for sends in api.sent.values() for t, _ in sends]
+    check(f"all {GLOBAL_RATE * 3 + 15} messages delivered", len(everything) == GLOBAL_RATE * 3 + 15, len(everything))
+    busiest = max_in_window(everything, 1.0)
+    check(f"global rate: at most {GLOBAL_RATE} (+1 for clock skew) in any second", busiest <= GLOBAL_RATE + 1, busiest)
+    one_chat = api.sent[777]
+    check("one chat's messages keep their order", [text for _, text in one_chat] == [f"seq {i}" for i in range(15)])
+    # Counted over a window rather than gap by gap, so scheduler jitter between two sends can't fail it
+    chat_busiest = max_in_window([t for t, _ in one_chat], 0.5)
+    chat_limit = CHAT_BURST + CHAT_RATE * 0.5
+    check(f"per-chat rate: at most {chat_limit:.0f} sends to one chat in any 500 ms", chat_busiest <= chat_limit,
+          chat_busiest)
+
+    # 429 on one chat: everything pauses for retry_after, then that message still goes through
+    api.sent.clear()
+    api.refuse[555] = [429]
+    box.send_message(bot, 555, "flood")
+    await asyncio.sleep(0.05)
+    paused_at = time.monotonic()
+    for i in range(5):
+        box.send_message(bot, 20_000 + i, f"after 429 {i}")
+    await box.drain(10)
+    others = [t for chat, sends in api.sent.items() if chat != 555 for t, _ in sends]
+    check("429: message retried and delivered", [text for _, text in api.sent[555]] == ["flood"])
+    check("429: other chats wait out retry_after", others and min(others) - paused_at >= 0.9,
+          f"{(min(others) - paused_at) * 1000:.0f} ms" if others else "none sent")
+
+    # 403 (user blocked the bot): no retries, on_failure told
+    failures = []
+
+    async def on_failure(error):
+        failures.append(type(error).__name__)
+
+    api.refuse[666] = [403, 403, 403]
+    box.send_message(bot, 666, "blocked", on_failure=on_failure)
+    await box.drain(10)
+    stats = box.stats()
+    check("403: not retried, on_failure called", failures == ['Forbidden'] and api.refuse[666] == [403, 403], failures)
+    check("metrics: sent, failed, retried, 429s and latency",
+          stats['failed'] == 1 and stats['rate_limited'] == 1 and stats['retried'] == 1
+          and stats['sent'] == GLOBAL_RATE * 3 + 21 and stats['latency_max_ms'] > 0 and stats['queued'] == 0, stats)
+
+    small = Outbox(global_rate=1, chat_rate=1, max_queued=3)
+    dropped = []
+
+    async def on_dropped(error):
+        dropped.append(type(error).__name__)
+
+    accepted = [small.send_message(bot, 30_000 + i, "x", on_failure=on_dropped) for i in range(5)]
+    check("full queue drops instead of blocking", accepted == [True] * 3 + [False] * 2 and
+          small.stats()['dropped'] == 2, accepted)
+    await small.stop(timeout=0)
+    check("dropped messages reach on_failure", dropped == ['OutboxFull'] * 2, dropped)
+    await box.stop()
+    await bot.shutdown()
+
+
+async def check_handler_latency(check, RecordingBotAPI):
+    import bot
+    from telegram import Update
+    from bench_bot_replay import UpdateFactory, seller_script
+    from outbox import outbox
+
+    api = RecordingBotAPI(latency=API_LATENCY)
+    application = bot.create_bot_application(request=api)
+    factory = UpdateFactory()
+    await application.initialize()
+    try:
+        durations = {}
+        for label, kind, payload in seller_script(500_000_001, 5):
+            update = Update.de_json(factory.build(500_000_001, kind, payload), application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            durations[label] = time.perf_counter() - started
+        fan_out = ADMINS * API_LATENCY
+        check(f"UPI QR step does not wait for the {ADMINS}-admin notification ({fan_out * 1000:.0f} ms of sends)",
+              durations['upi qr'] < fan_out / 2, f"{durations['upi qr'] * 1000:.0f} ms")
+        await outbox.drain(30)
+        notified = sum(1 for admin_id in config.ADMIN_IDS if api.sent.get(admin_id))
+        check("every admin still notified", notified == ADMINS, notified)
+    finally:
+        await application.stop() if application.running else None
+        await outbox.stop()
+        await application.shutdown()
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    config.DATABASE_PATH = os.path.join(tmp, 'outbox.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:OUTBOX"
+    config.ADMIN_IDS = [999_000_001 + i for i in range(ADMINS)]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_OUTBOX"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "outbox"
+    config.BOT_MODE = 'polling'
+    # Admins are all notified at once; only the global rate should pace them here
+    config.OUTBOX_GLOBAL_RATE = 1000
+
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(bool(ok))
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("OUTBOX CHECK")
+    print("=" * 50)
+    RecordingBotAPI = make_api()
+    asyncio.run(check_limits(check, RecordingBotAPI))
+    asyncio.run(check_handler_latency(check, RecordingBotAPI))
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("OUTBOX OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
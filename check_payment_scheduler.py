@@ -0,0 +1,237 @@
+"""
+Gateway-traffic and correctness check for payment status polling (payment_scheduler.py)
+Runs a PaymentScheduler on a compressed clock against a scratch SQLite database,
+with PaymentManager.check_payment_status replaced by a fake Cashfree that pays,
+fails or ignores each order at a chosen time and records every call. Fails
+unless every order gets exactly one outcome, payments are noticed within one
+backoff step, abandoned orders cost a bounded number of calls, concurrent calls
+stay within the limit and never overlap for one order, and cancelled orders stop
+costing calls. Then drives a wallet top-up through the real Application on the
+fake Bot API transport from check_outbox.py, paying one order and cancelling
+another. Exits non-zero on failure so it can gate CI.
+
+Usage:
+    python check_payment_scheduler.py
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import config
+
+# Compressed clock: 3 s stands in for PAYMENT_TIMEOUT
+INITIAL = 0.05
+BACKOFF = 1.5
+MAX_INTERVAL = 0.4
+TIMEOUT = 3.0
+CONCURRENCY = 3
+GATEWAY_LATENCY = 0.01
+USER_ID = 300_000_001
+
+
+class FakeCashfree:
+    """Answers check_payment_status from a script of (status, at seconds) per order"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.script = {}                    # order_id -> (status, seconds after start)
+        self.calls = defaultdict(list)      # order_id -> [monotonic time]
+        self.in_flight = Counter()
+        self.max_in_flight = 0
+        self.overlapping = set()
+
+    async def check_payment_status(self, order_id: str) -> dict:
+        self.calls[order_id].append(time.monotonic())
+        self.in_flight[order_id] += 1
+        if self.in_flight[order_id] > 1:
+            self.overlapping.add(order_id)
+        self.max_in_flight = max(self.max_in_flight, sum(self.in_flight.values()))
+        try:
+            await asyncio.sleep(GATEWAY_LATENCY)
+        finally:
+            self.in_flight[order_id] -= 1
+        status, at = self.script.get(order_id, (None, 0))
+        if status and time.monotonic() - self.started >= at:
+            return {'success': True, 'status': status, 'amount': 100, 'payment_time': None}
+        return {'success': False, 'status': 'PENDING'}
+
+
+def checks_per_abandoned_order(initial: float, backoff: float, max_interval: float, timeout: float) -> int:
+    """Cashfree calls the scheduler makes for an order nobody pays"""
+    elapsed, gap, calls = initial, initial, 1
+    while elapsed < timeout:
+        gap = min(max_interval, gap * backoff)
+        elapsed = min(timeout, elapsed + gap)
+        calls += 1
+    return calls
+
+
+async def check_scheduler(check, gateway, db):
+    from payment import payment_manager
+    from payment_scheduler import PaymentScheduler
+
+    scheduler = PaymentScheduler(initial=INITIAL, backoff=BACKOFF, max_interval=MAX_INTERVAL,
+                                 concurrency=CONCURRENCY, timeout=TIMEOUT)
+    rng = random.Random(7)
+    expected, outcomes, settled_at = {}, defaultdict(list), {}
+    gateway.started = time.monotonic()
+
+    def recorder(order_id):
+        async def on_result(status):
+            outcomes[order_id].append(status)
+            settled_at[order_id] = time.monotonic() - gateway.started
+        return on_result
+
+    plan = ['SUCCESS'] * 30 + ['FAILED'] * 10 + ['CANCELLED'] * 10 + ['DISCARDED'] * 5 + ['TIMEOUT'] * 25
+    for n, kind in enumerate(plan):
+        order_id = f"order_check_{n}"
+        db.create_transaction(USER_ID + n, 'wallet_add', 100, cashfree_order_id=order_id)
+        if kind in ('SUCCESS', 'FAILED'):
+            gateway.script[order_id] = (kind, rng.uniform(0, TIMEOUT * 0.8))
+        expected[order_id] = 'CANCELLED' if kind == 'DISCARDED' else kind
+        scheduler.watch(order_id, recorder(order_id))
+    # A second watcher for the same order shares its checks
+    scheduler.watch('order_check_0', recorder('order_check_0'))
+    tasks_while_watching = len(asyncio.all_tasks())
+
+    await asyncio.sleep(1.0)
+    cancelled_at = time.monotonic()
+    for order_id, kind in zip(expected, plan):
+        if kind == 'CANCELLED':
+            await payment_manager.cancel_payment(order_id)
+        elif kind == 'DISCARDED':
+            scheduler.discard(order_id)
+    await asyncio.sleep(TIMEOUT + 1.0)
+    stats = scheduler.stats()
+    await scheduler.stop()
+
+    wrong = {order_id: outcomes[order_id] for order_id, status in expected.items()
+             if outcomes[order_id] != ([status, status] if order_id == 'order_check_0' else [status])}
+    check(f"every order gets exactly one outcome ({len(expected)} orders)", not wrong, wrong)
+    check(f"one task polls every order ({tasks_while_watching} tasks with {len(expected)} orders watched)",
+          tasks_while_watching <= 3, tasks_while_watching)
+    check("duplicate watch coalesced into the same checks", stats['coalesced'] == 1, stats)
+
+    lags = [settled_at[order_id] - gateway.script[order_id][1] for order_id, kind in zip(expected, plan)
+            if kind in ('SUCCESS', 'FAILED') and order_id in settled_at]
+    check(f"payments noticed within one backoff step ({MAX_INTERVAL * 1000:.0f} ms + a call)",
+          max(lags) <= MAX_INTERVAL + 2 * GATEWAY_LATENCY + 0.1, f"max lag {max(lags) * 1000:.0f} ms")
+
+    bound = checks_per_abandoned_order(INITIAL, BACKOFF, MAX_INTERVAL, TIMEOUT)
+    abandoned = [len(gateway.calls[order_id]) for order_id, kind in zip(expected, plan) if kind == 'TIMEOUT']
+    check(f"abandoned order: at most {bound} calls (a fixed {INITIAL * 1000:.0f} ms loop makes "
+          f"{int(TIMEOUT / INITIAL)})", max(abandoned) <= bound, abandoned)
+    late = [order_id for order_id, kind in zip(expected, plan) if kind in ('CANCELLED', 'DISCARDED')
+            and sum(1 for t in gateway.calls[order_id] if t > cancelled_at + GATEWAY_LATENCY)]
+    check("cancelled orders stop costing calls", not late, late)
+    check(f"at most {CONCURRENCY} calls in flight, never two for one order",
+          gateway.max_in_flight <= CONCURRENCY and not gateway.overlapping,
+          (gateway.max_in_flight, gateway.overlapping))
+    default = checks_per_abandoned_order(config.PAYMENT_POLL_INITIAL, config.PAYMENT_POLL_BACKOFF,
+                                         config.PAYMENT_POLL_MAX, config.PAYMENT_TIMEOUT)
+    print(f"  default settings: {default} Cashfree calls per abandoned {config.PAYMENT_TIMEOUT // 60}-minute "
+          f"checkout (5 s loop: {config.PAYMENT_TIMEOUT // 5})")
+
+
+async def check_bot(check, gateway, storage_db):
+    import bot
+    from telegram import Update
+    from bench_bot_replay import UpdateFactory
+    from check_outbox import make_api
+    from outbox import outbox
+    from payment import PaymentManager
+    from payment_scheduler import payment_scheduler
+
+    async def create_payment_order(user_id: int, amount: float) -> dict:
+        order_id = f"order_bot_{len(gateway.script)}"
+        storage_db.create_transaction(user_id, 'wallet_add', amount, cashfree_order_id=order_id)
+        gateway.script[order_id] = (None, 0)
+        return {'success': True, 'order_id': order_id, 'payment_link': 'https://pay.example/checkout'}
+
+    PaymentManager.create_payment_order = staticmethod(create_payment_order)
+    api = make_api()()
+    application = bot.create_bot_application(request=api)
+    factory = UpdateFactory()
+    storage_db.create_user(USER_ID, 'payer', 'Payer')
+
+    async def press(data):
+        await application.process_update(Update.de_json(factory.build(USER_ID, 'callback', data), application.bot))
+
+    await application.initialize()
+    try:
+        gateway.started = time.monotonic()
+        await press('amount_100')
+        paid = application.user_data[USER_ID].get('pending_payment')
+        check("top-up is watched by the scheduler, not a task of its own",
+              paid and payment_scheduler.is_watching(paid), payment_scheduler.stats())
+        gateway.script[paid] = ('SUCCESS', 0)
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if not payment_scheduler.is_watching(paid):
+                break
+        await outbox.drain(5)
+        texts = [text for _, text in api.sent.get(USER_ID, [])]
+        user = storage_db.get_user(USER_ID)
+        check("paid top-up credited once and the user told",
+              user['wallet_balance'] == 100 and any('Payment Successful' in (t or '') for t in texts)
+              and storage_db.get_transaction_by_order_id(paid)['status'] == 'success'
+              and application.user_data[USER_ID].get('pending_payment') is None, (user['wallet_balance'], texts))
+        check("success credited without a second Cashfree call", len(gateway.calls[paid]) == 1, gateway.calls[paid])
+
+        await press('amount_50')
+        dropped = application.user_data[USER_ID].get('pending_payment')
+        await press(f'cancel_payment_{dropped}')
+        calls = len(gateway.calls[dropped])
+        await asyncio.sleep(0.5)
+        check("cancel button stops the checks", not payment_scheduler.is_watching(dropped)
+              and len(gateway.calls[dropped]) == calls and storage_db.get_user(USER_ID)['wallet_balance'] == 100)
+    finally:
+        await application.stop() if application.running else None
+        await bot.stop_background_tasks(application)
+        await application.shutdown()
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    config.DATABASE_PATH = os.path.join(tmp, 'payments.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:PAYMENTS"
+    config.ADMIN_IDS = [999_000_001]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_PAYMENTS"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "payments"
+    config.BOT_MODE = 'polling'
+    defaults = (config.PAYMENT_POLL_INITIAL, config.PAYMENT_POLL_BACKOFF, config.PAYMENT_POLL_MAX)
+    # The bot's scheduler runs on the compressed clock too
+    config.PAYMENT_POLL_INITIAL, config.PAYMENT_POLL_BACKOFF, config.PAYMENT_POLL_MAX = INITIAL, BACKOFF, MAX_INTERVAL
+
+    from payment import PaymentManager
+    from storage import db
+
+    gateway = FakeCashfree()
+    PaymentManager.check_payment_status = staticmethod(gateway.check_payment_status)
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(bool(ok))
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("PAYMENT SCHEDULER CHECK")
+    print("=" * 50)
+    asyncio.run(check_bot(check, gateway, db))
+    config.PAYMENT_POLL_INITIAL, config.PAYMENT_POLL_BACKOFF, config.PAYMENT_POLL_MAX = defaults
+    asyncio.run(check_scheduler(check, gateway, db))
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("PAYMENTS OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Query plan regression check for the SQLite backend
+Runs each hot Database method against a seeded scratch database, captures
+the SQL it issues and fails if any plan does a full table scan or builds a
+temp B-tree. Exits non-zero on failure so it can gate CI.
+
+Usage: python check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+from database import Database
+
+# (method, args, allow_sorted_groups)
+# allow_sorted_groups: the query ORDER BYs an aggregate over its GROUP BY
+# output, which no index can pre-sort; the grouping itself must still be indexed
+CHECKS = [
+    ('get_user', (1001,), False),
+    ('get_wallet_balance', (1001,), False),
+    ('get_all_users', (), False),
+    ('get_seller', (1,), False),
+    ('get_seller_by_id', (1,), False),
+    ('get_pending_sellers', (), False),
+    ('get_available_gmails_count', (), False),
+    ('get_inventory_counts', (1,), False),
+    ('get_seller_sales', (1,), False),
+    ('get_user_purchases', (1001,), False),
+    ('get_sold_gmails_by_seller', (1,), False),
+    ('get_all_purchases', (), False),
+    ('get_seller_gmail_batches', (1,), True),
+    ('get_pending_gmail_batches', (), True),
+    ('get_transaction_by_order_id', ('order_5',), False),
+    ('get_user_transactions', (1001, 10), False),
+    ('get_pending_withdrawals', (), False),
+    ('get_all_tickets', (), False),
+    ('get_all_tickets', ('open',), False),
+    ('get_support_messages', (), False),
+    ('get_support_messages', (False,), False),
+    ('get_users_with_stats', (), False),
+    ('get_broadcast', (1,), False),
+    ('get_broadcasts', (), False),
+    ('get_unfinished_broadcasts', (), False),
+    ('get_pending_broadcast_recipients', (1,), False),
+    # Keyset pages: (after_id, limit)
+    ('get_all_users', (1030, 10), False),
+    ('get_users_with_stats', (1030, 10), False),
+    ('get_all_sellers_with_stats', (5, 3), False),
+    ('get_all_purchases', (5, 10), False),
+    ('get_all_gmails', (100, 10), False),
+    ('get_all_transactions', (5, 3), False),
+    ('get_pending_withdrawals', (0, 10), False),
+    ('get_all_tickets', (None, 1, 10), False),
+    ('get_all_tickets', ('open', 1, 10), False),
+    ('get_support_messages', (True, 1, 10), False),
+    ('get_pending_broadcast_recipients', (1, 1010, 10), False),
+    ('purchase_gmails', (1002, 2), False),
+    ('checkout', (1003, 2, 1.0), False),
+]
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+# Tables that are tiny by design and fine to read in full (broadcasts: one row per
+# dashboard broadcast, listed newest first straight off the rowid)
+SMALL_TABLES = {'inventory_counters', 'broadcasts'}
+
+
+def seed(db: Database):
+    """Populate a scratch database with enough rows for realistic plans"""
+    for user_id in range(1000, 1050):
+        db.create_user(user_id, f"user{user_id}", "User")
+        db.update_wallet(user_id, 1000)
+    for seller_user in range(1040, 1050):
+        db.create_seller(seller_user, 'qr.png')
+    seller_ids = [db.get_seller(uid)['seller_id'] for uid in range(1040, 1050)]
+    for i, seller_id in enumerate(seller_ids):
+        for batch in range(5):
+            batch_id = f"batch_{i}_{batch}"
+            db.ingest_gmails(seller_id, [(f"s{i}b{batch}n{n}@gmail.com", "pass1234") for n in range(40)], batch_id)
+            if batch < 4:
+                db.approve_gmail_batch(batch_id)
+    db.purchase_gmails(1001, 20)
+    for n in range(10):
+        db.create_transaction(1001, 'wallet_add', 50, cashfree_order_id=f"order_{n}")
+    db.create_withdrawal(seller_ids[0], 1040, 10, 'qr.png')
+    db.create_support_ticket(1001, 'Subject', 'Message')
+    db.save_support_message(1001, 'Help')
+    broadcast_id = db.create_broadcast('Hello', created_by=1001)
+    db.record_broadcast_results(broadcast_id, [(1001, 'sent', None), (1002, 'failed', 'Forbidden')])
+
+
+def capture_sql(db: Database, method: str, args: tuple) -> list:
+    """Run a Database method and return the SELECT statements it issued"""
+    statements = []
+    # Holding the thread's pooled connection makes the method reuse it
+    conn = db.get_connection()
+    try:
+        conn.set_trace_callback(statements.append)
+        getattr(db, method)(*args)
+    finally:
+        conn.set_trace_callback(None)
+        conn.close()
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+def plan_problems(db: Database, sql: str, allow_sorted_groups: bool) -> list:
+    """Return the offending EXPLAIN QUERY PLAN lines for a statement"""
+    conn = db.get_connection()
+    try:
+        details = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()]
+    finally:
+        conn.close()
+
+    problems = []
+    for detail in details:
+        scan = FULL_SCAN.match(detail)
+        if scan and scan.group(1) not in SMALL_TABLES:
+            problems.append(detail)
+        elif 'TEMP B-TREE' in detail:
+            if allow_sorted_groups and 'ORDER BY' in detail:
+                continue
+            problems.append(detail)
+    return problems
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'plans.db'))
+        seed(db)
+
+        failures = 0
+        print("=" * 50)
+        print("QUERY PLAN CHECK")
+        print("=" * 50)
+        for method, args, allow_sorted_groups in CHECKS:
+            problems = []
+            for sql in capture_sql(db, method, args):
+                problems.extend(plan_problems(db, sql, allow_sorted_groups))
+            if problems:
+                failures += 1
+                print(f"  ✗ {method}{args}")
+                for detail in problems:
+                    print(f"      {detail}")
+            else:
+                print(f"  ✓ {method}{args}")
+        db.pool.close_all()
+
+    print("=" * 50)
+    print("ALL PLANS USE INDEXES" if not failures else f"{failures} METHOD(S) NEED AN INDEX")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
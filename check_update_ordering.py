@@ -0,0 +1,155 @@
+"""
+Concurrency and per-user ordering check for bot update processing
+First drives PerUserUpdateProcessor directly with interleaved updates from many
+users whose handlers take different times, then runs back-to-back seller flows
+(sell -> Gmail list -> UPI QR) through the real Application on the fake Bot API
+transport from bench_bot_replay.py. Fails if one user's updates overlap or run
+out of order, if the concurrency limit is exceeded or never used, if a busy
+user blocks the others, or if any seller flow breaks. Exits non-zero on failure
+so it can gate CI.
+
+Usage:
+    python check_update_ordering.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from telegram import Update
+
+import config
+
+CONCURRENCY = 4
+USERS = 12
+UPDATES_PER_USER = 6
+BURST = 40
+SELLERS = 40
+
+
+def message_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "text": "x",
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "Order"}},
+    }, None)
+
+
+async def check_processor(check):
+    from update_processor import PerUserUpdateProcessor
+
+    processor = PerUserUpdateProcessor(concurrency=CONCURRENCY, max_pending=1000)
+    spans = defaultdict(list)
+    running = {'now': 0, 'max': 0}
+
+    async def handler(user_id: int, seq: int, delay: float):
+        running['now'] += 1
+        running['max'] = max(running['max'], running['now'])
+        started = time.perf_counter()
+        await asyncio.sleep(delay)
+        running['now'] -= 1
+        spans[user_id].append((seq, started, time.perf_counter()))
+
+    # Like PTB's update fetcher: one task per update, in arrival order.
+    # Earlier updates sleep longer, so anything but strict per-user ordering shows up.
+    tasks = []
+    update_id = 0
+    for seq in range(UPDATES_PER_USER):
+        for user_id in range(1, USERS + 1):
+            update_id += 1
+            delay = (UPDATES_PER_USER - seq) * 0.002
+            tasks.append(asyncio.create_task(processor.process_update(
+                message_update(update_id, user_id), handler(user_id, seq, delay))))
+    await asyncio.gather(*tasks)
+
+    ordered = all([seq for seq, _, _ in runs] == list(range(UPDATES_PER_USER)) for runs in spans.values())
+    overlapping = any(later[1] < earlier[2] for runs in spans.values() for earlier, later in zip(runs, runs[1:]))
+    check("each user's updates run in arrival order", ordered)
+    check("a user's updates never overlap", not overlapping)
+    check(f"at most {CONCURRENCY} handlers at once", running['max'] <= CONCURRENCY, running['max'])
+    check("handlers for different users run in parallel", running['max'] > 1, running['max'])
+    check("per-user locks released", not processor._users, len(processor._users))
+
+    # One user bursts; a user arriving afterwards must not wait for the whole burst
+    finished = {}
+
+    async def timed(name: str, delay: float):
+        await asyncio.sleep(delay)
+        finished[name] = time.perf_counter()
+
+    tasks = [asyncio.create_task(processor.process_update(message_update(1000 + i, 999), timed(f"burst{i}", 0.005)))
+             for i in range(BURST)]
+    tasks.append(asyncio.create_task(processor.process_update(message_update(2000, 888), timed("other", 0.005))))
+    await asyncio.gather(*tasks)
+    check(f"a {BURST}-update burst from one user does not block others",
+          finished["other"] < finished[f"burst{BURST // 2}"])
+
+
+async def check_application(check):
+    import bot
+    import storage
+    from bench_bot_replay import FakeBotAPI, UpdateFactory, seller_script
+
+    transport = FakeBotAPI(latency=0.002)
+    application = bot.create_bot_application(request=transport)
+    check("Application uses PerUserUpdateProcessor",
+          type(application.update_processor).__name__ == 'PerUserUpdateProcessor')
+    factory = UpdateFactory()
+    sellers = [400_000_000 + i for i in range(SELLERS)]
+    scripts = {user_id: seller_script(user_id, 5) for user_id in sellers}
+
+    await application.initialize()
+    await application.start()
+    try:
+        # Every seller sends their whole flow back to back, all queued at once
+        for user_id in sellers:
+            for _, kind, payload in scripts[user_id]:
+                await application.update_queue.put(Update.de_json(factory.build(user_id, kind, payload), application.bot))
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and (not application.update_queue.empty()
+                                              or application.update_processor.current_concurrent_updates):
+            await asyncio.sleep(0.05)
+    finally:
+        await application.stop()
+        await application.shutdown()
+
+    batches = storage.get_backend().get_pending_gmail_batches()
+    check(f"all {SELLERS} back-to-back seller flows completed in order", len(batches) == SELLERS,
+          f"{len(batches)} batches submitted")
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    config.DATABASE_PATH = os.path.join(tmp, 'ordering.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:ORDERING"
+    config.ADMIN_IDS = [999_000_001]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_ORDERING"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "ordering"
+    config.BOT_MODE = 'polling'
+    config.BOT_CONCURRENT_UPDATES = 8
+
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(bool(ok))
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("UPDATE ORDERING CHECK")
+    print("=" * 50)
+    asyncio.run(check_processor(check))
+    asyncio.run(check_application(check))
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("ORDERING OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Local check for webhook mode, with a fake poster in place of Telegram
+Builds the bot in BOT_MODE=webhook on the fake Bot API transport from
+bench_bot_replay.py and POSTs updates to the dashboard's webhook endpoint
+through Flask's test client. Fails unless bad secrets are refused, a full queue
+answers 503 until the bot drains it, redelivered update_ids are handled once,
+every accepted update reaches a handler, and a running bot with concurrent
+updates stuck in slow handlers answers 503 instead of taking more. Exits
+non-zero on failure so it can gate CI.
+
+Usage:
+    python check_webhook.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import config
+
+SECRET = 'check-webhook-secret'
+QUEUE_SIZE = 5
+USER_BASE = 300_000_000
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    # Scratch storage, dummy credentials, and a tiny queue so backpressure is easy to hit
+    config.DATABASE_PATH = os.path.join(tmp, 'webhook.db')
+    config.STORAGE_BACKEND = 'sqlite'
+    config.TELEGRAM_BOT_TOKEN = "123456:WEBHOOK"
+    config.ADMIN_IDS = [999_000_001]
+    config.CASHFREE_APP_ID = config.CASHFREE_APP_ID or "TEST_WEBHOOK"
+    config.CASHFREE_SECRET_KEY = config.CASHFREE_SECRET_KEY or "webhook"
+    config.DASHBOARD_URL = "https://example.invalid"
+    config.BOT_MODE = 'webhook'
+    config.WEBHOOK_SECRET = SECRET
+    config.WEBHOOK_QUEUE_SIZE = QUEUE_SIZE
+    # The production setting: PTB takes updates off the queue as fast as they arrive
+    config.BOT_CONCURRENT_UPDATES = 4
+
+    import bot
+    from telegram.ext import CommandHandler
+    from dashboard import app as flask_app
+    from bench_bot_replay import FakeBotAPI, UpdateFactory
+    from webhook import SECRET_HEADER, WebhookIngress, serve_webhook
+
+    transport = FakeBotAPI()
+    application = bot.create_bot_application(request=transport)
+    # /block handlers wait until the check releases them, like a stalled gateway call
+    blocked, gate = [], None
+
+    async def block(update, context):
+        blocked.append(update.update_id)
+        await gate.wait()
+    application.add_handler(CommandHandler('block', block), group=-1)
+    ingress = WebhookIngress(application)
+    ingress.register(flask_app)
+    client = flask_app.test_client()
+    factory = UpdateFactory()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def post(payload, secret=SECRET):
+        headers = {SECRET_HEADER: secret} if secret is not None else {}
+        return client.post(config.WEBHOOK_PATH, json=payload, headers=headers).status_code
+
+    def start_update(n):
+        return factory.build(USER_BASE + n, 'message', '/start')
+
+    def wait_for(condition, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(ok)
+        print(f"  {'✓' if ok else '✗'} {label}{'' if ok else f' ({detail})'}")
+
+    print("=" * 50)
+    print("WEBHOOK INGESTION CHECK")
+    print("=" * 50)
+
+    first = start_update(0)
+    check("not attached -> 503", post(first) == 503)
+
+    # Attached but not yet processing: the bounded queue fills up
+    asyncio.run_coroutine_threadsafe(application.initialize(), loop).result()
+    ingress.attach(loop)
+    check("missing secret -> 403", post(first, secret=None) == 403)
+    check("wrong secret -> 403", post(first, secret='nope') == 403)
+    check("malformed update -> 400", post({'message': {}}) == 400)
+
+    queued = [first] + [start_update(n) for n in range(1, QUEUE_SIZE)]
+    statuses = [post(update) for update in queued]
+    check(f"{QUEUE_SIZE} updates fill the queue", statuses == [200] * QUEUE_SIZE, statuses)
+    overflow = start_update(QUEUE_SIZE)
+    status = post(overflow)
+    check("full queue -> 503 (backpressure)", status == 503, status)
+    check("redelivery while queued -> 200, not queued twice",
+          post(first) == 200 and application.update_queue.qsize() == QUEUE_SIZE)
+    ingress.detach()
+
+    # Now run the real serving loop; it drains the backlog
+    stop = asyncio.Event()
+    serving = asyncio.run_coroutine_threadsafe(serve_webhook(application, ingress, stop), loop)
+    check("webhook registered with Telegram", wait_for(lambda: transport.calls['setWebhook'] == 1))
+    check("backlog drained", wait_for(lambda: ingress.loop is not None and ingress.backlog() == 0))
+    status = post(overflow)
+    check("retried update accepted once there is room", status == 200, status)
+
+    later = [start_update(n) for n in range(QUEUE_SIZE + 1, QUEUE_SIZE + 20)]
+    for update in later:
+        post(update)
+    # Telegram redelivers some updates (timeouts on its side)
+    for update in later[:5] + [first]:
+        post(update)
+
+    expected = QUEUE_SIZE + 1 + len(later)
+    handled = wait_for(lambda: transport.calls['sendMessage'] >= expected) and \
+        wait_for(lambda: application.update_queue.empty())
+    time.sleep(0.2)
+    replies = transport.calls['sendMessage']
+    check(f"each of {expected} unique updates handled exactly once", handled and replies == expected,
+          f"{replies} replies")
+    check("duplicates counted", ingress.stats['duplicate'] == 7, dict(ingress.stats))
+
+    # Running with concurrent updates, every handler stuck: the queue stays empty,
+    # so only counting updates still being handled can push back
+    async def close_gate():
+        nonlocal gate
+        gate = asyncio.Event()
+    asyncio.run_coroutine_threadsafe(close_gate(), loop).result()
+    wait_for(lambda: ingress.backlog() == 0)
+    stuck = [factory.build(USER_BASE + 500 + n, 'message', '/block') for n in range(QUEUE_SIZE * 4)]
+    statuses = []
+    for update in stuck:
+        statuses.append(post(update))
+        time.sleep(0.01)  # let the bot take each one off the queue
+    accepted = statuses.count(200)
+    check(f"slow handlers -> 503 once {QUEUE_SIZE} updates are in hand (running bot)",
+          accepted == QUEUE_SIZE and statuses[-1] == 503 and application.update_queue.empty(),
+          f"{accepted} accepted, backlog {ingress.backlog()}")
+    loop.call_soon_threadsafe(gate.set)
+    check("released handlers finish and room opens again",
+          wait_for(lambda: len(blocked) == accepted and ingress.backlog() == 0)
+          and post(stuck[-1]) == 200, f"backlog {ingress.backlog()}")
+
+    loop.call_soon_threadsafe(stop.set)
+    serving.result(timeout=10)
+    check("after shutdown -> 503", post(start_update(999)) == 503)
+    loop.call_soon_threadsafe(loop.stop)
+
+    failures = results.count(False)
+    print("=" * 50)
+    print("WEBHOOK OK" if not failures else f"{failures} CHECK(S) FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -34,11 +34,84 @@ MAX_WALLET_ADD = int(os.getenv('MAX_WALLET_ADD', 500))
 # Payment Timer (in seconds)
 PAYMENT_TIMEOUT = int(os.getenv('PAYMENT_TIMEOUT', 900))
 
+# Payment status checks (payment_scheduler.py): the first after PAYMENT_POLL_INITIAL
+# seconds, each later gap PAYMENT_POLL_BACKOFF times longer, up to PAYMENT_POLL_MAX
+PAYMENT_POLL_INITIAL = float(os.getenv('PAYMENT_POLL_INITIAL', 3))
+PAYMENT_POLL_BACKOFF = float(os.getenv('PAYMENT_POLL_BACKOFF', 1.5))
+PAYMENT_POLL_MAX = float(os.getenv('PAYMENT_POLL_MAX', 60))
+PAYMENT_POLL_CONCURRENCY = int(os.getenv('PAYMENT_POLL_CONCURRENCY', 4))  # Cashfree status calls in flight at once
+
 # Database Configuration - MongoDB
 MONGODB_URI = os.getenv('MONGODB_URI')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'gmail_marketplace')
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'gmail_marketplace.db')  # Fallback to SQLite
 
+# Which backend the bot, payments and dashboard share: 'sqlite' or 'mongodb'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').strip().lower()
+
+# SQLite connection pool / tuning
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))
+SQLITE_POOL_TIMEOUT = float(os.getenv('SQLITE_POOL_TIMEOUT', 30))
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').strip().upper()  # OFF, NORMAL, FULL
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 134217728))  # 128 MB
+
+# Bulk Gmail ingest (rows per INSERT batch)
+GMAIL_INGEST_CHUNK_SIZE = int(os.getenv('GMAIL_INGEST_CHUNK_SIZE', 500))
+
+# MongoDB purchase claims: rounds spent topping up a short claim, and how many
+# times the shortfall each round samples candidates from (spreads concurrent buyers)
+GMAIL_CLAIM_ATTEMPTS = int(os.getenv('GMAIL_CLAIM_ATTEMPTS', 5))
+GMAIL_CLAIM_WINDOW = int(os.getenv('GMAIL_CLAIM_WINDOW', 4))
+
+# Dashboard /api/* list pages (rows per page, and the most a client may ask for)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 500))
+
+# Seconds the admin/dashboard statistics snapshot is reused before recomputing
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 30))
+
+# Worker threads that run blocking database calls for the async handlers.
+# They share the SQLite pool with the broadcast worker thread (one connection)
+# and the dashboard's Flask request threads (one each while serving), so the
+# default leaves at least two connections to those; dashboard requests beyond
+# what is left wait up to SQLITE_POOL_TIMEOUT for one.
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', max(1, min(4, SQLITE_POOL_SIZE - 2))))
+
+# Bot updates handled at once (1 = one at a time); each user's updates always run in order
+BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', 16))
+# Updates accepted for processing, including ones waiting behind the same user
+BOT_MAX_PENDING_UPDATES = int(os.getenv('BOT_MAX_PENDING_UPDATES', 1024))
+# Inline-button handlers slower than this are logged (per-route timings: /routes)
+SLOW_CALLBACK_MS = float(os.getenv('SLOW_CALLBACK_MS', 1000))
+
+# How the bot receives updates: 'polling' (getUpdates) or 'webhook' (POSTs to the
+# dashboard server at WEBHOOK_PATH; start with run.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').strip()  # public base URL, defaults to DASHBOARD_URL
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook').strip()
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '').strip()  # echoed by Telegram in X-Telegram-Bot-Api-Secret-Token
+# Updates accepted and not yet handled (queued, waiting or running) before the endpoint answers 503 (Telegram retries later)
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+# Recent update_ids remembered so redelivered updates are handled once
+WEBHOOK_DEDUPE_WINDOW = int(os.getenv('WEBHOOK_DEDUPE_WINDOW', 10000))
+
+# Outbound queue for notifications (outbox.py), kept inside Telegram's flood limits
+OUTBOX_GLOBAL_RATE = float(os.getenv('OUTBOX_GLOBAL_RATE', 30))    # messages/sec across all chats
+OUTBOX_CHAT_RATE = float(os.getenv('OUTBOX_CHAT_RATE', 1))         # messages/sec to one private chat
+OUTBOX_CHAT_BURST = int(os.getenv('OUTBOX_CHAT_BURST', 3))         # sent back to back before CHAT_RATE applies
+OUTBOX_GROUP_RATE = float(os.getenv('OUTBOX_GROUP_RATE', 20 / 60))  # messages/sec to one group or channel
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 8))               # Bot API calls in flight at once
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', 3))       # per message, after 429s and network errors
+OUTBOX_QUEUE_SIZE = int(os.getenv('OUTBOX_QUEUE_SIZE', 10000))     # pending messages before new ones are dropped
+
+# Dashboard broadcasts (broadcast.py): sent by a background worker, resumable after restarts.
+# Keep BROADCAST_RATE + OUTBOX_GLOBAL_RATE within Telegram's ~30 messages/sec per bot.
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 20))            # messages/sec
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 4))  # Bot API calls in flight at once
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 100))  # recipients loaded per page
+
 # Validation
 def validate_config():
     """Validate required configuration"""
@@ -53,6 +126,28 @@ def validate_config():
     if not CASHFREE_APP_ID or not CASHFREE_SECRET_KEY:
         errors.append("Cashfree credentials (CASHFREE_APP_ID, CASHFREE_SECRET_KEY) are required")
     
+    if STORAGE_BACKEND not in ('sqlite', 'mongodb'):
+        errors.append("STORAGE_BACKEND must be 'sqlite' or 'mongodb'")
+    elif STORAGE_BACKEND == 'mongodb' and not MONGODB_URI:
+        errors.append("MONGODB_URI is required when STORAGE_BACKEND=mongodb")
+    
+    if BOT_MODE not in ('polling', 'webhook'):
+        errors.append("BOT_MODE must be 'polling' or 'webhook'")
+    elif BOT_MODE == 'webhook':
+        if not (WEBHOOK_URL or DASHBOARD_URL):
+            errors.append("WEBHOOK_URL (or DASHBOARD_URL) is required when BOT_MODE=webhook")
+        if not WEBHOOK_SECRET:
+            errors.append("WEBHOOK_SECRET is required when BOT_MODE=webhook")
+    
+    if min(OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_GROUP_RATE) <= 0 or OUTBOX_WORKERS < 1:
+        errors.append("OUTBOX_*_RATE must be positive and OUTBOX_WORKERS at least 1")
+    
+    if PAYMENT_POLL_INITIAL <= 0 or PAYMENT_POLL_BACKOFF < 1 or PAYMENT_POLL_CONCURRENCY < 1:
+        errors.append("PAYMENT_POLL_INITIAL must be positive, PAYMENT_POLL_BACKOFF and PAYMENT_POLL_CONCURRENCY at least 1")
+    
+    if BROADCAST_RATE <= 0 or BROADCAST_CONCURRENCY < 1 or BROADCAST_BATCH_SIZE < 1:
+        errors.append("BROADCAST_RATE must be positive, BROADCAST_CONCURRENCY and BROADCAST_BATCH_SIZE at least 1")
+    
     if errors:
         raise ValueError(f"Configuration errors:\n" + "\n".join(f"- {err}" for err in errors))
     
@@ -7,19 +7,9 @@ from flask_cors import CORS
 from functools import wraps
 import config
 
-# Always use SQLite database (same as Telegram bot)
-from database import db
-import config
-
-# Database path logging for debugging
-import os
-print("=" * 50)
-print("WEB DASHBOARD STARTING - Database Info:")
-print(f"DATABASE_PATH: {config.DATABASE_PATH}")
-print(f"DB instance path: {db.db_path}")
-print(f"Absolute path: {os.path.abspath(db.db_path)}")
-print(f"File exists: {os.path.exists(db.db_path)}")
-print("=" * 50)
+# Same storage backend as the bot (STORAGE_BACKEND), connected on first use
+from storage import db
+from broadcast import broadcast_worker
 
 app = Flask(__name__)
 app.secret_key = config.CASHFREE_SECRET_KEY or "dev-secret-key-123" # Fallback if key missing
@@ -37,6 +27,25 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def paginate(fetch, id_key, **kwargs):
+    """Serve one keyset page of a db list method from ?after_id=&limit= as {items, next_cursor}"""
+    limit = request.args.get('limit', config.API_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, config.API_MAX_PAGE_SIZE))
+    after_id = request.args.get('after_id') or None
+    
+    # Fetch one extra row to learn whether another page follows
+    try:
+        items = fetch(after_id=after_id, limit=limit + 1, **kwargs)
+    except ValueError:
+        # The backends reject a malformed cursor before querying
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = last[id_key] if id_key in last else str(last['_id'])
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
 @app.route('/')
 def index():
     if 'admin_id' in session:
@@ -85,51 +94,51 @@ def admin_users():
 @app.route('/admin/broadcast', methods=['GET', 'POST'])
 @admin_required
 def admin_broadcast():
-    """Send broadcast message to all users"""
+    """Queue a broadcast message to all users (sent by broadcast.py's background worker)"""
     if request.method == 'GET':
-        users = db.get_all_users()
-        return render_template('admin_broadcast.html', user_count=len(users))
+        return render_template('admin_broadcast.html', user_count=db.get_stats()['total_users'],
+                               broadcasts=db.get_broadcasts(limit=10))
     
-    # POST - Send broadcast
+    # POST - Queue broadcast; the request returns before anything is sent
     try:
-        import requests
         data = request.get_json()
         message = data.get('message', '')
         
         if not message:
             return jsonify({'success': False, 'error': 'Message is required'}), 400
         
-        users = db.get_all_users()
-        sent = 0
-        failed = 0
-        
-        # Send via Telegram Bot API
-        bot_token = config.TELEGRAM_BOT_TOKEN
-        for user in users:
-            try:
-                url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-                payload = {
-                    'chat_id': user['user_id'],
-                    'text': message,
-                    'parse_mode': 'Markdown'
-                }
-                resp = requests.post(url, json=payload, timeout=5)
-                if resp.status_code == 200:
-                    sent += 1
-                else:
-                    failed += 1
-            except:
-                failed += 1
+        broadcast_id = db.create_broadcast(message, created_by=int(session['admin_id']))
+        if broadcast_id is None:
+            return jsonify({'success': False, 'error': 'Could not create broadcast'}), 500
+        broadcast_worker.start()
+        broadcast_worker.wake()
+        broadcast = db.get_broadcast(broadcast_id)
         
         return jsonify({
-            'success': True, 
-            'message': f'Broadcast sent! {sent} delivered, {failed} failed',
-            'sent': sent,
-            'failed': failed
+            'success': True,
+            'message': f"Broadcast queued for {broadcast['total_count']} users",
+            'broadcast': broadcast
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/admin/broadcast/<int:broadcast_id>')
+@admin_required
+def admin_broadcast_progress(broadcast_id):
+    """Delivery progress of one broadcast"""
+    broadcast = db.get_broadcast(broadcast_id)
+    if not broadcast:
+        return jsonify({'success': False, 'error': 'Broadcast not found'}), 404
+    return jsonify({'success': True, 'broadcast': broadcast})
+
+@app.route('/admin/broadcast/<int:broadcast_id>/cancel', methods=['POST'])
+@admin_required
+def admin_broadcast_cancel(broadcast_id):
+    """Stop a broadcast after the page being sent; already-sent messages stay sent"""
+    if not db.update_broadcast_status(broadcast_id, 'cancelled'):
+        return jsonify({'success': False, 'error': 'Broadcast not found or already finished'}), 400
+    return jsonify({'success': True, 'broadcast': db.get_broadcast(broadcast_id)})
+
 @app.route('/admin/sellers')
 @admin_required
 def admin_sellers():
@@ -141,7 +150,7 @@ def admin_sellers():
         print(f"ERROR: {e}")
         return f"<h3>Error loading sellers</h3><p>{str(e)}</p>", 500
 
-@app.route('/admin/sellers/<int:seller_id>/approve', methods=['POST'])
+@app.route('/admin/sellers/<seller_id>/approve', methods=['POST'])
 @admin_required
 def approve_seller_web(seller_id):
     """Approve a seller"""
@@ -152,7 +161,7 @@ def approve_seller_web(seller_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/admin/sellers/<int:seller_id>/reject', methods=['POST'])
+@app.route('/admin/sellers/<seller_id>/reject', methods=['POST'])
 @admin_required
 def reject_seller_web(seller_id):
     """Reject a seller"""
@@ -325,9 +334,8 @@ def get_analytics():
 @app.route('/api/support')
 @admin_required
 def get_support():
-    """Get support messages"""
-    messages = db.get_support_messages(unread_only=False)
-    return jsonify(messages)
+    """Get support messages (paged: ?after_id=&limit=)"""
+    return paginate(db.get_support_messages, 'message_id', unread_only=False)
 
 @app.route('/close')
 def close_webapp():
@@ -346,9 +354,8 @@ def close_webapp():
 @app.route('/api/users')
 @admin_required
 def get_users_api():
-    """Get all users with statistics"""
-    users = db.get_users_with_stats()
-    return jsonify(users)
+    """Get users with statistics (paged: ?after_id=&limit=)"""
+    return paginate(db.get_users_with_stats, 'user_id')
 
 @app.route('/api/user/<int:user_id>')
 @admin_required
@@ -368,50 +375,32 @@ def user_detail_view(user_id):
 @app.route('/api/sellers')
 @admin_required
 def get_sellers():
-    """Get all sellers with stats"""
-    sellers = db.get_all_sellers_with_stats()
-    return jsonify(sellers)
+    """Get sellers with stats (paged: ?after_id=&limit=)"""
+    return paginate(db.get_all_sellers_with_stats, 'seller_id')
 
 @app.route('/api/gmails')
 @admin_required
 def get_gmails():
-    """Get Gmail statistics"""
+    """Get Gmail listings without passwords (paged: ?after_id=&limit=)"""
     try:
-        if USE_MONGODB:
-            gmails = list(db.gmails.find({}, {'password': 0}))  # Don't expose passwords
-            for g in gmails:
-                g['_id'] = str(g['_id'])
-        else:
-            conn = db.get_connection()
-            gmails = [dict(row) for row in conn.execute('SELECT gmail_id, seller_id, email, status, batch_id, buyer_id, created_at, sold_at FROM gmails').fetchall()]
-            conn.close()
-        return jsonify(gmails)
+        return paginate(db.get_all_gmails, 'gmail_id')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/transactions')
 @admin_required
 def get_transactions():
-    """Get all transactions"""
+    """Get transactions, newest first (paged: ?after_id=&limit=)"""
     try:
-        if USE_MONGODB:
-            txns = list(db.transactions.find({}).sort('created_at', -1).limit(100))
-            for t in txns:
-                t['_id'] = str(t['_id'])
-        else:
-            conn = db.get_connection()
-            txns = [dict(row) for row in conn.execute('SELECT * FROM transactions ORDER BY created_at DESC LIMIT 100').fetchall()]
-            conn.close()
-        return jsonify(txns)
+        return paginate(db.get_all_transactions, 'txn_id')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/withdrawals')
 @admin_required
 def get_withdrawals():
-    """Get all withdrawal requests"""
-    withdrawals = db.get_pending_withdrawals()
-    return jsonify(withdrawals)
+    """Get pending withdrawal requests (paged: ?after_id=&limit=)"""
+    return paginate(db.get_pending_withdrawals, 'withdrawal_id')
 
 @app.route('/api/stats')
 @admin_required
@@ -421,4 +410,6 @@ def get_stats():
     return jsonify(stats)
 
 if __name__ == '__main__':
+    # Resume broadcasts interrupted by the last shutdown
+    broadcast_worker.start()
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -1,30 +1,223 @@
 """
 Database operations for Gmail Marketplace Bot
 """
+import os
+import re
 import sqlite3
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Tuple
 import config
+from cache import SnapshotCache
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_\w+\.sql$')
+
+
+def list_migrations(migrations_dir: str = MIGRATIONS_DIR) -> List[Tuple[int, str]]:
+    """List (version, path) for every numbered migration file, oldest first"""
+    migrations = []
+    for name in os.listdir(migrations_dir):
+        match = MIGRATION_FILE.match(name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(migrations_dir, name)))
+    return sorted(migrations)
+
+
+class PooledConnection:
+    """Thin wrapper around a pooled sqlite3 connection; close() hands it back to the pool"""
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        """Release the connection back to the pool instead of closing it"""
+        self._pool.release()
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections, one per thread while in use"""
+
+    def __init__(self, db_path: str, max_size: int = None, timeout: float = None):
+        self.db_path = db_path
+        self.max_size = max_size or config.SQLITE_POOL_SIZE
+        self.timeout = timeout if timeout is not None else config.SQLITE_POOL_TIMEOUT
+        self._idle: List[sqlite3.Connection] = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with the tuned PRAGMA profile"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_BUSY_TIMEOUT,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size = {-int(config.SQLITE_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Check out the current thread's connection, reusing it for nested calls"""
+        local = self._local
+        if getattr(local, 'conn', None) is not None:
+            local.depth += 1
+            return PooledConnection(self, local.conn)
+
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                if not self._cond.wait(self.timeout):
+                    raise sqlite3.OperationalError(
+                        f"SQLite connection pool exhausted ({self.max_size} connections in use)"
+                    )
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._created += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._created -= 1
+                    self._cond.notify()
+                    raise
+
+        local.conn = conn
+        local.depth = 1
+        return PooledConnection(self, conn)
+
+    def release(self):
+        """Return the current thread's connection once the outermost caller is done"""
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            return
+        local.depth -= 1
+        if local.depth > 0:
+            return
+
+        conn = local.conn
+        local.conn = None
+        if conn.in_transaction:
+            # Never hand out a connection with half-finished work on it
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)"""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
 
 class Database:
     def __init__(self, db_path: str = None):
         self.db_path = db_path or config.DATABASE_PATH
+        self.pool = ConnectionPool(self.db_path)
+        self.stats_cache = SnapshotCache(self._compute_stats, config.STATS_CACHE_TTL)
         self.init_db()
     
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get a pooled database connection (call close() to release it)"""
+        return self.pool.acquire()
     
     def init_db(self):
-        """Initialize database with schema"""
+        """Bring the schema up to date by applying pending migrations"""
         conn = self.get_connection()
-        with open('schema.sql', 'r') as f:
-            conn.executescript(f.read())
-        conn.commit()
-        conn.close()
+        try:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            pending = [(version, path) for version, path in list_migrations() if version > current]
+            
+            # Nothing pending means the schema is current and no DDL runs
+            for version, path in pending:
+                with open(path, 'r') as f:
+                    sql = f.read()
+                # Each migration and its version bump commit together
+                conn.executescript(
+                    f"BEGIN IMMEDIATE;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;"
+                )
+                print(f"Applied migration {os.path.basename(path)}")
+        finally:
+            conn.close()
+    
+    def get_schema_version(self) -> int:
+        """Get the applied schema migration version"""
+        conn = self.get_connection()
+        try:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _keyset(table: str, alias: str, sort_col: str, id_col: str,
+                after_id=None, limit: int = None, ascending: bool = False,
+                group_col: str = None) -> Tuple[List[str], list, str, list]:
+        """Build keyset pagination fragments ordered by (sort_col, id_col)
+        
+        Returns (where_conditions, where_params, order_by_and_limit, limit_params).
+        The page starts after the row whose id_col equals after_id. Raises
+        ValueError when after_id is not an integer id. With group_col, rows are
+        ordered by group_col ascending first (sellers: by status, then newest).
+        """
+        if after_id is not None:
+            # Cursors arrive as query-string text; compared as text they would match the wrong rows
+            try:
+                after_id = int(after_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid cursor: {after_id!r}") from None
+        op, direction = ('>', 'ASC') if ascending else ('<', 'DESC')
+        conditions, params = [], []
+        if sort_col == id_col:
+            # Ordered by the id alone: a plain range on the primary key
+            if after_id is not None:
+                conditions.append(f"{alias}.{id_col} {op} ?")
+                params.append(after_id)
+            order = f"ORDER BY {alias}.{id_col} {direction}"
+        elif group_col:
+            if after_id is not None:
+                # Later groups, or the rest of the cursor's group; the >= bound starts the
+                # index walk at the cursor's group
+                group = f"(SELECT {group_col} FROM {table} WHERE {id_col} = ?)"
+                conditions.append(
+                    f"{alias}.{group_col} >= {group} AND ({alias}.{group_col} > {group} OR "
+                    f"({alias}.{sort_col}, {alias}.{id_col}) {op} "
+                    f"(SELECT {sort_col}, {id_col} FROM {table} WHERE {id_col} = ?))"
+                )
+                params.extend([after_id] * 3)
+            order = (f"ORDER BY {alias}.{group_col} ASC, {alias}.{sort_col} {direction}, "
+                     f"{alias}.{id_col} {direction}")
+        else:
+            if after_id is not None:
+                conditions.append(
+                    f"({alias}.{sort_col}, {alias}.{id_col}) {op} "
+                    f"(SELECT {sort_col}, {id_col} FROM {table} WHERE {id_col} = ?)"
+                )
+                params.append(after_id)
+            order = f"ORDER BY {alias}.{sort_col} {direction}, {alias}.{id_col} {direction}"
+        limit_params = []
+        if limit is not None:
+            order += " LIMIT ?"
+            limit_params.append(limit)
+        return conditions, params, order, limit_params
     
     # ==================== USER OPERATIONS ====================
     
@@ -32,14 +225,19 @@ class Database:
         """Create or update user"""
         conn = self.get_connection()
         try:
-            conn.execute('''
+            created = conn.execute('''
                 INSERT INTO users (user_id, username, full_name)
                 VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    username = excluded.username,
-                    full_name = excluded.full_name
-            ''', (user_id, username, full_name))
+                ON CONFLICT(user_id) DO NOTHING
+            ''', (user_id, username, full_name)).rowcount == 1
+            if not created:
+                conn.execute('''
+                    UPDATE users SET username = ?, full_name = ? WHERE user_id = ?
+                ''', (username, full_name, user_id))
             conn.commit()
+            # Only a new user changes the statistics; /start runs this for everyone
+            if created:
+                self.invalidate_stats()
             return True
         except Exception as e:
             print(f"Error creating user: {e}")
@@ -56,11 +254,13 @@ class Database:
         finally:
             conn.close()
     
-    def get_all_users(self) -> List[Dict]:
-        """Get all users"""
+    def get_all_users(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get users, newest first (one page when limit is given, continuing after user after_id)"""
+        conditions, params, order, limit_params = self._keyset('users', 'u', 'created_at', 'user_id', after_id, limit)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         conn = self.get_connection()
         try:
-            rows = conn.execute('SELECT * FROM users ORDER BY created_at DESC').fetchall()
+            rows = conn.execute(f'SELECT u.* FROM users u {where} {order}', params + limit_params).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
@@ -116,6 +316,7 @@ class Database:
             # Update user role
             conn.execute("UPDATE users SET role = 'seller' WHERE user_id = ?", (user_id,))
             conn.commit()
+            self.invalidate_stats()
             return True
         except Exception as e:
             print(f"Error creating seller: {e}")
@@ -157,6 +358,7 @@ class Database:
                 WHERE seller_id = ?
             ''', (status, datetime.now(), admin_id, seller_id))
             conn.commit()
+            self.invalidate_stats()
             return True
         finally:
             conn.close()
@@ -194,18 +396,63 @@ class Database:
     
     def add_gmails(self, seller_id: int, gmails: List[Tuple[str, str]], batch_id: str) -> bool:
         """Add Gmail accounts for sale"""
+        return self.ingest_gmails(seller_id, gmails, batch_id).get('success', False)
+    
+    def ingest_gmails(self, seller_id: int, gmails: List[Tuple[str, str]], batch_id: str,
+                      chunk_size: int = None) -> Dict:
+        """Bulk insert Gmail accounts in chunks, skipping emails already listed
+
+        An email from a rejected batch is not listed, so it may be submitted again.
+        """
+        chunk_size = chunk_size or config.GMAIL_INGEST_CHUNK_SIZE
+        started = time.perf_counter()
+        inserted = 0
+        duplicates = 0
+        seen = set()
         conn = self.get_connection()
         try:
-            for email, password in gmails:
-                conn.execute('''
+            conn.execute('BEGIN IMMEDIATE')
+            for start in range(0, len(gmails), chunk_size):
+                chunk = gmails[start:start + chunk_size]
+                
+                emails = list({email for email, _ in chunk})
+                placeholders = ','.join('?' * len(emails))
+                existing = {row['email'] for row in conn.execute(
+                    f"SELECT email FROM gmails WHERE email IN ({placeholders}) AND status != 'rejected'", emails
+                ).fetchall()}
+                
+                rows = []
+                for email, password in chunk:
+                    if email in seen or email in existing:
+                        duplicates += 1
+                        continue
+                    seen.add(email)
+                    rows.append((seller_id, email, password, batch_id))
+                
+                conn.executemany('''
                     INSERT INTO gmails (seller_id, email, password, batch_id, status)
                     VALUES (?, ?, ?, ?, 'pending')
-                ''', (seller_id, email, password, batch_id))
+                ''', rows)
+                inserted += len(rows)
             conn.commit()
-            return True
+            if inserted:
+                self.invalidate_stats()
+            return {
+                'success': True,
+                'inserted': inserted,
+                'duplicates': duplicates,
+                'elapsed': time.perf_counter() - started
+            }
         except Exception as e:
             print(f"Error adding Gmails: {e}")
-            return False
+            conn.rollback()
+            return {
+                'success': False,
+                'inserted': 0,
+                'duplicates': duplicates,
+                'elapsed': time.perf_counter() - started,
+                'error': str(e)
+            }
         finally:
             conn.close()
     
@@ -220,6 +467,7 @@ class Database:
                 WHERE batch_id = ? AND status = 'pending'
             ''', (status, datetime.now(), batch_id))
             conn.commit()
+            self.invalidate_stats()
             return True
         finally:
             conn.close()
@@ -228,11 +476,25 @@ class Database:
         """Get count of available Gmails"""
         conn = self.get_connection()
         try:
-            row = conn.execute("SELECT COUNT(*) as count FROM gmails WHERE status = 'available'").fetchone()
+            row = conn.execute("SELECT count FROM inventory_counters WHERE status = 'available'").fetchone()
             return row['count'] if row else 0
         finally:
             conn.close()
     
+    def get_inventory_counts(self, seller_id: int = None) -> Dict[str, int]:
+        """Get Gmail counts by status, overall or for one seller"""
+        conn = self.get_connection()
+        try:
+            if seller_id is None:
+                rows = conn.execute('SELECT status, count FROM inventory_counters').fetchall()
+            else:
+                rows = conn.execute(
+                    'SELECT status, count FROM seller_inventory_counters WHERE seller_id = ?', (seller_id,)
+                ).fetchall()
+            return {row['status']: row['count'] for row in rows}
+        finally:
+            conn.close()
+    
     def purchase_gmails(self, buyer_id: int, quantity: int) -> List[Dict]:
         """Purchase Gmail accounts"""
         conn = self.get_connection()
@@ -259,6 +521,7 @@ class Database:
             ''', [buyer_id, datetime.now()] + gmail_ids)
             
             conn.commit()
+            self.invalidate_stats()
             return gmails
         except Exception as e:
             print(f"Error purchasing Gmails: {e}")
@@ -267,6 +530,80 @@ class Database:
         finally:
             conn.close()
     
+    def checkout(self, buyer_id: int, quantity: int, price: float,
+                 seller_rate: float = None) -> Dict:
+        """Atomically reserve Gmails, debit the wallet, record the purchase and credit sellers"""
+        seller_rate = config.SELL_RATE if seller_rate is None else seller_rate
+        total_cost = quantity * price
+        conn = self.get_connection()
+        try:
+            # Take the write lock up front so concurrent buyers serialise here
+            conn.execute('BEGIN IMMEDIATE')
+
+            row = conn.execute('SELECT wallet_balance FROM users WHERE user_id = ?', (buyer_id,)).fetchone()
+            balance = row['wallet_balance'] if row else 0.0
+            if balance < total_cost:
+                conn.rollback()
+                return {'success': False, 'error': 'insufficient_balance', 'balance': balance}
+
+            rows = conn.execute('''
+                SELECT * FROM gmails
+                WHERE status = 'available'
+                LIMIT ?
+            ''', (quantity,)).fetchall()
+            if len(rows) < quantity:
+                conn.rollback()
+                return {'success': False, 'error': 'insufficient_stock', 'available': len(rows)}
+
+            gmails = [dict(row) for row in rows]
+            gmail_ids = [g['gmail_id'] for g in gmails]
+            now = datetime.now()
+            placeholders = ','.join('?' * len(gmail_ids))
+            conn.execute(f'''
+                UPDATE gmails
+                SET status = 'sold', buyer_id = ?, sold_at = ?
+                WHERE gmail_id IN ({placeholders}) AND status = 'available'
+            ''', [buyer_id, now] + gmail_ids)
+
+            conn.execute('''
+                UPDATE users
+                SET wallet_balance = wallet_balance - ?
+                WHERE user_id = ?
+            ''', (total_cost, buyer_id))
+
+            cursor = conn.execute('''
+                INSERT INTO transactions
+                (user_id, type, amount, description, status, completed_at)
+                VALUES (?, 'purchase', ?, ?, 'success', ?)
+            ''', (buyer_id, -total_cost, f"Purchased {quantity} Gmail(s)", now))
+            txn_id = cursor.lastrowid
+
+            # One earnings update per seller rather than per Gmail
+            sold_per_seller = {}
+            for gmail in gmails:
+                sold_per_seller[gmail['seller_id']] = sold_per_seller.get(gmail['seller_id'], 0) + 1
+            conn.executemany('''
+                UPDATE sellers
+                SET total_earnings = total_earnings + ?
+                WHERE seller_id = ?
+            ''', [(count * seller_rate, seller_id) for seller_id, count in sold_per_seller.items()])
+
+            conn.commit()
+            self.invalidate_stats()
+            return {
+                'success': True,
+                'gmails': gmails,
+                'txn_id': txn_id,
+                'total_cost': total_cost,
+                'balance': balance - total_cost
+            }
+        except Exception as e:
+            print(f"Error during checkout: {e}")
+            conn.rollback()
+            return {'success': False, 'error': str(e)}
+        finally:
+            conn.close()
+
     def get_pending_gmail_batches(self) -> List[Dict]:
         """Get pending Gmail batches"""
         conn = self.get_connection()
@@ -305,10 +642,10 @@ class Database:
         try:
             row = conn.execute('''
                 SELECT 
-                    COUNT(CASE WHEN status = 'sold' THEN 1 END) as sold_count,
-                    COUNT(CASE WHEN status = 'available' THEN 1 END) as available_count,
-                    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_count
-                FROM gmails
+                    COALESCE(SUM(CASE WHEN status = 'sold' THEN count END), 0) as sold_count,
+                    COALESCE(SUM(CASE WHEN status = 'available' THEN count END), 0) as available_count,
+                    COALESCE(SUM(CASE WHEN status = 'pending' THEN count END), 0) as pending_count
+                FROM seller_inventory_counters
                 WHERE seller_id = ?
             ''', (seller_id,)).fetchone()
             return dict(row) if row else {}
@@ -343,6 +680,7 @@ class Database:
                 WHERE txn_id = ?
             ''', (status, datetime.now(), txn_id))
             conn.commit()
+            self.invalidate_stats()
             return True
         finally:
             conn.close()
@@ -385,49 +723,84 @@ class Database:
                 VALUES (?, ?, ?, ?, 'pending')
             ''', (seller_id, user_id, amount, upi_qr_path))
             conn.commit()
+            self.invalidate_stats()
             return cursor.lastrowid
         finally:
             conn.close()
     
     
-    def get_all_sellers_with_stats(self) -> List[Dict]:
-        """Get all sellers with their Gmail statistics"""
+    def get_all_sellers_with_stats(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get sellers with their Gmail statistics by status, newest first within each (paged by seller_id)"""
+        conditions, params, order, limit_params = self._keyset('sellers', 's', 'created_at', 'seller_id', after_id, limit,
+                                                               group_col='status')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         conn = self.get_connection()
         try:
-            rows = conn.execute('''
+            rows = conn.execute(f'''
                 SELECT 
                     s.seller_id,
                     s.user_id,
                     s.status,
                     s.total_earnings,
+                    s.created_at,
                     u.username,
                     u.full_name,
-                    COUNT(CASE WHEN g.status = 'pending' THEN 1 END) as pending_gmails,
-                    COUNT(CASE WHEN g.status = 'available' THEN 1 END) as available_gmails,
-                    COUNT(CASE WHEN g.status = 'sold' THEN 1 END) as sold_gmails
+                    COALESCE((SELECT count FROM seller_inventory_counters
+                              WHERE seller_id = s.seller_id AND status = 'pending'), 0) as pending_gmails,
+                    COALESCE((SELECT count FROM seller_inventory_counters
+                              WHERE seller_id = s.seller_id AND status = 'available'), 0) as available_gmails,
+                    COALESCE((SELECT count FROM seller_inventory_counters
+                              WHERE seller_id = s.seller_id AND status = 'sold'), 0) as sold_gmails
                 FROM sellers s
                 JOIN users u ON s.user_id = u.user_id
-                LEFT JOIN gmails g ON s.seller_id = g.seller_id
-                GROUP BY s.seller_id
-                ORDER BY s.status ASC, s.created_at DESC
-            ''').fetchall()
+                {where}
+                {order}
+            ''', params + limit_params).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
 
-    def get_users_with_stats(self) -> List[Dict]:
-        """Get all users with their purchase and selling statistics (SQLite)"""
+    def get_users_with_stats(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get users with their purchase and selling statistics, newest first (paged by user_id)"""
+        conditions, params, order, limit_params = self._keyset('users', 'u', 'created_at', 'user_id', after_id, limit)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         conn = self.get_connection()
         try:
-            rows = conn.execute('''
-                SELECT 
+            # Count gmails once per buyer (covering index) and once per seller
+            # (trigger-maintained counters) for just this page, then join back
+            rows = conn.execute(f'''
+                WITH page AS (
+                    SELECT u.user_id FROM users u
+                    {where}
+                    {order}
+                ),
+                bought AS (
+                    SELECT buyer_id, COUNT(*) as total_bought
+                    FROM gmails
+                    WHERE buyer_id IN (SELECT user_id FROM page)
+                    GROUP BY buyer_id
+                ),
+                provided AS (
+                    SELECT
+                        s.user_id,
+                        SUM(c.count) as total_provided,
+                        SUM(CASE WHEN c.status = 'sold' THEN c.count ELSE 0 END) as total_sold
+                    FROM sellers s
+                    JOIN seller_inventory_counters c ON c.seller_id = s.seller_id
+                    WHERE s.user_id IN (SELECT user_id FROM page)
+                    GROUP BY s.user_id
+                )
+                SELECT
                     u.*,
-                    (SELECT COUNT(*) FROM gmails WHERE buyer_id = u.user_id) as total_bought,
-                    (SELECT COUNT(*) FROM gmails g JOIN sellers s ON g.seller_id = s.seller_id WHERE s.user_id = u.user_id) as total_provided,
-                    (SELECT COUNT(*) FROM gmails g JOIN sellers s ON g.seller_id = s.seller_id WHERE s.user_id = u.user_id AND g.status = 'sold') as total_sold
+                    COALESCE(b.total_bought, 0) as total_bought,
+                    COALESCE(p.total_provided, 0) as total_provided,
+                    COALESCE(p.total_sold, 0) as total_sold
                 FROM users u
-                ORDER BY u.created_at DESC
-            ''').fetchall()
+                LEFT JOIN bought b ON b.buyer_id = u.user_id
+                LEFT JOIN provided p ON p.user_id = u.user_id
+                {where}
+                {order}
+            ''', (params + limit_params) * 2).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
@@ -459,18 +832,22 @@ class Database:
         finally:
             conn.close()
     
-    def get_pending_withdrawals(self) -> List[Dict]:
-        """Get all pending withdrawal requests"""
+    def get_pending_withdrawals(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get pending withdrawal requests, oldest first (paged by withdrawal_id)"""
+        conditions, params, order, limit_params = self._keyset(
+            'withdrawals', 'w', 'created_at', 'withdrawal_id', after_id, limit, ascending=True
+        )
+        where = ' AND '.join(["w.status = 'pending'"] + conditions)
         conn = self.get_connection()
         try:
-            rows = conn.execute('''
+            rows = conn.execute(f'''
                 SELECT w.*, u.username, u.full_name, s.total_earnings
                 FROM withdrawals w
                 JOIN users u ON w.user_id = u.user_id
                 JOIN sellers s ON w.seller_id = s.seller_id
-                WHERE w.status = 'pending'
-                ORDER BY w.created_at ASC
-            ''').fetchall()
+                WHERE {where}
+                {order}
+            ''', params + limit_params).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
@@ -506,75 +883,82 @@ class Database:
                 WHERE withdrawal_id = ?
             ''', (status, datetime.now(), admin_id, withdrawal_id))
             conn.commit()
+            self.invalidate_stats()
             return True
         finally:
             conn.close()
     
     # ==================== STATISTICS ====================
     
-    def get_stats(self) -> Dict:
-        """Get system statistics"""
+    def get_stats(self, fresh: bool = False) -> Dict:
+        """Get system statistics (served from a snapshot refreshed every STATS_CACHE_TTL seconds)"""
+        return dict(self.stats_cache.get(fresh))
+    
+    def invalidate_stats(self):
+        """Drop the cached statistics snapshot after a write that changes them"""
+        self.stats_cache.invalidate()
+    
+    def _compute_stats(self) -> Dict:
+        """Compute system statistics in a single statement"""
         conn = self.get_connection()
         try:
-            stats = {}
-            
-            # User stats
-            row = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()
-            stats['total_users'] = row['count']
-            
-            # Gmail stats
-            row = conn.execute("SELECT COUNT(*) as count FROM gmails WHERE status = 'available'").fetchone()
-            stats['available_gmails'] = row['count']
-            
-            row = conn.execute("SELECT COUNT(*) as count FROM gmails WHERE status = 'sold'").fetchone()
-            stats['sold_gmails'] = row['count']
-            
-            # Pending approvals
-            row = conn.execute("SELECT COUNT(*) as count FROM sellers WHERE status = 'pending'").fetchone()
-            stats['pending_sellers'] = row['count']
-            
-            row = conn.execute("SELECT COUNT(DISTINCT batch_id) as count FROM gmails WHERE status = 'pending'").fetchone()
-            stats['pending_batches'] = row['count']
-            
-            row = conn.execute("SELECT COUNT(*) as count FROM withdrawals WHERE status = 'pending'").fetchone()
-            stats['pending_withdrawals'] = row['count']
-            
-            # Revenue
-            row = conn.execute("SELECT SUM(amount) as total FROM transactions WHERE status = 'success'").fetchone()
-            stats['total_revenue'] = row['total'] or 0.0
-            
-            # Seller pending amount
-            row = conn.execute("SELECT SUM(total_earnings) as total FROM sellers").fetchone()
-            stats['seller_pending_payouts'] = row['total'] or 0.0
-            
-            return stats
+            row = conn.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM users) as total_users,
+                    (SELECT COALESCE(SUM(count), 0) FROM inventory_counters WHERE status = 'available') as available_gmails,
+                    (SELECT COALESCE(SUM(count), 0) FROM inventory_counters WHERE status = 'sold') as sold_gmails,
+                    (SELECT COUNT(*) FROM sellers WHERE status = 'pending') as pending_sellers,
+                    (SELECT COUNT(DISTINCT batch_id) FROM gmails WHERE status = 'pending') as pending_batches,
+                    (SELECT COUNT(*) FROM withdrawals WHERE status = 'pending') as pending_withdrawals,
+                    (SELECT COALESCE(SUM(amount), 0.0) FROM transactions WHERE status = 'success') as total_revenue,
+                    (SELECT COALESCE(SUM(total_earnings), 0.0) FROM sellers) as seller_pending_payouts
+            ''').fetchone()
+            return dict(row)
         finally:
             conn.close()
 
     def get_time_based_analytics(self) -> Dict:
-        """Get daily, weekly, monthly, and yearly transaction analytics (SQLite)"""
-        analytics = {}
-        periods = {
-            'daily': "-1 days",
-            'weekly': "-7 days",
-            'monthly': "-30 days",
-            'yearly': "-365 days"
-        }
-        
+        """Get daily, weekly, monthly, and yearly transaction analytics from the revenue_daily rollup"""
+        # Windows are whole UTC days ending today: daily = today, weekly = the last 7 days, ...
+        periods = {'daily': 1, 'weekly': 7, 'monthly': 30, 'yearly': 365}
+        columns = ',\n'.join(
+            f"COALESCE(SUM(CASE WHEN day > date('now', '-{days} days') THEN total_amount END), 0) as {label}_amount,\n"
+            f"COALESCE(SUM(CASE WHEN day > date('now', '-{days} days') THEN count END), 0) as {label}_count"
+            for label, days in periods.items()
+        )
         conn = self.get_connection()
         try:
-            for label, period in periods.items():
-                row = conn.execute(f'''
-                    SELECT SUM(amount) as total_amount, COUNT(*) as count 
-                    FROM transactions 
-                    WHERE status = 'success' AND created_at >= datetime('now', ?)
-                ''', (period,)).fetchone()
-                
-                analytics[label] = {
-                    "total_amount": row['total_amount'] or 0,
-                    "count": row['count'] or 0
-                }
-            return analytics
+            row = conn.execute(f'''
+                SELECT {columns}
+                FROM revenue_daily
+                WHERE day > date('now', '-365 days')
+            ''').fetchone()
+            return {
+                label: {"total_amount": row[f'{label}_amount'], "count": row[f'{label}_count']}
+                for label in periods
+            }
+        finally:
+            conn.close()
+    
+    def rebuild_revenue_daily(self) -> int:
+        """Recompute the revenue_daily rollup from the transactions table; returns the number of days"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM revenue_daily')
+            cursor = conn.execute('''
+                INSERT INTO revenue_daily (day, total_amount, count)
+                SELECT date(created_at), SUM(amount), COUNT(*)
+                FROM transactions
+                WHERE status = 'success'
+                GROUP BY date(created_at)
+            ''')
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error rebuilding revenue rollup: {e}")
+            conn.rollback()
+            return 0
         finally:
             conn.close()
 
@@ -583,8 +967,8 @@ class Database:
         conn = self.get_connection()
         try:
             conn.execute('''
-                INSERT INTO support_messages (user_id, message, status)
-                VALUES (?, ?, 'unread')
+                INSERT INTO support_messages (user_id, message)
+                VALUES (?, ?)
             ''', (user_id, message))
             conn.commit()
             return True
@@ -594,57 +978,24 @@ class Database:
         finally:
             conn.close()
 
-    def get_support_messages(self, unread_only: bool = True) -> List[Dict]:
-        """Get support messages for admin"""
-        conn = self.get_connection()
-        try:
-            query = "SELECT * FROM support_messages"
-            if unread_only:
-                query += " WHERE status = 'unread'"
-            query += " ORDER BY created_at DESC"
-            
-            rows = conn.execute(query).fetchall()
-            messages = []
-            for row in rows:
-                msg = dict(row)
-                user = self.get_user(msg['user_id'])
-                msg['username'] = user['username'] if user else "Unknown"
-                messages.append(msg)
-            return messages
-        finally:
-            conn.close()
-
-    def get_time_based_analytics(self) -> Dict:
-        """Get time-based transaction analytics for dashboard"""
-        from datetime import datetime, timedelta
+    def get_support_messages(self, unread_only: bool = True, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get support messages for admin, newest first (paged by message_id)"""
+        conditions, params, order, limit_params = self._keyset(
+            'support_messages', 'm', 'created_at', 'message_id', after_id, limit
+        )
+        if unread_only:
+            conditions.insert(0, "m.is_read = 0")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         conn = self.get_connection()
         try:
-            now = datetime.now()
-            analytics = {}
-            
-            # Define time ranges
-            ranges = {
-                'daily': now - timedelta(days=1),
-                'weekly': now - timedelta(days=7),
-                'monthly': now - timedelta(days=30),
-                'yearly': now - timedelta(days=365)
-            }
-            
-            for label, start_date in ranges.items():
-                result = conn.execute('''
-                    SELECT 
-                        COALESCE(SUM(amount), 0) as total_amount,
-                        COUNT(*) as count
-                    FROM transactions
-                    WHERE status = 'success' AND created_at >= ?
-                ''', (start_date,)).fetchone()
-                
-                analytics[label] = {
-                    'total_amount': result['total_amount'] if result else 0,
-                    'count': result['count'] if result else 0
-                }
-                
-            return analytics
+            rows = conn.execute(f'''
+                SELECT m.*, COALESCE(u.username, 'Unknown') as username
+                FROM support_messages m
+                LEFT JOIN users u ON m.user_id = u.user_id
+                {where}
+                {order}
+            ''', params + limit_params).fetchall()
+            return [dict(row) for row in rows]
         finally:
             conn.close()
 
@@ -699,11 +1050,13 @@ class Database:
         finally:
             conn.close()
 
-    def get_all_purchases(self) -> List[Dict]:
-        """Get all buyer purchases for admin panel"""
+    def get_all_purchases(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get buyer purchases for admin panel, most recent first (paged by gmail_id)"""
+        conditions, params, order, limit_params = self._keyset('gmails', 'g', 'sold_at', 'gmail_id', after_id, limit)
+        where = ' AND '.join(["g.status = 'sold'"] + conditions)
         conn = self.get_connection()
         try:
-            query = '''
+            query = f'''
                 SELECT 
                     g.gmail_id,
                     g.email,
@@ -715,12 +1068,38 @@ class Database:
                 LEFT JOIN users buyer ON g.buyer_id = buyer.user_id
                 LEFT JOIN sellers s ON g.seller_id = s.seller_id
                 LEFT JOIN users seller_user ON s.user_id = seller_user.user_id
-                WHERE g.status = 'sold'
-                ORDER BY g.sold_at DESC
-
+                WHERE {where}
+                {order}
             '''
             
-            rows = conn.execute(query).fetchall()
+            rows = conn.execute(query, params + limit_params).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def get_all_gmails(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get Gmail listings without passwords, newest first (paged by gmail_id)"""
+        conditions, params, order, limit_params = self._keyset('gmails', 'g', 'gmail_id', 'gmail_id', after_id, limit)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT g.gmail_id, g.seller_id, g.email, g.status, g.batch_id, g.buyer_id, g.created_at, g.sold_at
+                FROM gmails g
+                {where}
+                {order}
+            ''', params + limit_params).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_all_transactions(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get transactions, newest first (paged by txn_id)"""
+        conditions, params, order, limit_params = self._keyset('transactions', 't', 'txn_id', 'txn_id', after_id, limit)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f'SELECT t.* FROM transactions t {where} {order}', params + limit_params).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
@@ -767,30 +1146,8 @@ class Database:
 
     # ==================== SUPPORT TICKETS ====================
     
-    def ensure_tickets_table(self):
-        """Create support tickets table if not exists"""
-        conn = self.get_connection()
-        try:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS support_tickets (
-                    ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    subject TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    status TEXT DEFAULT 'open',
-                    admin_reply TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            ''')
-            conn.commit()
-        finally:
-            conn.close()
-
     def create_support_ticket(self, user_id: int, subject: str, message: str) -> int:
         """Create a new support ticket"""
-        self.ensure_tickets_table()
         conn = self.get_connection()
         try:
             cursor = conn.execute('''
@@ -802,28 +1159,25 @@ class Database:
         finally:
             conn.close()
 
-    def get_all_tickets(self, status: str = None) -> List[Dict]:
-        """Get all support tickets, optionally filtered by status"""
-        self.ensure_tickets_table()
+    def get_all_tickets(self, status: str = None, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get support tickets, newest first, optionally filtered by status (paged by ticket_id)"""
+        conditions, params, order, limit_params = self._keyset(
+            'support_tickets', 't', 'created_at', 'ticket_id', after_id, limit
+        )
+        if status:
+            conditions.insert(0, "t.status = ?")
+            params.insert(0, status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         conn = self.get_connection()
         try:
-            if status:
-                query = '''
-                    SELECT t.*, u.username 
-                    FROM support_tickets t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE t.status = ?
-                    ORDER BY t.created_at DESC
-                '''
-                rows = conn.execute(query, (status,)).fetchall()
-            else:
-                query = '''
-                    SELECT t.*, u.username 
-                    FROM support_tickets t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    ORDER BY t.created_at DESC
-                '''
-                rows = conn.execute(query).fetchall()
+            query = f'''
+                SELECT t.*, u.username 
+                FROM support_tickets t
+                LEFT JOIN users u ON t.user_id = u.user_id
+                {where}
+                {order}
+            '''
+            rows = conn.execute(query, params + limit_params).fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
@@ -851,6 +1205,138 @@ class Database:
         finally:
             conn.close()
 
+    # ==================== BROADCASTS ====================
+    
+    BROADCAST_COLUMNS = '''
+        broadcast_id, message, created_by, status, total_count, sent_count, failed_count,
+        total_count - sent_count - failed_count AS pending_count, created_at, started_at, finished_at
+    '''
+    
+    def create_broadcast(self, message: str, created_by: int = None) -> int:
+        """Queue a broadcast to every user; one pending recipient row per user"""
+        conn = self.get_connection()
+        try:
+            # Job and recipient rows commit together, so the worker never sees half a list
+            cursor = conn.execute(
+                'INSERT INTO broadcasts (message, created_by) VALUES (?, ?)', (message, created_by)
+            )
+            broadcast_id = cursor.lastrowid
+            total = conn.execute('''
+                INSERT INTO broadcast_recipients (broadcast_id, user_id)
+                SELECT ?, user_id FROM users
+            ''', (broadcast_id,)).rowcount
+            conn.execute('UPDATE broadcasts SET total_count = ? WHERE broadcast_id = ?', (total, broadcast_id))
+            conn.commit()
+            return broadcast_id
+        except Exception as e:
+            conn.rollback()
+            print(f"Error creating broadcast: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_broadcast(self, broadcast_id: int) -> Optional[Dict]:
+        """Get a broadcast job with its delivery counts"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute(
+                f'SELECT {self.BROADCAST_COLUMNS} FROM broadcasts WHERE broadcast_id = ?', (broadcast_id,)
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def get_broadcasts(self, limit: int = 20) -> List[Dict]:
+        """Get recent broadcast jobs, newest first"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(
+                f'SELECT {self.BROADCAST_COLUMNS} FROM broadcasts ORDER BY broadcast_id DESC LIMIT ?', (limit,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_unfinished_broadcasts(self) -> List[Dict]:
+        """Get queued and running (interrupted) broadcast jobs, oldest first"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT {self.BROADCAST_COLUMNS} FROM broadcasts
+                WHERE status IN ('queued', 'running')
+                ORDER BY broadcast_id ASC
+            ''').fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_pending_broadcast_recipients(self, broadcast_id: int, after_id: int = None,
+                                         limit: int = None) -> List[int]:
+        """User ids still to be sent a broadcast, in user_id order (paged by user_id)"""
+        conditions, params = ["broadcast_id = ?", "status = 'pending'"], [broadcast_id]
+        if after_id is not None:
+            conditions.append("user_id > ?")
+            params.append(after_id)
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT user_id FROM broadcast_recipients
+                WHERE {' AND '.join(conditions)}
+                ORDER BY user_id
+                LIMIT ?
+            ''', params + [limit if limit is not None else -1]).fetchall()
+            return [row['user_id'] for row in rows]
+        finally:
+            conn.close()
+    
+    def record_broadcast_results(self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]) -> int:
+        """Mark pending recipients (user_id, 'sent' | 'failed', error) and bump the job's counts
+        
+        Recipients already marked are left alone, so recording a result twice counts it once.
+        """
+        conn = self.get_connection()
+        try:
+            counts = {'sent': 0, 'failed': 0}
+            for status in counts:
+                rows = [(status, error, broadcast_id, user_id) for user_id, result, error in results if result == status]
+                if rows:
+                    counts[status] = conn.executemany('''
+                        UPDATE broadcast_recipients
+                        SET status = ?, error = ?, sent_at = CURRENT_TIMESTAMP
+                        WHERE broadcast_id = ? AND user_id = ? AND status = 'pending'
+                    ''', rows).rowcount
+            conn.execute('''
+                UPDATE broadcasts SET sent_count = sent_count + ?, failed_count = failed_count + ?
+                WHERE broadcast_id = ?
+            ''', (counts['sent'], counts['failed'], broadcast_id))
+            conn.commit()
+            return counts['sent'] + counts['failed']
+        except Exception as e:
+            conn.rollback()
+            print(f"Error recording broadcast results: {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def update_broadcast_status(self, broadcast_id: int, status: str) -> bool:
+        """Move a broadcast to running, completed or cancelled; finished jobs stay finished"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute('''
+                UPDATE broadcasts SET
+                    status = ?,
+                    started_at = CASE WHEN ? = 'running' THEN COALESCE(started_at, CURRENT_TIMESTAMP) ELSE started_at END,
+                    finished_at = CASE WHEN ? IN ('completed', 'cancelled') THEN CURRENT_TIMESTAMP ELSE finished_at END
+                WHERE broadcast_id = ? AND status NOT IN ('completed', 'cancelled')
+            ''', (status, status, status, broadcast_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error updating broadcast: {e}")
+            return False
+        finally:
+            conn.close()
+
 # Global database instance
 db = Database()
 
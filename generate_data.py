@@ -0,0 +1,408 @@
+"""
+Synthetic marketplace data generator for load and scale testing
+Fills an empty SQLite or MongoDB database with users, sellers, Gmail batches in
+every status, transactions, withdrawals, support messages and tickets. Rows are
+streamed table by table in chunks, so a 10M-gmail dataset never holds more than
+one chunk in memory. The same --seed and --end always produce the same data.
+
+Timestamps follow a growing marketplace: activity rises towards --end and
+peaks in the evening (IST). Gmails are sold some time after they are listed,
+and the heaviest buyers and sellers account for most of the volume.
+
+User ids are 1..--users and seller ids 1..--sellers, so benchmarks can name
+them. Rows are inserted directly, not through ingest_gmails, checkout or the
+payment flow: those only write rows as pending or "now", while a history needs
+sold and rejected stock with past timestamps. Nothing is lost by skipping them.
+SQLite's inventory counters and revenue rollup are kept by row triggers, which
+fire for these INSERTs just as for the live write paths, and on MongoDB both
+are rebuilt after loading. Emails are unique by construction, so the duplicate
+check ingest_gmails would make has nothing to find. check_backends.py checks
+that the counters and rollup of a seeded database match its rows.
+
+Usage:
+    python generate_data.py --database /tmp/load.db --users 50000 --gmails 1000000
+    python generate_data.py --mongo --gmails 10000000 --seed 7     # MONGODB_URI / DATABASE_NAME
+    python generate_data.py --database /tmp/load.db --sold 0.6 --pending 0.1 --end 2026-01-31
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Callable, Dict, Iterator
+
+import config
+
+# Loaded in this order
+TABLES = ('users', 'sellers', 'gmails', 'transactions', 'withdrawals', 'support_messages', 'support_tickets')
+
+# Relative activity per hour of day: quiet overnight, peaking in the evening
+HOURLY_WEIGHTS = [3, 2, 1, 1, 1, 2, 3, 5, 6, 7, 7, 8, 8, 8, 7, 7, 8, 9, 10, 11, 12, 11, 8, 5]
+HOURLY_CUM_WEIGHTS = list(accumulate(HOURLY_WEIGHTS))
+
+WALLET_AMOUNTS = [15, 50, 100, 200, 500]
+WALLET_WEIGHTS = [10, 30, 30, 20, 10]
+SUPPORT_TOPICS = ['Payment not credited', 'Gmail not working', 'Withdrawal pending',
+                  'How do I sell?', 'Wrong password', 'Refund request']
+
+
+class Marketplace:
+    """Deterministic synthetic marketplace; each table is a generator of row dicts"""
+
+    def __init__(self, users: int = 1000, gmails: int = 20000, sellers: int = None,
+                 transactions: int = None, withdrawals: int = None, messages: int = None,
+                 tickets: int = None, pending: float = 0.05, rejected: float = 0.03,
+                 sold: float = 0.4, days: int = 365, end: datetime = None, seed: int = 42):
+        if pending + rejected + sold > 1:
+            raise ValueError("pending + rejected + sold must not exceed 1")
+        self.users_count = users
+        self.gmails_count = gmails
+        self.sellers_count = min(users, sellers if sellers is not None else max(1, users // 50))
+        self.transactions_count = transactions if transactions is not None else gmails // 5
+        self.withdrawals_count = withdrawals if withdrawals is not None else self.sellers_count * 3
+        self.messages_count = messages if messages is not None else users // 20
+        self.tickets_count = tickets if tickets is not None else users // 50
+        self.pending = pending
+        self.rejected = rejected
+        self.sold = sold
+        self.days = days
+        # Data ends at midnight so runs on the same --end match exactly
+        end = end or datetime.now()
+        self.end = datetime(end.year, end.month, end.day)
+        self.start = self.end - timedelta(days=days)
+        self.seed = seed
+
+        # Sellers are referenced by every later table, so fix them up front (O(sellers) memory)
+        rng = self._rng('sellers')
+        seller_users = rng.sample(range(1, users + 1), self.sellers_count)
+        statuses = rng.choices(['approved', 'pending', 'rejected'], weights=[90, 7, 3], k=self.sellers_count)
+        self.sellers_by_id = {seller_id: (user_id, status) for seller_id, (user_id, status)
+                              in enumerate(zip(seller_users, statuses), start=1)}
+        self.seller_users = set(seller_users)
+        self.approved_sellers = [seller_id for seller_id, (_, status) in self.sellers_by_id.items()
+                                 if status == 'approved'] or [1]
+
+    # ==================== SAMPLING ====================
+
+    def _rng(self, table: str) -> random.Random:
+        """Independent stream per table, so tables can be generated in any order"""
+        return random.Random(f"{self.seed}:{table}")
+
+    def _when(self, rng: random.Random, days: int = None) -> datetime:
+        """Timestamp in the last `days` days, denser towards the end and in the evening"""
+        days = min(days or self.days, self.days)
+        # Linearly growing daily volume: day position has density 2x on [0, 1]
+        day = min(int(days * math.sqrt(rng.random())), days - 1)
+        hour = rng.choices(range(24), cum_weights=HOURLY_CUM_WEIGHTS)[0]
+        return self.end - timedelta(days=days - day) + timedelta(hours=hour, seconds=rng.randrange(3600))
+
+    def _user(self, rng: random.Random) -> int:
+        """Skewed user pick: a small group of regulars does most of the buying"""
+        return int(self.users_count * rng.random() ** 3) + 1
+
+    def _after(self, rng: random.Random, when: datetime, mean_hours: float) -> datetime:
+        """Exponentially distributed moment after `when`"""
+        return when + timedelta(seconds=int(rng.expovariate(1 / (mean_hours * 3600))))
+
+    # ==================== TABLES ====================
+
+    def users(self) -> Iterator[Dict]:
+        rng = self._rng('users')
+        for user_id in range(1, self.users_count + 1):
+            yield {
+                "user_id": user_id,
+                "username": f"user{user_id}" if rng.random() < 0.9 else None,
+                "full_name": f"User {user_id}",
+                "wallet_balance": round(rng.expovariate(1 / 60), 2) if rng.random() < 0.6 else 0.0,
+                "role": "seller" if user_id in self.seller_users else "buyer",
+                "is_banned": rng.random() < 0.005,
+                "created_at": self._when(rng),
+            }
+
+    def sellers(self) -> Iterator[Dict]:
+        rng = self._rng('seller_rows')
+        admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
+        for seller_id, (user_id, status) in self.sellers_by_id.items():
+            created_at = self._when(rng)
+            approved_at = min(self._after(rng, created_at, 12), self.end) if status == 'approved' else None
+            yield {
+                "seller_id": seller_id,
+                "user_id": user_id,
+                "upi_qr_path": f"upi_qr/{user_id}.jpg",
+                "status": status,
+                "total_earnings": round(config.SELL_RATE * int(rng.expovariate(1 / 40)), 2) if approved_at else 0.0,
+                "approved_at": approved_at,
+                "approved_by": admin_id if approved_at else None,
+                "created_at": created_at,
+            }
+
+    def gmails(self) -> Iterator[Dict]:
+        rng = self._rng('gmails')
+        sold_share = self.sold / (1 - self.pending - self.rejected) if self.pending + self.rejected < 1 else 0
+        emitted = 0
+        batch_no = 0
+        while emitted < self.gmails_count:
+            batch_no += 1
+            size = min(rng.randint(10, 200), self.gmails_count - emitted)
+            # A few big sellers list most of the stock
+            seller_id = self.approved_sellers[int(len(self.approved_sellers) * rng.random() ** 2)]
+            roll = rng.random()
+            if roll < self.pending:
+                status, created_at = 'pending', self._when(rng, days=3)
+            elif roll < self.pending + self.rejected:
+                status, created_at = 'rejected', self._when(rng)
+            else:
+                status, created_at = 'available', self._when(rng)
+            approved_at = min(self._after(rng, created_at, 6), self.end) if status == 'available' else None
+            batch_id = f"batch_{created_at.strftime('%Y%m%d_%H%M%S')}_{batch_no:06x}"
+            for _ in range(size):
+                emitted += 1
+                row_status, sold_at, buyer_id = status, None, None
+                if status == 'available' and rng.random() < sold_share:
+                    sold_at = self._after(rng, approved_at, 48)
+                    if sold_at < self.end:
+                        row_status, buyer_id = 'sold', self._user(rng)
+                    else:
+                        sold_at = None
+                yield {
+                    "seller_id": seller_id,
+                    "email": f"synthetic{emitted}@gmail.com",
+                    "password": f"pw{rng.getrandbits(40):010x}",
+                    "status": row_status,
+                    "batch_id": batch_id,
+                    "created_at": created_at,
+                    "approved_at": approved_at,
+                    "sold_at": sold_at,
+                    "buyer_id": buyer_id,
+                }
+
+    def transactions(self) -> Iterator[Dict]:
+        rng = self._rng('transactions')
+        for n in range(1, self.transactions_count + 1):
+            created_at = self._when(rng)
+            # Top-ups outweigh spending, as every purchase is paid from the wallet
+            if rng.random() < 0.7:
+                amount = float(rng.choices(WALLET_AMOUNTS, weights=WALLET_WEIGHTS)[0])
+                status = rng.choices(['success', 'failed', 'cancelled', 'pending'], weights=[85, 7, 5, 3])[0]
+                row = {
+                    "type": "wallet_add",
+                    "amount": amount,
+                    "status": status,
+                    "cashfree_order_id": f"order_{created_at.strftime('%Y%m%d%H%M%S')}_{n:08x}",
+                    "description": f"Add ₹{amount:.2f} to wallet",
+                }
+            else:
+                quantity = rng.randint(5, 20)
+                row = {
+                    "type": "purchase",
+                    "amount": -quantity * config.BUY_RATE,
+                    "status": "success",
+                    "cashfree_order_id": None,
+                    "description": f"Purchased {quantity} Gmail(s)",
+                }
+            row.update({
+                "user_id": self._user(rng),
+                "payment_link": None,
+                "created_at": created_at,
+                "completed_at": min(self._after(rng, created_at, 0.05), self.end) if row["status"] == 'success' else None,
+            })
+            yield row
+
+    def withdrawals(self) -> Iterator[Dict]:
+        rng = self._rng('withdrawals')
+        admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
+        for _ in range(self.withdrawals_count):
+            seller_id = rng.choice(self.approved_sellers)
+            created_at = self._when(rng)
+            status = rng.choices(['pending', 'paid', 'rejected'], weights=[15, 75, 10])[0]
+            processed_at = min(self._after(rng, created_at, 24), self.end) if status != 'pending' else None
+            yield {
+                "seller_id": seller_id,
+                "user_id": self.sellers_by_id[seller_id][0],
+                "amount": config.SELL_RATE * rng.randint(10, 200),
+                "upi_qr_path": f"upi_qr/{self.sellers_by_id[seller_id][0]}.jpg",
+                "status": status,
+                "processed_at": processed_at,
+                "processed_by": admin_id if processed_at else None,
+                "created_at": created_at,
+            }
+
+    def support_messages(self) -> Iterator[Dict]:
+        rng = self._rng('support_messages')
+        for _ in range(self.messages_count):
+            created_at = self._when(rng)
+            yield {
+                "user_id": self._user(rng),
+                "message": rng.choice(SUPPORT_TOPICS),
+                # Older messages have been read
+                "is_read": created_at < self.end - timedelta(days=2) or rng.random() < 0.5,
+                "created_at": created_at,
+            }
+
+    def support_tickets(self) -> Iterator[Dict]:
+        rng = self._rng('support_tickets')
+        for ticket_id in range(1, self.tickets_count + 1):
+            created_at = self._when(rng)
+            status = rng.choices(['open', 'resolved', 'closed'], weights=[30, 55, 15])[0]
+            updated_at = min(self._after(rng, created_at, 24), self.end) if status != 'open' else created_at
+            subject = rng.choice(SUPPORT_TOPICS)
+            yield {
+                "ticket_id": ticket_id,
+                "user_id": self._user(rng),
+                "subject": subject,
+                "message": f"{subject} (synthetic ticket {ticket_id})",
+                "status": status,
+                "admin_reply": "Sorted, please check again." if status != 'open' else None,
+                "created_at": created_at,
+                "updated_at": updated_at,
+            }
+
+
+def chunks(rows: Iterator[Dict], size: int) -> Iterator[list]:
+    """Consecutive lists of at most `size` rows"""
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ==================== LOADERS ====================
+
+def _sqlite_value(value):
+    # Same text format as CURRENT_TIMESTAMP, so date() and ORDER BY behave as for live rows
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def load_sqlite(db, market: Marketplace, chunk_size: int, progress: Callable) -> Dict[str, int]:
+    """Stream every table into a Database with chunked executemany, one transaction per chunk"""
+    loaded = {}
+    conn = db.get_connection()
+    try:
+        for table in TABLES:
+            started = time.perf_counter()
+            loaded[table] = 0
+            for chunk in chunks(getattr(market, table)(), chunk_size):
+                columns = list(chunk[0])
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(_sqlite_value(row[column]) for column in columns) for row in chunk]
+                )
+                conn.commit()
+                loaded[table] += len(chunk)
+            progress(table, loaded[table], time.perf_counter() - started)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    db.invalidate_stats()
+    return loaded
+
+
+def seller_oid(seller_id: int):
+    """Deterministic ObjectId for a synthetic seller"""
+    from bson import ObjectId
+    return ObjectId(f"{seller_id:024x}")
+
+
+def _mongo_document(table: str, row: Dict) -> Dict:
+    if table == 'sellers':
+        row["_id"] = seller_oid(row.pop("seller_id"))
+    elif table in ('gmails', 'withdrawals'):
+        row["seller_id"] = seller_oid(row["seller_id"])
+    elif table == 'support_messages':
+        row["status"] = "read" if row.pop("is_read") else "unread"
+    return row
+
+
+def load_mongo(db, market: Marketplace, chunk_size: int, progress: Callable) -> Dict[str, int]:
+    """Stream every table into a MongoDatabase with unordered insert_many, then rebuild its rollups"""
+    loaded = {}
+    for table in TABLES:
+        started = time.perf_counter()
+        loaded[table] = 0
+        for chunk in chunks(getattr(market, table)(), chunk_size):
+            db.db[table].insert_many([_mongo_document(table, row) for row in chunk], ordered=False)
+            loaded[table] += len(chunk)
+        progress(table, loaded[table], time.perf_counter() - started)
+    if market.tickets_count:
+        db.sequences.update_one({"_id": "support_tickets"}, {"$max": {"value": market.tickets_count}}, upsert=True)
+    db.rebuild_inventory_counters()
+    db.rebuild_revenue_daily()
+    db.invalidate_stats()
+    return loaded
+
+
+def populate(db, market: Marketplace, chunk_size: int = 10000, progress: Callable = None) -> Dict[str, int]:
+    """Load a Marketplace into an empty Database or MongoDatabase; returns rows per table"""
+    progress = progress or (lambda table, rows, seconds: None)
+    if hasattr(db, 'pool'):
+        return load_sqlite(db, market, chunk_size, progress)
+    return load_mongo(db, market, chunk_size, progress)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fill an empty database with a synthetic marketplace")
+    parser.add_argument('--mongo', action='store_true', help="load MongoDB at MONGODB_URI / DATABASE_NAME")
+    parser.add_argument('--database', help="SQLite file to create (default: DATABASE_PATH)")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--gmails', type=int, default=20000)
+    parser.add_argument('--sellers', type=int, help="default: 2%% of users")
+    parser.add_argument('--transactions', type=int, help="default: gmails / 5")
+    parser.add_argument('--withdrawals', type=int, help="default: 3 per seller")
+    parser.add_argument('--messages', type=int, help="default: users / 20")
+    parser.add_argument('--tickets', type=int, help="default: users / 50")
+    parser.add_argument('--pending', type=float, default=0.05, help="share of gmails in pending batches")
+    parser.add_argument('--rejected', type=float, default=0.03, help="share of gmails in rejected batches")
+    parser.add_argument('--sold', type=float, default=0.4, help="share of gmails sold (approximate)")
+    parser.add_argument('--days', type=int, default=365, help="history length")
+    parser.add_argument('--end', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help="last day of data, YYYY-MM-DD (default: yesterday)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        market = Marketplace(
+            users=args.users, gmails=args.gmails, sellers=args.sellers, transactions=args.transactions,
+            withdrawals=args.withdrawals, messages=args.messages, tickets=args.tickets,
+            pending=args.pending, rejected=args.rejected, sold=args.sold,
+            days=args.days, end=args.end, seed=args.seed
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.mongo:
+        from mongodb import db
+        target = f"MongoDB {config.DATABASE_NAME}"
+        empty = db.users.find_one({}, {"_id": 1}) is None
+    else:
+        if args.database:
+            config.DATABASE_PATH = args.database
+        from database import db
+        target = f"SQLite {config.DATABASE_PATH}"
+        empty = db.get_all_users(limit=1) == []
+    # Ids are fixed (users 1..N), so never mix synthetic rows into an existing database
+    if not empty:
+        print(f"Error: {target} already has users; point --database / DATABASE_NAME at an empty one")
+        return 1
+
+    print("=" * 50)
+    print(f"GENERATING SYNTHETIC MARKETPLACE (seed {args.seed})")
+    print("=" * 50)
+    print(f"  target: {target}")
+    started = time.perf_counter()
+    populate(db, market, args.chunk_size,
+             lambda table, rows, seconds: print(f"  ✓ {table:<17} {rows:>12,} rows  {seconds:>8.1f}s"))
+    print("=" * 50)
+    print(f"DONE in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Convert MongoDB seller_id references from strings to ObjectId
+gmails and withdrawals used to store seller_id as str(ObjectId), which forced
+every join against sellers through $toString/$toObjectId and kept it off the
+indexes. Run once after upgrading, with the bot stopped; re-running is a no-op.
+
+Usage: python migrate_mongo_seller_ids.py
+"""
+import sys
+
+
+def main() -> int:
+    from mongodb import db
+
+    converted = db.migrate_seller_ids()
+    for collection, count in converted.items():
+        print(f"✓ {collection}: {count} document(s) converted")
+    print("✓ seller_inventory_counters rebuilt")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
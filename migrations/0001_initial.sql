@@ -95,9 +95,64 @@ CREATE TABLE IF NOT EXISTS support_tickets (
 CREATE INDEX IF NOT EXISTS idx_gmails_status ON gmails(status);
 CREATE INDEX IF NOT EXISTS idx_gmails_seller ON gmails(seller_id);
 CREATE INDEX IF NOT EXISTS idx_gmails_buyer ON gmails(buyer_id);
+CREATE INDEX IF NOT EXISTS idx_gmails_email ON gmails(email);
 CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status);
 CREATE INDEX IF NOT EXISTS idx_sellers_status ON sellers(status);
 CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals(status);
 CREATE INDEX IF NOT EXISTS idx_support_tickets_status ON support_tickets(status);
 CREATE INDEX IF NOT EXISTS idx_support_tickets_user ON support_tickets(user_id);
+
+-- Inventory counters (kept exact by triggers on gmails)
+CREATE TABLE IF NOT EXISTS inventory_counters (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS seller_inventory_counters (
+    seller_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_id, status)
+);
+
+-- Backfill once, when the counter tables are first created
+INSERT INTO inventory_counters (status, count)
+SELECT COALESCE(status, ''), COUNT(*) FROM gmails
+WHERE NOT EXISTS (SELECT 1 FROM inventory_counters)
+GROUP BY COALESCE(status, '');
+
+INSERT INTO seller_inventory_counters (seller_id, status, count)
+SELECT seller_id, COALESCE(status, ''), COUNT(*) FROM gmails
+WHERE NOT EXISTS (SELECT 1 FROM seller_inventory_counters)
+GROUP BY seller_id, COALESCE(status, '');
+
+CREATE TRIGGER IF NOT EXISTS trg_gmails_counters_insert
+AFTER INSERT ON gmails
+BEGIN
+    INSERT INTO inventory_counters (status, count) VALUES (COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    INSERT INTO seller_inventory_counters (seller_id, status, count) VALUES (NEW.seller_id, COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(seller_id, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_gmails_counters_delete
+AFTER DELETE ON gmails
+BEGIN
+    UPDATE inventory_counters SET count = count - 1 WHERE status = COALESCE(OLD.status, '');
+    UPDATE seller_inventory_counters SET count = count - 1
+    WHERE seller_id = OLD.seller_id AND status = COALESCE(OLD.status, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_gmails_counters_update
+AFTER UPDATE OF status, seller_id ON gmails
+WHEN OLD.status IS NOT NEW.status OR OLD.seller_id IS NOT NEW.seller_id
+BEGIN
+    UPDATE inventory_counters SET count = count - 1 WHERE status = COALESCE(OLD.status, '');
+    INSERT INTO inventory_counters (status, count) VALUES (COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    UPDATE seller_inventory_counters SET count = count - 1
+    WHERE seller_id = OLD.seller_id AND status = COALESCE(OLD.status, '');
+    INSERT INTO seller_inventory_counters (seller_id, status, count) VALUES (NEW.seller_id, COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(seller_id, status) DO UPDATE SET count = count + 1;
+END;
@@ -0,0 +1,18 @@
+-- Composite indexes matching the hot query shapes
+
+-- get_user_purchases / get_user_detail: WHERE buyer_id = ? ORDER BY sold_at
+CREATE INDEX IF NOT EXISTS idx_gmails_buyer_sold ON gmails(buyer_id, sold_at);
+
+-- get_seller_sales / get_sold_gmails_by_seller / get_sellers_awaiting_payment
+CREATE INDEX IF NOT EXISTS idx_gmails_seller_status ON gmails(seller_id, status);
+
+-- get_user_transactions: WHERE user_id = ? ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at);
+
+-- get_transaction_by_order_id (payment verification)
+CREATE INDEX IF NOT EXISTS idx_transactions_order ON transactions(cashfree_order_id);
+
+-- Superseded by the composite indexes above
+DROP INDEX IF EXISTS idx_gmails_seller;
+DROP INDEX IF EXISTS idx_gmails_buyer;
+DROP INDEX IF EXISTS idx_transactions_user;
@@ -0,0 +1,33 @@
+-- Partial and covering indexes for the hot gmails access patterns
+
+-- purchase_gmails / checkout: WHERE status = 'available' LIMIT ?
+CREATE INDEX IF NOT EXISTS idx_gmails_available ON gmails(gmail_id) WHERE status = 'available';
+
+-- get_pending_gmail_batches / approve_gmail_batch: pending rows grouped by batch
+CREATE INDEX IF NOT EXISTS idx_gmails_pending_batch
+    ON gmails(batch_id, created_at, seller_id, email) WHERE status = 'pending';
+
+-- get_all_purchases: WHERE status = 'sold' ORDER BY sold_at DESC
+CREATE INDEX IF NOT EXISTS idx_gmails_sold ON gmails(sold_at) WHERE status = 'sold';
+
+-- get_seller_sales / get_sold_gmails_by_seller: WHERE seller_id = ? AND status = ? ORDER BY sold_at
+CREATE INDEX IF NOT EXISTS idx_gmails_seller_status_sold ON gmails(seller_id, status, sold_at);
+
+-- get_seller_gmail_batches: WHERE seller_id = ? GROUP BY batch_id (covering)
+CREATE INDEX IF NOT EXISTS idx_gmails_seller_batch ON gmails(seller_id, batch_id, created_at, status);
+
+-- Pending queues ordered by age
+CREATE INDEX IF NOT EXISTS idx_sellers_status_created ON sellers(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_withdrawals_status_created ON withdrawals(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_support_tickets_status_created ON support_tickets(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_support_tickets_created ON support_tickets(created_at);
+
+-- get_all_users: ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at);
+
+-- Superseded by the indexes above
+DROP INDEX IF EXISTS idx_gmails_status;
+DROP INDEX IF EXISTS idx_gmails_seller_status;
+DROP INDEX IF EXISTS idx_sellers_status;
+DROP INDEX IF EXISTS idx_withdrawals_status;
+DROP INDEX IF EXISTS idx_support_tickets_status;
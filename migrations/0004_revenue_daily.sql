@@ -0,0 +1,54 @@
+-- Daily revenue rollup for get_time_based_analytics
+-- One row per calendar day (UTC, by transaction created_at) holding the
+-- sum and count of successful transactions; triggers keep it current.
+
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    day TEXT PRIMARY KEY,  -- YYYY-MM-DD
+    total_amount REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from existing transactions (rebuild_revenue_daily() redoes this on demand)
+INSERT INTO revenue_daily (day, total_amount, count)
+SELECT date(created_at), SUM(amount), COUNT(*)
+FROM transactions
+WHERE status = 'success'
+GROUP BY date(created_at)
+ON CONFLICT(day) DO UPDATE SET total_amount = excluded.total_amount, count = excluded.count;
+
+-- checkout() records purchases as success straight away
+CREATE TRIGGER IF NOT EXISTS trg_transactions_revenue_insert
+AFTER INSERT ON transactions
+WHEN NEW.status = 'success'
+BEGIN
+    INSERT INTO revenue_daily (day, total_amount, count) VALUES (date(NEW.created_at), NEW.amount, 1)
+    ON CONFLICT(day) DO UPDATE SET total_amount = total_amount + excluded.total_amount, count = count + 1;
+END;
+
+-- Payments flip pending -> success
+CREATE TRIGGER IF NOT EXISTS trg_transactions_revenue_success
+AFTER UPDATE OF status ON transactions
+WHEN NEW.status = 'success' AND OLD.status IS NOT 'success'
+BEGIN
+    INSERT INTO revenue_daily (day, total_amount, count) VALUES (date(NEW.created_at), NEW.amount, 1)
+    ON CONFLICT(day) DO UPDATE SET total_amount = total_amount + excluded.total_amount, count = count + 1;
+END;
+
+-- A success that is later reversed leaves the rollup
+CREATE TRIGGER IF NOT EXISTS trg_transactions_revenue_reversed
+AFTER UPDATE OF status ON transactions
+WHEN OLD.status = 'success' AND NEW.status IS NOT 'success'
+BEGIN
+    UPDATE revenue_daily
+    SET total_amount = total_amount - OLD.amount, count = count - 1
+    WHERE day = date(OLD.created_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_transactions_revenue_delete
+AFTER DELETE ON transactions
+WHEN OLD.status = 'success'
+BEGIN
+    UPDATE revenue_daily
+    SET total_amount = total_amount - OLD.amount, count = count - 1
+    WHERE day = date(OLD.created_at);
+END;
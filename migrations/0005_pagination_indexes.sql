@@ -0,0 +1,5 @@
+-- Keyset pagination: lists are ordered by (created_at, id) and each index
+-- below carries the rowid id implicitly, so a page is a single index range
+
+-- get_all_sellers_with_stats: ORDER BY created_at DESC, seller_id DESC
+CREATE INDEX IF NOT EXISTS idx_sellers_created ON sellers(created_at);
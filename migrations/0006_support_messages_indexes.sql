@@ -0,0 +1,4 @@
+-- get_support_messages: ORDER BY created_at DESC, message_id DESC, optionally
+-- only unread (is_read = 0); rowid rides along as the keyset tie-breaker
+CREATE INDEX IF NOT EXISTS idx_support_messages_created ON support_messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_support_messages_unread_created ON support_messages(is_read, created_at);
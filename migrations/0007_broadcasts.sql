@@ -0,0 +1,32 @@
+-- Broadcast jobs from the dashboard, sent by the background worker in broadcast.py
+-- Every recipient gets a row up front; a row stays 'pending' until its message is
+-- delivered or has failed, so a restarted worker resumes with exactly the
+-- recipients that are left.
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    created_by INTEGER,
+    status TEXT DEFAULT 'queued',  -- queued, running, completed, cancelled
+    total_count INTEGER NOT NULL DEFAULT 0,
+    sent_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    broadcast_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, sent, failed
+    error TEXT,
+    sent_at TIMESTAMP,
+    PRIMARY KEY (broadcast_id, user_id)
+) WITHOUT ROWID;
+
+-- get_pending_broadcast_recipients: {broadcast_id, status: pending} by user_id
+CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status ON broadcast_recipients(broadcast_id, status, user_id);
+-- get_unfinished_broadcasts: queued or running, oldest first (partial, so already in order)
+CREATE INDEX IF NOT EXISTS idx_broadcasts_unfinished ON broadcasts(broadcast_id)
+    WHERE status IN ('queued', 'running');
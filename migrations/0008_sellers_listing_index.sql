@@ -0,0 +1,8 @@
+-- get_all_sellers_with_stats: ORDER BY status ASC, created_at DESC, seller_id DESC
+-- (the baseline's status grouping, kept under keyset pagination). The mixed
+-- directions need their own index; seller_id is listed so the rowid tiebreak
+-- runs DESC too, and each page is a walk of this index from the cursor's status
+CREATE INDEX IF NOT EXISTS idx_sellers_listing ON sellers(status, created_at DESC, seller_id DESC);
+
+-- Only served the created_at-only order above
+DROP INDEX IF EXISTS idx_sellers_created;
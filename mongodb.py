@@ -1,12 +1,85 @@
 """
 MongoDB Database Module for Gmail Marketplace Bot
 """
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+import random
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import config
+from cache import SnapshotCache
 
 class MongoDatabase:
+    STATS_FIELDS = ('total_users', 'available_gmails', 'sold_gmails', 'pending_sellers',
+                    'pending_batches', 'pending_withdrawals', 'total_revenue', 'seller_pending_payouts')
+    
+    # Every index the queries below rely on, as {collection: [(keys, options)]}.
+    # Compound keys follow ESR order: equality fields, then the sort, then ranges.
+    # check_mongo_query_plans.py explains each method against these.
+    INDEXES = {
+        "users": [
+            ([("user_id", ASCENDING)], {"unique": True}),
+            # get_all_users / get_users_with_stats keyset pages
+            ([("created_at", DESCENDING), ("user_id", DESCENDING)], {}),
+        ],
+        "sellers": [
+            ([("user_id", ASCENDING)], {}),
+            # get_pending_sellers: {status} sorted by created_at
+            ([("status", ASCENDING), ("created_at", ASCENDING)], {}),
+            # get_all_sellers_with_stats keyset pages: by status, newest first within each
+            ([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ],
+        "gmails": [
+            ([("email", ASCENDING)], {}),
+            # approve_gmail_batch: {batch_id, status: pending}
+            ([("batch_id", ASCENDING), ("status", ASCENDING)], {}),
+            # purchase/checkout {status}, pending batches, get_all_purchases keyset pages
+            ([("status", ASCENDING), ("sold_at", DESCENDING), ("_id", DESCENDING)], {}),
+            # seller_id is an ObjectId, so $lookup from sellers joins on these directly
+            ([("seller_id", ASCENDING), ("status", ASCENDING), ("sold_at", DESCENDING)], {}),
+            ([("seller_id", ASCENDING), ("created_at", DESCENDING)], {}),
+            # get_user_purchases: {buyer_id, status} sorted by sold_at; buyer_id alone for counts
+            ([("buyer_id", ASCENDING), ("status", ASCENDING), ("sold_at", DESCENDING)], {}),
+        ],
+        "transactions": [
+            ([("cashfree_order_id", ASCENDING)], {}),
+            # get_user_transactions / get_user_detail: {user_id} sorted by created_at
+            ([("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+            # rebuild_revenue_daily and the stats revenue total: {status: success}
+            ([("status", ASCENDING), ("created_at", ASCENDING)], {}),
+        ],
+        "withdrawals": [
+            ([("seller_id", ASCENDING)], {}),
+            # get_pending_withdrawals keyset pages, oldest first
+            ([("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ],
+        "support_messages": [
+            # get_support_messages keyset pages, all and unread-only
+            ([("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+            ([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ],
+        "support_tickets": [
+            ([("ticket_id", ASCENDING)], {"unique": True}),
+            # get_all_tickets keyset pages, all and by status
+            ([("created_at", DESCENDING), ("ticket_id", DESCENDING)], {}),
+            ([("status", ASCENDING), ("created_at", DESCENDING), ("ticket_id", DESCENDING)], {}),
+        ],
+        "seller_inventory_counters": [
+            ([("seller_id", ASCENDING), ("status", ASCENDING)], {"unique": True}),
+        ],
+        "broadcasts": [
+            ([("broadcast_id", ASCENDING)], {"unique": True}),
+            # get_unfinished_broadcasts: {status: $in} sorted by broadcast_id
+            ([("status", ASCENDING), ("broadcast_id", ASCENDING)], {}),
+        ],
+        "broadcast_recipients": [
+            ([("broadcast_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+            # get_pending_broadcast_recipients keyset pages by user_id
+            ([("broadcast_id", ASCENDING), ("status", ASCENDING), ("user_id", ASCENDING)], {}),
+        ],
+    }
+    
     def __init__(self):
         self.client = MongoClient(config.MONGODB_URI)
         self.db = self.client[config.DATABASE_NAME]
@@ -18,29 +91,110 @@ class MongoDatabase:
         self.transactions = self.db.transactions
         self.withdrawals = self.db.withdrawals
         self.support_messages = self.db.support_messages
+        self.inventory_counters = self.db.inventory_counters
+        self.seller_inventory_counters = self.db.seller_inventory_counters
+        self.revenue_daily = self.db.revenue_daily
+        self.support_tickets = self.db.support_tickets
+        self.sequences = self.db.sequences
+        self.broadcasts = self.db.broadcasts
+        self.broadcast_recipients = self.db.broadcast_recipients
+        
+        self.stats_cache = SnapshotCache(self._compute_stats, config.STATS_CACHE_TTL)
         
         # Create indexes
         self.create_indexes()
+        
+        # Seed inventory counters for databases created before they existed
+        if self.inventory_counters.estimated_document_count() == 0:
+            self.rebuild_inventory_counters()
+        if self.revenue_daily.estimated_document_count() == 0:
+            self.rebuild_revenue_daily()
+        if self._has_string_seller_ids():
+            print("Warning: seller_id references are stored as strings; run python migrate_mongo_seller_ids.py")
     
     def create_indexes(self):
         """Create database indexes for performance"""
-        self.users.create_index([("user_id", ASCENDING)], unique=True)
-        self.sellers.create_index([("user_id", ASCENDING)])
-        self.sellers.create_index([("status", ASCENDING)])
-        self.gmails.create_index([("status", ASCENDING)])
-        self.gmails.create_index([("batch_id", ASCENDING)])
-        self.gmails.create_index([("seller_id", ASCENDING)])
-        self.transactions.create_index([("user_id", ASCENDING)])
-        self.transactions.create_index([("cashfree_order_id", ASCENDING)])
-        self.withdrawals.create_index([("seller_id", ASCENDING)])
-        self.withdrawals.create_index([("status", ASCENDING)])
+        for collection, specs in self.INDEXES.items():
+            for keys, options in specs:
+                self.db[collection].create_index(keys, **options)
+
+    def stale_indexes(self) -> Dict[str, List[str]]:
+        """Names of indexes that exist but are no longer declared in INDEXES, per collection"""
+        stale = {}
+        for collection in self.db.list_collection_names():
+            declared = [list(keys) for keys, _ in self.INDEXES.get(collection, [])]
+            names = [
+                name for name, info in self.db[collection].index_information().items()
+                if name != "_id_" and [tuple(key) for key in info["key"]] not in declared
+            ]
+            if names:
+                stale[collection] = names
+        return stale
+
+    def _keyset(self, collection, query: Dict, sort_field: str, after_id=None,
+                id_field: str = "_id", ascending: bool = False, group_field: str = None):
+        """Extend query for keyset pagination on (sort_field, id_field)
+        
+        Returns (query, sort); query is None when after_id matches no document.
+        Raises ValueError when after_id is not an ObjectId (_id) or integer id.
+        With group_field, documents are ordered by group_field ascending first.
+        """
+        from bson import ObjectId
+        direction = ASCENDING if ascending else DESCENDING
+        op = "$gt" if ascending else "$lt"
+        sort = [(id_field, direction)] if sort_field == id_field else [(sort_field, direction), (id_field, direction)]
+        if group_field:
+            sort.insert(0, (group_field, ASCENDING))
+        if after_id is None:
+            return query, sort
+        
+        if id_field == "_id":
+            if not ObjectId.is_valid(after_id):
+                raise ValueError(f"Invalid cursor: {after_id!r}")
+            key = ObjectId(after_id)
+        else:
+            # Cursors arrive as query-string text; user_id and ticket_id values are ints
+            try:
+                key = int(after_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid cursor: {after_id!r}") from None
+        if sort_field == id_field:
+            page = {id_field: {op: key}}
+        else:
+            anchor = collection.find_one({id_field: key}, {sort_field: 1, **({group_field: 1} if group_field else {})})
+            if anchor is None:
+                return None, sort
+            value = anchor.get(sort_field)
+            page = {"$or": [{sort_field: {op: value}}, {sort_field: value, id_field: {op: key}}]}
+            if group_field:
+                group = anchor.get(group_field)
+                page = {"$or": [{group_field: {"$gt": group}}, {"$and": [{group_field: group}, page]}]}
+        return ({"$and": [query, page]} if query else page), sort
+    
+    def _join_user(self, local_field: str = "user_id") -> List[Dict]:
+        """Pipeline stages that copy username/full_name from users onto each document"""
+        return [
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": local_field,
+                    "foreignField": "user_id",
+                    "as": "user_info"
+                }
+            },
+            {"$set": {
+                "username": {"$ifNull": [{"$arrayElemAt": ["$user_info.username", 0]}, "Unknown"]},
+                "full_name": {"$ifNull": [{"$arrayElemAt": ["$user_info.full_name", 0]}, ""]}
+            }},
+            {"$project": {"user_info": 0}}
+        ]
     
     # ==================== USER OPERATIONS ====================
     
     def create_user(self, user_id: int, username: str, full_name: str) -> bool:
         """Create or update user"""
         try:
-            self.users.update_one(
+            result = self.users.update_one(
                 {"user_id": user_id},
                 {"$set": {
                     "username": username,
@@ -54,6 +208,9 @@ class MongoDatabase:
                 }},
                 upsert=True
             )
+            # Only a new user changes the statistics; /start runs this for everyone
+            if result.upserted_id is not None:
+                self.invalidate_stats()
             return True
         except Exception as e:
             print(f"Error creating user: {e}")
@@ -63,9 +220,15 @@ class MongoDatabase:
         """Get user by ID"""
         return self.users.find_one({"user_id": user_id})
     
-    def get_all_users(self) -> List[Dict]:
-        """Get all users"""
-        return list(self.users.find({}).sort("created_at", -1))
+    def get_all_users(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get users, newest first (one page when limit is given, continuing after user after_id)"""
+        query, sort = self._keyset(self.users, {}, "created_at", after_id, id_field="user_id")
+        if query is None:
+            return []
+        cursor = self.users.find(query).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
     
     def update_wallet(self, user_id: int, amount: float) -> bool:
         """Update user wallet balance"""
@@ -110,6 +273,7 @@ class MongoDatabase:
                 {"user_id": user_id},
                 {"$set": {"role": "seller"}}
             )
+            self.invalidate_stats()
             return True
         except Exception as e:
             print(f"Error creating seller: {e}")
@@ -145,21 +309,26 @@ class MongoDatabase:
                 "approved_by": admin_id
             }}
         )
+        self.invalidate_stats()
         return result.modified_count > 0
     
     def get_pending_sellers(self) -> List[Dict]:
         """Get all pending sellers"""
-        sellers = list(self.sellers.find({"status": "pending"}).sort("created_at", ASCENDING))
-        for seller in sellers:
-            user = self.users.find_one({"user_id": seller["user_id"]})
-            seller["username"] = user.get("username", "Unknown") if user else "Unknown"
-            seller["full_name"] = user.get("full_name", "") if user else ""
-            seller["seller_id"] = str(seller["_id"])
-        return sellers
-    
-    def get_all_sellers_with_stats(self) -> List[Dict]:
-        """Get all sellers with their Gmail statistics"""
         pipeline = [
+            {"$match": {"status": "pending"}},
+            {"$sort": {"created_at": 1}},
+            *self._join_user(),
+            {"$set": {"seller_id": {"$toString": "$_id"}}}
+        ]
+        return list(self.sellers.aggregate(pipeline))
+    
+    def get_all_sellers_with_stats(self, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get sellers with their Gmail statistics by status, newest first within each (paged by _id)"""
+        query, sort = self._keyset(self.sellers, {}, "created_at", after_id, group_field="status")
+        if query is None:
+            return []
+        # Page first so the lookups only run for the rows returned
+        pipeline = [{"$match": query}, {"$sort": dict(sort)}] + ([{"$limit": limit}] if limit else []) + [
             {
                 "$lookup": {
                     "from": "users",
@@ -170,107 +339,91 @@ class MongoDatabase:
             },
             {
                 "$lookup": {
-                    "from": "gmails",
-                    "let": {"seller_id": "$_id"},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$seller_id", {"$toString": "$$seller_id"}]}}}
-                    ],
-                    "as": "gmails"
+                    "from": "seller_inventory_counters",
+                    "localField": "_id",
+                    "foreignField": "seller_id",
+                    "as": "counters"
                 }
             },
             {
                 "$project": {
+                    "_id": 0,
+                    "seller_id": {"$toString": "$_id"},
                     "user_id": 1,
                     "status": 1,
                     "total_earnings": 1,
+                    "created_at": 1,
                     "username": {"$arrayElemAt": ["$user_info.username", 0]},
                     "full_name": {"$arrayElemAt": ["$user_info.full_name", 0]},
                     "pending_gmails": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$gmails",
-                                "cond": {"$eq": ["$$this.status", "pending"]}
+                        "$sum": {
+                            "$map": {
+                                "input": {"$filter": {"input": "$counters", "cond": {"$eq": ["$$this.status", "pending"]}}},
+                                "in": "$$this.count"
                             }
                         }
                     },
                     "available_gmails": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$gmails",
-                                "cond": {"$eq": ["$$this.status", "available"]}
+                        "$sum": {
+                            "$map": {
+                                "input": {"$filter": {"input": "$counters", "cond": {"$eq": ["$$this.status", "available"]}}},
+                                "in": "$$this.count"
                             }
                         }
                     },
                     "sold_gmails": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$gmails",
-                                "cond": {"$eq": ["$$this.status", "sold"]}
+                        "$sum": {
+                            "$map": {
+                                "input": {"$filter": {"input": "$counters", "cond": {"$eq": ["$$this.status", "sold"]}}},
+                                "in": "$$this.count"
                             }
                         }
                     }
                 }
-            },
-            {"$sort": {"status": 1, "created_at": -1}}
+            }
         ]
         
         return list(self.sellers.aggregate(pipeline))
 
-    def get_users_with_stats(self) -> List[Dict]:
-        """Get all users with their purchase and selling statistics"""
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "gmails",
-                    "let": {"user_id": "$user_id"},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$buyer_id", "$$user_id"]}}}
-                    ],
-                    "as": "purchases"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "sellers",
-                    "localField": "user_id",
-                    "foreignField": "user_id",
-                    "as": "seller_info"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "gmails",
-                    "let": {"seller_id_obj": {"$arrayElemAt": ["$seller_info._id", 0]}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$seller_id", {"$toString": "$$seller_id_obj"}]}}}
-                    ],
-                    "as": "provisions"
-                }
-            },
-            {
-                "$project": {
-                    "user_id": 1,
-                    "username": 1,
-                    "full_name": 1,
-                    "wallet_balance": 1,
-                    "role": 1,
-                    "is_banned": 1,
-                    "created_at": 1,
-                    "total_bought": {"$size": "$purchases"},
-                    "total_provided": {"$size": "$provisions"},
-                    "total_sold": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$provisions",
-                                "cond": {"$eq": ["$$this.status", "sold"]}
-                            }
-                        }
-                    }
-                }
-            },
-            {"$sort": {"created_at": -1}}
-        ]
-        return list(self.users.aggregate(pipeline))
+    def get_users_with_stats(self, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get users with their purchase and selling statistics, newest first (paged by user_id)"""
+        query, sort = self._keyset(self.users, {}, "created_at", after_id, id_field="user_id")
+        if query is None:
+            return []
+        cursor = self.users.find(query, {
+            "_id": 0, "user_id": 1, "username": 1, "full_name": 1, "wallet_balance": 1,
+            "role": 1, "is_banned": 1, "created_at": 1
+        }).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        users = list(cursor)
+        user_ids = [u["user_id"] for u in users]
+        
+        # Count the page's gmails once grouped by buyer, and read the per-seller
+        # counters once, instead of pulling every gmail document per user
+        bought = {
+            row["_id"]: row["count"]
+            for row in self.gmails.aggregate([
+                {"$match": {"buyer_id": {"$in": user_ids}}},
+                {"$group": {"_id": "$buyer_id", "count": {"$sum": 1}}}
+            ])
+        }
+        seller_users = {
+            seller["_id"]: seller["user_id"]
+            for seller in self.sellers.find({"user_id": {"$in": user_ids}}, {"user_id": 1})
+        }
+        provided, sold = {}, {}
+        for counter in self.seller_inventory_counters.find({"seller_id": {"$in": list(seller_users)}}):
+            user_id = seller_users[counter["seller_id"]]
+            provided[user_id] = provided.get(user_id, 0) + counter["count"]
+            if counter["status"] == "sold":
+                sold[user_id] = sold.get(user_id, 0) + counter["count"]
+        
+        for user in users:
+            user["total_bought"] = bought.get(user["user_id"], 0)
+            user["total_provided"] = provided.get(user["user_id"], 0)
+            user["total_sold"] = sold.get(user["user_id"], 0)
+        return users
 
     def get_user_detail(self, user_id: int) -> Optional[Dict]:
         """Get comprehensive user detail including all activities"""
@@ -279,19 +432,24 @@ class MongoDatabase:
             return None
         
         # Get purchases
-        purchases = list(self.gmails.find({"buyer_id": user_id}).sort("sold_at", -1))
-        for p in purchases: p['_id'] = str(p['_id'])
+        # buyer_id is only ever set on sold Gmails; matching status too keeps the sort on the index
+        purchases = self.get_user_purchases(user_id)
+        for p in purchases:
+            p['_id'], p['seller_id'] = str(p['_id']), str(p['seller_id'])
+            p.pop('claim_token', None)
         
         # Get seller info
         seller = self.get_seller(user_id)
         provisions = []
         if seller:
-            provisions = list(self.gmails.find({"seller_id": str(seller['seller_id'])}).sort("created_at", -1))
-            for p in provisions: p['_id'] = str(p['_id'])
+            provisions = list(self.gmails.find({"seller_id": seller['_id']}, {"claim_token": 0}).sort("created_at", -1))
+            seller['_id'] = seller['seller_id']
+            for p in provisions: p['_id'], p['seller_id'] = str(p['_id']), str(p['seller_id'])
         
         # Get transactions
         txns = list(self.transactions.find({"user_id": user_id}).sort("created_at", -1))
         for t in txns: t['_id'] = str(t['_id'])
+        user['_id'] = str(user['_id'])
         
         return {
             "profile": user,
@@ -314,26 +472,88 @@ class MongoDatabase:
     
     def add_gmails(self, seller_id: str, gmails: List[tuple], batch_id: str) -> bool:
         """Add Gmail accounts for sale"""
+        return self.ingest_gmails(seller_id, gmails, batch_id).get('success', False)
+    
+    def ingest_gmails(self, seller_id: str, gmails: List[tuple], batch_id: str,
+                      chunk_size: int = None) -> Dict:
+        """Bulk insert Gmail accounts in unordered chunks, skipping emails already listed
+
+        An email from a rejected batch is not listed, so it may be submitted again.
+        """
+        from bson import ObjectId
+        seller_id = ObjectId(seller_id)
+        chunk_size = chunk_size or config.GMAIL_INGEST_CHUNK_SIZE
+        started = time.perf_counter()
+        inserted = 0
+        duplicates = 0
+        seen = set()
         try:
-            docs = []
-            for email, password in gmails:
-                docs.append({
-                    "seller_id": seller_id,
-                    "email": email,
-                    "password": password,
-                    "batch_id": batch_id,
-                    "status": "pending",
-                    "created_at": datetime.now()
-                })
-            self.gmails.insert_many(docs)
-            return True
+            for start in range(0, len(gmails), chunk_size):
+                chunk = gmails[start:start + chunk_size]
+                
+                emails = list({email for email, _ in chunk})
+                existing = {doc["email"] for doc in self.gmails.find(
+                    {"email": {"$in": emails}, "status": {"$ne": "rejected"}}, {"email": 1}
+                )}
+                
+                now = datetime.now()
+                docs = []
+                for email, password in chunk:
+                    if email in seen or email in existing:
+                        duplicates += 1
+                        continue
+                    seen.add(email)
+                    docs.append({
+                        "seller_id": seller_id,
+                        "email": email,
+                        "password": password,
+                        "batch_id": batch_id,
+                        "status": "pending",
+                        "created_at": now
+                    })
+                if not docs:
+                    continue
+                
+                try:
+                    result = self.gmails.insert_many(docs, ordered=False)
+                    chunk_inserted = len(result.inserted_ids)
+                except BulkWriteError as bwe:
+                    # With ordered=False the rest of the chunk is still written
+                    details = bwe.details
+                    chunk_inserted = details.get("nInserted", 0)
+                    write_errors = details.get("writeErrors", [])
+                    dup_errors = [err for err in write_errors if err.get("code") == 11000]
+                    duplicates += len(dup_errors)
+                    if len(dup_errors) != len(write_errors):
+                        self._bump_inventory({(seller_id, "pending"): chunk_inserted})
+                        inserted += chunk_inserted
+                        raise
+                self._bump_inventory({(seller_id, "pending"): chunk_inserted})
+                inserted += chunk_inserted
+            return {
+                'success': True,
+                'inserted': inserted,
+                'duplicates': duplicates,
+                'elapsed': time.perf_counter() - started
+            }
         except Exception as e:
             print(f"Error adding Gmails: {e}")
-            return False
+            return {
+                'success': False,
+                'inserted': inserted,
+                'duplicates': duplicates,
+                'elapsed': time.perf_counter() - started,
+                'error': str(e)
+            }
+        finally:
+            # Unordered chunks: a failed ingest may still have listed some
+            if inserted:
+                self.invalidate_stats()
     
     def approve_gmail_batch(self, batch_id: str, approved: bool = True) -> bool:
         """Approve or reject Gmail batch"""
         status = 'available' if approved else 'rejected'
+        batch = self.gmails.find_one({"batch_id": batch_id}, {"seller_id": 1})
         result = self.gmails.update_many(
             {"batch_id": batch_id, "status": "pending"},
             {"$set": {
@@ -341,37 +561,227 @@ class MongoDatabase:
                 "approved_at": datetime.now()
             }}
         )
+        if batch and result.modified_count:
+            self._bump_inventory({
+                (batch["seller_id"], "pending"): -result.modified_count,
+                (batch["seller_id"], status): result.modified_count
+            })
+        self.invalidate_stats()
         return result.modified_count > 0
     
+    def _bump_inventory(self, changes: Dict[tuple, int], session=None):
+        """Apply {(seller_id, status): delta} changes to the inventory counters with $inc"""
+        totals = {}
+        seller_ops = []
+        for (seller_id, status), delta in changes.items():
+            if not delta:
+                continue
+            totals[status] = totals.get(status, 0) + delta
+            seller_ops.append(UpdateOne(
+                {"seller_id": seller_id, "status": status},
+                {"$inc": {"count": delta}},
+                upsert=True
+            ))
+        status_ops = [
+            UpdateOne({"_id": status}, {"$inc": {"count": delta}}, upsert=True)
+            for status, delta in totals.items() if delta
+        ]
+        if status_ops:
+            self.inventory_counters.bulk_write(status_ops, ordered=False, session=session)
+        if seller_ops:
+            self.seller_inventory_counters.bulk_write(seller_ops, ordered=False, session=session)
+    
+    def _sold_inventory_changes(self, gmails: List[Dict]) -> Dict[tuple, int]:
+        """Counter changes for moving the given Gmails from available to sold"""
+        changes = {}
+        for gmail in gmails:
+            for key, delta in (((gmail["seller_id"], "available"), -1), ((gmail["seller_id"], "sold"), 1)):
+                changes[key] = changes.get(key, 0) + delta
+        return changes
+    
+    def rebuild_inventory_counters(self):
+        """Recompute the inventory counters from the gmails collection"""
+        rows = list(self.gmails.aggregate([
+            {"$group": {"_id": {"seller_id": "$seller_id", "status": "$status"}, "count": {"$sum": 1}}}
+        ]))
+        totals = {}
+        for row in rows:
+            status = row["_id"]["status"]
+            totals[status] = totals.get(status, 0) + row["count"]
+        
+        self.inventory_counters.delete_many({})
+        self.seller_inventory_counters.delete_many({})
+        if totals:
+            self.inventory_counters.insert_many([
+                {"_id": status, "count": count} for status, count in totals.items()
+            ])
+        if rows:
+            self.seller_inventory_counters.insert_many([
+                {"seller_id": row["_id"]["seller_id"], "status": row["_id"]["status"], "count": row["count"]}
+                for row in rows
+            ])
+    
+    def _has_string_seller_ids(self) -> bool:
+        """True if any gmail or withdrawal still references its seller by string id"""
+        unmigrated = {"seller_id": {"$type": "string"}}
+        return bool(self.gmails.find_one(unmigrated, {"_id": 1}) or self.withdrawals.find_one(unmigrated, {"_id": 1}))
+    
+    def migrate_seller_ids(self) -> Dict[str, int]:
+        """Convert string seller_id references to ObjectId and rebuild the counters keyed on them
+        
+        Safe to re-run; only documents still holding a string are touched.
+        """
+        converted = {}
+        for collection in (self.gmails, self.withdrawals):
+            result = collection.update_many(
+                {"seller_id": {"$type": "string"}},
+                [{"$set": {"seller_id": {"$toObjectId": "$seller_id"}}}]
+            )
+            converted[collection.name] = result.modified_count
+        self.rebuild_inventory_counters()
+        return converted
+    
+    def get_inventory_counts(self, seller_id=None) -> Dict[str, int]:
+        """Get Gmail counts by status, overall or for one seller"""
+        from bson import ObjectId
+        if seller_id is None:
+            return {doc["_id"]: doc["count"] for doc in self.inventory_counters.find({})}
+        return {
+            doc["status"]: doc["count"]
+            for doc in self.seller_inventory_counters.find({"seller_id": ObjectId(seller_id)})
+        }
+    
     def get_available_gmails_count(self) -> int:
         """Get count of available Gmails"""
-        return self.gmails.count_documents({"status": "available"})
+        doc = self.inventory_counters.find_one({"_id": "available"})
+        return doc["count"] if doc else 0
+    
+    def _claim_gmails(self, buyer_id: int, quantity: int, sold_at: datetime, session=None) -> List[Dict]:
+        """Mark up to quantity available Gmails sold to buyer_id and return exactly those documents
+        
+        Each round claims only the shortfall with a conditional update (status still
+        available) stamped with a per-order claim token, so a document another buyer
+        took first is skipped rather than sold twice. Candidates are sampled from a
+        window several times the shortfall to keep concurrent buyers apart.
+        """
+        from bson import ObjectId
+        token = ObjectId()
+        claimed = []
+        for _ in range(config.GMAIL_CLAIM_ATTEMPTS):
+            shortfall = quantity - len(claimed)
+            window = [doc["_id"] for doc in self.gmails.find(
+                {"status": "available"}, {"_id": 1}, session=session
+            ).limit(shortfall * config.GMAIL_CLAIM_WINDOW)]
+            if len(window) < shortfall:
+                break
+            candidates = random.sample(window, shortfall)
+            self.gmails.update_many(
+                {"_id": {"$in": candidates}, "status": "available"},
+                {"$set": {"status": "sold", "buyer_id": buyer_id, "sold_at": sold_at, "claim_token": token}},
+                session=session
+            )
+            claimed += self.gmails.find({"_id": {"$in": candidates}, "claim_token": token}, session=session)
+            if len(claimed) == quantity:
+                break
+        return claimed
+    
+    def _release_gmails(self, gmails: List[Dict]):
+        """Put a partial claim back on sale"""
+        if gmails:
+            self.gmails.update_many(
+                {"_id": {"$in": [g["_id"] for g in gmails]}, "claim_token": gmails[0]["claim_token"]},
+                {"$set": {"status": "available"}, "$unset": {"buyer_id": "", "sold_at": "", "claim_token": ""}}
+            )
     
     def purchase_gmails(self, buyer_id: int, quantity: int) -> List[Dict]:
         """Purchase Gmail accounts"""
         try:
-            # Get available Gmails
-            gmails = list(self.gmails.find({"status": "available"}).limit(quantity))
-            
+            gmails = self._claim_gmails(buyer_id, quantity, datetime.now())
             if len(gmails) < quantity:
+                self._release_gmails(gmails)
                 return []
             
-            # Mark as sold
-            gmail_ids = [g["_id"] for g in gmails]
-            self.gmails.update_many(
-                {"_id": {"$in": gmail_ids}},
-                {"$set": {
-                    "status": "sold",
-                    "buyer_id": buyer_id,
-                    "sold_at": datetime.now()
-                }}
-            )
+            self._bump_inventory(self._sold_inventory_changes(gmails))
+            self.invalidate_stats()
             
             return gmails
         except Exception as e:
             print(f"Error purchasing Gmails: {e}")
             return []
     
+    def checkout(self, buyer_id: int, quantity: int, price: float,
+                 seller_rate: float = None) -> Dict:
+        """Atomically reserve Gmails, debit the wallet, record the purchase and credit sellers"""
+        from bson import ObjectId
+        seller_rate = config.SELL_RATE if seller_rate is None else seller_rate
+        total_cost = quantity * price
+
+        class CheckoutAborted(Exception):
+            def __init__(self, result):
+                self.result = result
+
+        def run(session) -> Dict:
+            user = self.users.find_one({"user_id": buyer_id}, {"wallet_balance": 1}, session=session)
+            balance = user.get("wallet_balance", 0.0) if user else 0.0
+            if balance < total_cost:
+                raise CheckoutAborted({'success': False, 'error': 'insufficient_balance', 'balance': balance})
+
+            now = datetime.now()
+            # A short claim is undone with the rest of the transaction
+            gmails = self._claim_gmails(buyer_id, quantity, now, session=session)
+            if len(gmails) < quantity:
+                raise CheckoutAborted({'success': False, 'error': 'insufficient_stock', 'available': len(gmails)})
+
+            result = self.users.update_one(
+                {"user_id": buyer_id, "wallet_balance": {"$gte": total_cost}},
+                {"$inc": {"wallet_balance": -total_cost}},
+                session=session
+            )
+            if result.modified_count != 1:
+                raise CheckoutAborted({'success': False, 'error': 'insufficient_balance', 'balance': balance})
+
+            txn = self.transactions.insert_one({
+                "user_id": buyer_id,
+                "type": "purchase",
+                "amount": -total_cost,
+                "cashfree_order_id": None,
+                "payment_link": None,
+                "description": f"Purchased {quantity} Gmail(s)",
+                "status": "success",
+                "created_at": now,
+                "completed_at": now
+            }, session=session)
+            self._bump_revenue(now, -total_cost, 1, session=session)
+
+            # One earnings update per seller rather than per Gmail
+            sold_per_seller = {}
+            for gmail in gmails:
+                sold_per_seller[gmail["seller_id"]] = sold_per_seller.get(gmail["seller_id"], 0) + 1
+            self.sellers.bulk_write([
+                UpdateOne({"_id": seller_id}, {"$inc": {"total_earnings": count * seller_rate}})
+                for seller_id, count in sold_per_seller.items()
+            ], session=session)
+            self._bump_inventory(self._sold_inventory_changes(gmails), session=session)
+
+            return {
+                'success': True,
+                'gmails': gmails,
+                'txn_id': str(txn.inserted_id),
+                'total_cost': total_cost,
+                'balance': balance - total_cost
+            }
+
+        try:
+            with self.client.start_session() as session:
+                result = session.with_transaction(run)
+            self.invalidate_stats()
+            return result
+        except CheckoutAborted as aborted:
+            return aborted.result
+        except Exception as e:
+            print(f"Error during checkout: {e}")
+            return {'success': False, 'error': str(e)}
+
     def get_pending_gmail_batches(self) -> List[Dict]:
         """Get pending Gmail batches"""
         pipeline = [
@@ -394,40 +804,159 @@ class MongoDatabase:
                     "sample_emails": {"$slice": ["$sample_emails", 3]}
                 }
             },
-            {"$sort": {"created_at": 1}}
+            {"$sort": {"created_at": 1}},
+            {
+                "$lookup": {
+                    "from": "sellers",
+                    "localField": "seller_id",
+                    "foreignField": "_id",
+                    "as": "seller_info"
+                }
+            },
+            {"$set": {
+                "seller_id": {"$toString": "$seller_id"},
+                "user_id": {"$arrayElemAt": ["$seller_info.user_id", 0]}
+            }},
+            {"$project": {"seller_info": 0}},
+            *self._join_user()
         ]
         
         batches = list(self.gmails.aggregate(pipeline))
         for batch in batches:
             batch["batch_id"] = batch["_id"]
             batch["sample_emails"] = ", ".join(batch["sample_emails"])
-            # Get seller info
-            from bson import ObjectId
-            seller = self.sellers.find_one({"_id": ObjectId(batch["seller_id"])})
-            if seller:
-                user = self.users.find_one({"user_id": seller["user_id"]})
-                batch["username"] = user.get("username", "Unknown") if user else "Unknown"
-                batch["user_id"] = seller["user_id"]
-        
         return batches
     
     def get_user_purchases(self, user_id: int) -> List[Dict]:
         """Get user's purchased Gmails"""
         return list(self.gmails.find({"buyer_id": user_id, "status": "sold"}).sort("sold_at", DESCENDING))
     
+    def get_sellers_awaiting_payment(self) -> List[Dict]:
+        """Get sellers who have sold Gmails"""
+        pipeline = [
+            {"$match": {"status": "sold", "count": {"$gt": 0}}},
+            {"$lookup": {"from": "sellers", "localField": "seller_id", "foreignField": "_id", "as": "seller"}},
+            {"$unwind": "$seller"},
+            *self._join_user("seller.user_id"),
+            {
+                "$lookup": {
+                    "from": "gmails",
+                    "let": {"seller_id": "$seller_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$seller_id", "$$seller_id"]},
+                            {"$eq": ["$status", "sold"]}
+                        ]}}},
+                        {"$sort": {"sold_at": -1}},
+                        {"$limit": 1},
+                        {"$project": {"sold_at": 1}}
+                    ],
+                    "as": "last_sale"
+                }
+            },
+            {"$project": {
+                "_id": 0,
+                "user_id": "$seller.user_id",
+                "username": 1,
+                "full_name": 1,
+                "sold_count": "$count",
+                "last_sale_date": {"$arrayElemAt": ["$last_sale.sold_at", 0]},
+                "upi_qr_path": "$seller.upi_qr_path"
+            }},
+            {"$sort": {"last_sale_date": -1}}
+        ]
+        sellers = list(self.seller_inventory_counters.aggregate(pipeline))
+        for seller in sellers:
+            seller["amount_owed"] = seller["sold_count"] * config.SELL_RATE
+        return sellers
+    
+    def mark_seller_gmails_as_paid(self, user_id: int) -> int:
+        """Count sold Gmails from a seller (no update needed without is_paid column)"""
+        seller = self.get_seller(user_id)
+        if not seller:
+            return 0
+        return self.get_inventory_counts(seller["_id"]).get("sold", 0)
+    
+    def get_all_purchases(self, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get buyer purchases for admin panel, most recent first (paged by _id)"""
+        query, sort = self._keyset(self.gmails, {"status": "sold"}, "sold_at", after_id)
+        if query is None:
+            return []
+        cursor = self.gmails.find(query, {"email": 1, "sold_at": 1, "buyer_id": 1, "seller_id": 1}).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        gmails = list(cursor)
+        
+        # Resolve usernames for the whole page in three queries
+        sellers = {
+            s["_id"]: s["user_id"]
+            for s in self.sellers.find({"_id": {"$in": [g["seller_id"] for g in gmails]}}, {"user_id": 1})
+        }
+        user_ids = {g.get("buyer_id") for g in gmails} | set(sellers.values())
+        usernames = {u["user_id"]: u.get("username") for u in self.users.find({"user_id": {"$in": list(user_ids)}}, {"user_id": 1, "username": 1})}
+        
+        purchases = []
+        for gmail in gmails:
+            purchases.append({
+                "_id": str(gmail["_id"]),
+                "email": gmail["email"],
+                "sold_at": gmail.get("sold_at"),
+                "buyer_id": gmail.get("buyer_id"),
+                "buyer_username": usernames.get(gmail.get("buyer_id")),
+                "seller_username": usernames.get(sellers.get(gmail["seller_id"]))
+            })
+        return purchases
+    
+    def get_all_gmails(self, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get Gmail listings without passwords, newest first (paged by _id)"""
+        query, sort = self._keyset(self.gmails, {}, "_id", after_id)
+        cursor = self.gmails.find(query, {"password": 0, "claim_token": 0}).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        gmails = list(cursor)
+        for gmail in gmails:
+            gmail["_id"], gmail["seller_id"] = str(gmail["_id"]), str(gmail["seller_id"])
+        return gmails
+    
     def get_seller_sales(self, seller_id: str) -> Dict:
         """Get seller's sales statistics"""
-        from bson import ObjectId
-        total_sold = self.gmails.count_documents({"seller_id": str(seller_id), "status": "sold"})
-        total_available = self.gmails.count_documents({"seller_id": str(seller_id), "status": "available"})
-        total_pending = self.gmails.count_documents({"seller_id": str(seller_id), "status": "pending"})
+        counts = self.get_inventory_counts(seller_id)
         
         return {
-            "sold_count": total_sold,
-            "available_count": total_available,
-            "pending_count": total_pending
+            "sold_count": counts.get("sold", 0),
+            "available_count": counts.get("available", 0),
+            "pending_count": counts.get("pending", 0)
         }
     
+    def get_seller_gmail_batches(self, seller_id: str) -> List[Dict]:
+        """Get Gmail batches for a specific seller"""
+        from bson import ObjectId
+        pipeline = [
+            {"$match": {"seller_id": ObjectId(seller_id)}},
+            {
+                "$group": {
+                    "_id": "$batch_id",
+                    "count": {"$sum": 1},
+                    "created_at": {"$min": "$created_at"},
+                    "status": {"$first": "$status"}
+                }
+            },
+            {"$sort": {"created_at": -1}},
+            {"$project": {"_id": 0, "batch_id": "$_id", "count": 1, "created_at": 1, "status": 1}}
+        ]
+        return list(self.gmails.aggregate(pipeline))
+    
+    def get_sold_gmails_by_seller(self, seller_id: str) -> List[Dict]:
+        """Get sold Gmails with buyer info for a seller"""
+        from bson import ObjectId
+        pipeline = [
+            {"$match": {"seller_id": ObjectId(seller_id), "status": "sold"}},
+            {"$sort": {"sold_at": -1}},
+            *self._join_user("buyer_id"),
+            {"$project": {"_id": 0, "email": 1, "sold_at": 1, "buyer_id": 1, "buyer_username": "$username"}}
+        ]
+        return list(self.gmails.aggregate(pipeline))
+    
     # ==================== TRANSACTION OPERATIONS ====================
     
     def create_transaction(self, user_id: int, txn_type: str, amount: float, 
@@ -449,14 +978,23 @@ class MongoDatabase:
     def update_transaction_status(self, txn_id: str, status: str) -> bool:
         """Update transaction status"""
         from bson import ObjectId
-        result = self.transactions.update_one(
+        before = self.transactions.find_one_and_update(
             {"_id": ObjectId(txn_id)},
             {"$set": {
                 "status": status,
                 "completed_at": datetime.now()
-            }}
+            }},
+            projection={"status": 1, "amount": 1, "created_at": 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if before:
+            # Only the update that flips into / out of success touches the rollup
+            if status == "success" and before.get("status") != "success":
+                self._bump_revenue(before["created_at"], before["amount"], 1)
+            elif status != "success" and before.get("status") == "success":
+                self._bump_revenue(before["created_at"], -before["amount"], -1)
+        self.invalidate_stats()
+        return before is not None
     
     def get_transaction_by_order_id(self, order_id: str) -> Optional[Dict]:
         """Get transaction by Cashfree order ID"""
@@ -469,45 +1007,92 @@ class MongoDatabase:
         """Get user transaction history"""
         return list(self.transactions.find({"user_id": user_id}).sort("created_at", DESCENDING).limit(limit))
     
+    def get_all_transactions(self, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get transactions, newest first (paged by _id)"""
+        query, sort = self._keyset(self.transactions, {}, "_id", after_id)
+        cursor = self.transactions.find(query).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        txns = list(cursor)
+        for txn in txns:
+            txn["_id"] = str(txn["_id"])
+        return txns
+    
     # ==================== WITHDRAWAL OPERATIONS ====================
     
     def create_withdrawal(self, seller_id: str, user_id: int, amount: float, upi_qr_path: str) -> str:
         """Create withdrawal request"""
+        from bson import ObjectId
         result = self.withdrawals.insert_one({
-            "seller_id": seller_id,
+            "seller_id": ObjectId(seller_id),
             "user_id": user_id,
             "amount": amount,
             "upi_qr_path": upi_qr_path,
             "status": "pending",
             "created_at": datetime.now()
         })
+        self.invalidate_stats()
         return str(result.inserted_id)
     
-    def get_pending_withdrawals(self) -> List[Dict]:
-        """Get all pending withdrawal requests"""
-        withdrawals = list(self.withdrawals.find({"status": "pending"}).sort("created_at", ASCENDING))
-        for withdrawal in withdrawals:
-            withdrawal["withdrawal_id"] = str(withdrawal["_id"])
-            user = self.users.find_one({"user_id": withdrawal["user_id"]})
-            if user:
-                withdrawal["username"] = user.get("username", "Unknown")
-                withdrawal["full_name"] = user.get("full_name", "") 
-            from bson import ObjectId
-            seller = self.sellers.find_one({"_id": ObjectId(withdrawal["seller_id"])})
-            if seller:
-                withdrawal["total_earnings"] = seller.get("total_earnings", 0.0)
-        return withdrawals
+    def _pending_withdrawals_pipeline(self, after_id: str = None, limit: int = None,
+                                      with_sales: bool = False) -> Optional[List[Dict]]:
+        """Pipeline for one page of pending withdrawals joined to their user and seller"""
+        query, sort = self._keyset(self.withdrawals, {"status": "pending"}, "created_at", after_id, ascending=True)
+        if query is None:
+            return None
+        pipeline = [{"$match": query}, {"$sort": dict(sort)}] + ([{"$limit": limit}] if limit else []) + [
+            *self._join_user(),
+            {
+                "$lookup": {
+                    "from": "sellers",
+                    "localField": "seller_id",
+                    "foreignField": "_id",
+                    "as": "seller_info"
+                }
+            }
+        ]
+        if with_sales:
+            pipeline += [
+                {
+                    "$lookup": {
+                        "from": "seller_inventory_counters",
+                        "localField": "seller_id",
+                        "foreignField": "seller_id",
+                        "as": "counters"
+                    }
+                },
+                {"$set": {
+                    "total_sold": {
+                        "$sum": {
+                            "$map": {
+                                "input": {"$filter": {"input": "$counters", "cond": {"$eq": ["$$this.status", "sold"]}}},
+                                "in": "$$this.count"
+                            }
+                        }
+                    }
+                }},
+                {"$match": {"total_sold": {"$gt": 0}}}
+            ]
+        return pipeline + [
+            {"$set": {
+                "_id": {"$toString": "$_id"},
+                "withdrawal_id": {"$toString": "$_id"},
+                "seller_id": {"$toString": "$seller_id"},
+                "total_earnings": {"$ifNull": [{"$arrayElemAt": ["$seller_info.total_earnings", 0]}, 0.0]}
+            }},
+            {"$project": {"seller_info": 0, "counters": 0}}
+        ]
+    
+    def get_pending_withdrawals(self, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get pending withdrawal requests, oldest first (paged by _id)"""
+        pipeline = self._pending_withdrawals_pipeline(after_id, limit)
+        if pipeline is None:
+            return []
+        return list(self.withdrawals.aggregate(pipeline))
     
     def get_pending_withdrawals_with_sales(self) -> List[Dict]:
         """Get pending withdrawals only from sellers who have sold Gmails"""
-        withdrawals = self.get_pending_withdrawals()
-        filtered = []
-        for w in withdrawals:
-            sold_count = self.gmails.count_documents({"seller_id": w["seller_id"], "status": "sold"})
-            if sold_count > 0:
-                w["total_sold"] = sold_count
-                filtered.append(w)
-        return filtered
+        return list(self.withdrawals.aggregate(self._pending_withdrawals_pipeline(with_sales=True)))
     
     def process_withdrawal(self, withdrawal_id: str, admin_id: int, approved: bool = True) -> bool:
         """Process withdrawal request"""
@@ -521,67 +1106,102 @@ class MongoDatabase:
                 "processed_by": admin_id
             }}
         )
+        self.invalidate_stats()
         return result.modified_count > 0
     
     # ==================== STATISTICS ====================
     
-    def get_stats(self) -> Dict:
-        """Get system statistics"""
-        stats = {}
-        
-        stats['total_users'] = self.users.count_documents({})
-        stats['available_gmails'] = self.gmails.count_documents({"status": "available"})
-        stats['sold_gmails'] = self.gmails.count_documents({"status": "sold"})
-        stats['pending_sellers'] = self.sellers.count_documents({"status": "pending"})
-        
-        # Count distinct pending batches
-        pending_batches = self.gmails.distinct("batch_id", {"status": "pending"})
-        stats['pending_batches'] = len(pending_batches)
-        
-        stats['pending_withdrawals'] = self.withdrawals.count_documents({"status": "pending"})
-        
-        # Calculate revenue (wallet loads + purchases)
-        revenue_pipeline = [
-            {"$match": {"status": "success"}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        revenue_result = list(self.transactions.aggregate(revenue_pipeline))
-        stats['total_revenue'] = revenue_result[0]["total"] if revenue_result else 0.0
+    def get_stats(self, fresh: bool = False) -> Dict:
+        """Get system statistics (served from a snapshot refreshed every STATS_CACHE_TTL seconds)"""
+        return dict(self.stats_cache.get(fresh))
+    
+    def invalidate_stats(self):
+        """Drop the cached statistics snapshot after a write that changes them"""
+        self.stats_cache.invalidate()
+    
+    def _compute_stats(self) -> Dict:
+        """Compute system statistics in a single aggregation round-trip"""
+        def count_if(field: str, value: str) -> Dict:
+            return {"$cond": [{"$eq": [f"${field}", value]}, 1, 0]}
         
-        # Seller pending amount (sum of total_earnings for all approved/pending sellers who haven't withdrawn)
-        pending_payout_pipeline = [
-            {"$group": {"_id": None, "total": {"$sum": "$total_earnings"}}}
+        # Each collection contributes one partial document via $unionWith;
+        # the final $group folds them into a single stats document
+        pipeline = [
+            {"$project": {
+                "_id": 0,
+                "available_gmails": {"$cond": [{"$eq": ["$_id", "available"]}, "$count", 0]},
+                "sold_gmails": {"$cond": [{"$eq": ["$_id", "sold"]}, "$count", 0]}
+            }},
+            {"$unionWith": {"coll": "users", "pipeline": [{"$count": "total_users"}]}},
+            {"$unionWith": {"coll": "sellers", "pipeline": [
+                {"$group": {
+                    "_id": None,
+                    "pending_sellers": {"$sum": count_if("status", "pending")},
+                    "seller_pending_payouts": {"$sum": "$total_earnings"}
+                }}
+            ]}},
+            {"$unionWith": {"coll": "gmails", "pipeline": [
+                {"$match": {"status": "pending"}},
+                {"$group": {"_id": "$batch_id"}},
+                {"$count": "pending_batches"}
+            ]}},
+            {"$unionWith": {"coll": "withdrawals", "pipeline": [
+                {"$match": {"status": "pending"}},
+                {"$count": "pending_withdrawals"}
+            ]}},
+            {"$unionWith": {"coll": "transactions", "pipeline": [
+                {"$match": {"status": "success"}},
+                {"$group": {"_id": None, "total_revenue": {"$sum": "$amount"}}}
+            ]}},
+            {"$group": {"_id": None, **{key: {"$sum": f"${key}"} for key in self.STATS_FIELDS}}}
         ]
-        payout_result = list(self.sellers.aggregate(pending_payout_pipeline))
-        stats['seller_pending_payouts'] = payout_result[0]["total"] if payout_result else 0.0
         
+        result = next(self.inventory_counters.aggregate(pipeline), {})
+        stats = {key: result.get(key, 0) for key in self.STATS_FIELDS}
+        stats['total_revenue'] = float(stats['total_revenue'])
+        stats['seller_pending_payouts'] = float(stats['seller_pending_payouts'])
         return stats
 
+    def _bump_revenue(self, created_at: datetime, amount: float, count: int, session=None):
+        """Add a successful transaction to (or remove it from) its revenue_daily bucket"""
+        self.revenue_daily.update_one(
+            {"_id": created_at.strftime("%Y-%m-%d")},
+            {"$inc": {"total_amount": amount, "count": count}},
+            upsert=True,
+            session=session
+        )
+    
+    def rebuild_revenue_daily(self) -> int:
+        """Recompute the revenue_daily rollup from the transactions collection; returns the number of days"""
+        rows = list(self.transactions.aggregate([
+            {"$match": {"status": "success"}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "total_amount": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ]))
+        self.revenue_daily.delete_many({})
+        if rows:
+            self.revenue_daily.insert_many(rows)
+        return len(rows)
+    
     def get_time_based_analytics(self) -> Dict:
-        """Get daily, weekly, monthly, and yearly transaction analytics"""
-        analytics = {}
-        now = datetime.now()
-        
-        # Ranges
-        ranges = {
-            'daily': now - timedelta(days=1),
-            'weekly': now - timedelta(days=7),
-            'monthly': now - timedelta(days=30),
-            'yearly': now - timedelta(days=365)
+        """Get daily, weekly, monthly, and yearly transaction analytics from the revenue_daily rollup"""
+        # Windows are whole days ending today: daily = today, weekly = the last 7 days, ...
+        periods = {'daily': 1, 'weekly': 7, 'monthly': 30, 'yearly': 365}
+        today = datetime.now()
+        cutoffs = {
+            label: (today - timedelta(days=days)).strftime("%Y-%m-%d")
+            for label, days in periods.items()
         }
         
-        for label, start_date in ranges.items():
-            pipeline = [
-                {"$match": {"status": "success", "created_at": {"$gte": start_date}}},
-                {"$group": {
-                    "_id": None, 
-                    "total_amount": {"$sum": "$amount"},
-                    "count": {"$sum": 1}
-                }}
-            ]
-            result = list(self.transactions.aggregate(pipeline))
-            analytics[label] = result[0] if result else {"total_amount": 0, "count": 0}
-            
+        analytics = {label: {"total_amount": 0, "count": 0} for label in periods}
+        for day in self.revenue_daily.find({"_id": {"$gt": cutoffs['yearly']}}):
+            for label, cutoff in cutoffs.items():
+                if day["_id"] > cutoff:
+                    analytics[label]["total_amount"] += day["total_amount"]
+                    analytics[label]["count"] += day["count"]
         return analytics
 
     def save_support_message(self, user_id: int, message: str) -> bool:
@@ -598,15 +1218,185 @@ class MongoDatabase:
             print(f"Error saving support message: {e}")
             return False
 
-    def get_support_messages(self, unread_only: bool = True) -> List[Dict]:
-        """Get support messages for admin"""
-        query = {"status": "unread"} if unread_only else {}
-        messages = list(self.support_messages.find(query).sort("created_at", DESCENDING))
-        for msg in messages:
-            msg["_id"] = str(msg["_id"])
-            user = self.get_user(msg["user_id"])
-            msg["username"] = user.get("username", "Unknown") if user else "Unknown"
-        return messages
+    def get_support_messages(self, unread_only: bool = True, after_id: str = None, limit: int = None) -> List[Dict]:
+        """Get support messages for admin, newest first (paged by _id)"""
+        query, sort = self._keyset(
+            self.support_messages, {"status": "unread"} if unread_only else {}, "created_at", after_id
+        )
+        if query is None:
+            return []
+        pipeline = [{"$match": query}, {"$sort": dict(sort)}] + ([{"$limit": limit}] if limit else []) + [
+            *self._join_user(),
+            {"$set": {"_id": {"$toString": "$_id"}}}
+        ]
+        return list(self.support_messages.aggregate(pipeline))
+
+    # ==================== SUPPORT TICKETS ====================
+    
+    def create_support_ticket(self, user_id: int, subject: str, message: str) -> int:
+        """Create a new support ticket"""
+        # Tickets keep integer ids (the dashboard routes and bot replies use them)
+        sequence = self.sequences.find_one_and_update(
+            {"_id": "support_tickets"},
+            {"$inc": {"value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        now = datetime.now()
+        self.support_tickets.insert_one({
+            "ticket_id": sequence["value"],
+            "user_id": user_id,
+            "subject": subject,
+            "message": message,
+            "status": "open",
+            "admin_reply": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        return sequence["value"]
+    
+    def get_all_tickets(self, status: str = None, after_id: int = None, limit: int = None) -> List[Dict]:
+        """Get support tickets, newest first, optionally filtered by status (paged by ticket_id)"""
+        query, sort = self._keyset(
+            self.support_tickets, {"status": status} if status else {}, "created_at", after_id, id_field="ticket_id"
+        )
+        if query is None:
+            return []
+        pipeline = [{"$match": query}, {"$sort": dict(sort)}] + ([{"$limit": limit}] if limit else []) + [
+            *self._join_user(),
+            {"$project": {"_id": 0, "full_name": 0}}
+        ]
+        return list(self.support_tickets.aggregate(pipeline))
+    
+    def update_ticket_status(self, ticket_id: int, status: str, admin_reply: str = None) -> bool:
+        """Update ticket status and optionally add admin reply"""
+        try:
+            update = {"status": status, "updated_at": datetime.now()}
+            if admin_reply:
+                update["admin_reply"] = admin_reply
+            self.support_tickets.update_one({"ticket_id": int(ticket_id)}, {"$set": update})
+            return True
+        except Exception as e:
+            print(f"Error updating ticket: {e}")
+            return False
+
+    # ==================== BROADCASTS ====================
+    
+    def _broadcast_out(self, doc: Optional[Dict]) -> Optional[Dict]:
+        if doc is None:
+            return None
+        doc.pop("_id", None)
+        doc["pending_count"] = doc["total_count"] - doc["sent_count"] - doc["failed_count"]
+        return doc
+    
+    def create_broadcast(self, message: str, created_by: int = None) -> int:
+        """Queue a broadcast to every user; one pending recipient document per user"""
+        try:
+            # Broadcasts keep integer ids like tickets (dashboard progress URLs use them)
+            sequence = self.sequences.find_one_and_update(
+                {"_id": "broadcasts"},
+                {"$inc": {"value": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            broadcast_id = sequence["value"]
+            # 'creating' until every recipient is written, so the worker never starts on half a list
+            self.broadcasts.insert_one({
+                "broadcast_id": broadcast_id,
+                "message": message,
+                "created_by": created_by,
+                "status": "creating",
+                "total_count": 0,
+                "sent_count": 0,
+                "failed_count": 0,
+                "created_at": datetime.now(),
+                "started_at": None,
+                "finished_at": None
+            })
+            total, batch = 0, []
+            for user in self.users.find({}, {"_id": 0, "user_id": 1}):
+                batch.append({"broadcast_id": broadcast_id, "user_id": user["user_id"], "status": "pending"})
+                if len(batch) == 1000:
+                    self.broadcast_recipients.insert_many(batch, ordered=False)
+                    total, batch = total + len(batch), []
+            if batch:
+                self.broadcast_recipients.insert_many(batch, ordered=False)
+                total += len(batch)
+            self.broadcasts.update_one(
+                {"broadcast_id": broadcast_id},
+                {"$set": {"status": "queued", "total_count": total}}
+            )
+            return broadcast_id
+        except Exception as e:
+            print(f"Error creating broadcast: {e}")
+            return None
+    
+    def get_broadcast(self, broadcast_id: int) -> Optional[Dict]:
+        """Get a broadcast job with its delivery counts"""
+        return self._broadcast_out(self.broadcasts.find_one({"broadcast_id": int(broadcast_id)}))
+    
+    def get_broadcasts(self, limit: int = 20) -> List[Dict]:
+        """Get recent broadcast jobs, newest first"""
+        cursor = self.broadcasts.find({"status": {"$ne": "creating"}}).sort("broadcast_id", DESCENDING).limit(limit)
+        return [self._broadcast_out(doc) for doc in cursor]
+    
+    def get_unfinished_broadcasts(self) -> List[Dict]:
+        """Get queued and running (interrupted) broadcast jobs, oldest first"""
+        cursor = self.broadcasts.find({"status": {"$in": ["queued", "running"]}}).sort("broadcast_id", ASCENDING)
+        return [self._broadcast_out(doc) for doc in cursor]
+    
+    def get_pending_broadcast_recipients(self, broadcast_id: int, after_id: int = None,
+                                         limit: int = None) -> List[int]:
+        """User ids still to be sent a broadcast, in user_id order (paged by user_id)"""
+        query = {"broadcast_id": int(broadcast_id), "status": "pending"}
+        if after_id is not None:
+            query["user_id"] = {"$gt": after_id}
+        cursor = self.broadcast_recipients.find(query, {"_id": 0, "user_id": 1}).sort("user_id", ASCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [doc["user_id"] for doc in cursor]
+    
+    def record_broadcast_results(self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]) -> int:
+        """Mark pending recipients (user_id, 'sent' | 'failed', error) and bump the job's counts
+        
+        Recipients already marked are left alone, so recording a result twice counts it once.
+        """
+        try:
+            now = datetime.now()
+            counts = {"sent": 0, "failed": 0}
+            for status in counts:
+                operations = [
+                    UpdateOne(
+                        {"broadcast_id": int(broadcast_id), "user_id": user_id, "status": "pending"},
+                        {"$set": {"status": status, "error": error, "sent_at": now}}
+                    )
+                    for user_id, result, error in results if result == status
+                ]
+                if operations:
+                    counts[status] = self.broadcast_recipients.bulk_write(operations, ordered=False).modified_count
+            self.broadcasts.update_one(
+                {"broadcast_id": int(broadcast_id)},
+                {"$inc": {"sent_count": counts["sent"], "failed_count": counts["failed"]}}
+            )
+            return counts["sent"] + counts["failed"]
+        except Exception as e:
+            print(f"Error recording broadcast results: {e}")
+            return 0
+    
+    def update_broadcast_status(self, broadcast_id: int, status: str) -> bool:
+        """Move a broadcast to running, completed or cancelled; finished jobs stay finished"""
+        try:
+            job = {"broadcast_id": int(broadcast_id), "status": {"$nin": ["completed", "cancelled"]}}
+            update = {"status": status}
+            if status in ("completed", "cancelled"):
+                update["finished_at"] = datetime.now()
+            result = self.broadcasts.update_one(job, {"$set": update})
+            if status == "running":
+                self.broadcasts.update_one({**job, "started_at": None}, {"$set": {"started_at": datetime.now()}})
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"Error updating broadcast: {e}")
+            return False
 
 # Global database instance
 db = MongoDatabase()
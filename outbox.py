@@ -0,0 +1,310 @@
+"""
+Outbound message queue for bot-originated sends
+Admin notifications, seller payout notices, ticket replies and payment-failure
+notices are queued here instead of being awaited inside the handler that
+triggered them, so the handler returns as soon as its own reply is sent. Worker
+tasks deliver the queue while keeping to Telegram's flood limits (OUTBOX_GLOBAL_RATE
+across all chats, OUTBOX_CHAT_RATE per private chat, OUTBOX_GROUP_RATE per group)
+with token buckets. On 429 they pause for the retry_after Telegram asks for and
+retry. Messages to one chat are always delivered in the order they were queued.
+A message that cannot be delivered, including one dropped because the queue is
+full, is handed to its on_failure callback.
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+import config
+
+
+class OutboxFull(Exception):
+    """The queue already held OUTBOX_QUEUE_SIZE messages, so this one was dropped"""
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, up to `capacity` back to back"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def wait(self):
+        """Sleep until a token is available, without taking it"""
+        while (wait := self.delay()) > 0:
+            await asyncio.sleep(wait)
+
+    def take(self):
+        """Spend a token (call once one is available)"""
+        self._refill()
+        self.tokens -= 1
+
+    async def acquire(self):
+        await self.wait()
+        # Single event loop: nothing can take the token between wait() and take()
+        self.take()
+
+
+class OutboundMessage:
+    """One queued Bot API send"""
+
+    __slots__ = ('bot', 'method', 'chat_id', 'kwargs', 'on_failure', 'on_sent', 'queued_at', 'attempts')
+
+    def __init__(self, bot, method: str, chat_id: int, kwargs: dict,
+                 on_failure: Optional[Callable[[Exception], Awaitable[None]]],
+                 on_sent: Optional[Callable[[object], Awaitable[None]]] = None):
+        self.bot = bot
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.on_failure = on_failure
+        self.on_sent = on_sent
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+
+class Outbox:
+    """Rate-limited, per-chat ordered delivery of bot-originated messages"""
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None, chat_burst: int = None,
+                 group_rate: float = None, workers: int = None, max_retries: int = None,
+                 max_queued: int = None):
+        self.global_rate = global_rate or config.OUTBOX_GLOBAL_RATE
+        self.chat_rate = chat_rate or config.OUTBOX_CHAT_RATE
+        self.chat_burst = chat_burst or config.OUTBOX_CHAT_BURST
+        self.group_rate = group_rate or config.OUTBOX_GROUP_RATE
+        self.workers = workers or config.OUTBOX_WORKERS
+        self.max_retries = config.OUTBOX_MAX_RETRIES if max_retries is None else max_retries
+        self.max_queued = max_queued or config.OUTBOX_QUEUE_SIZE
+        self._loop = None
+        self._reset()
+
+    def _reset(self):
+        self._tasks = []
+        # on_failure callbacks for dropped messages, running outside any worker
+        self._callbacks = set()
+        # chat_id -> messages waiting for that chat, oldest first
+        self._chats: Dict[int, deque] = {}
+        # Chats with waiting messages that no worker holds; each chat is in here at most once
+        self._ready = asyncio.Queue()
+        self._buckets: Dict[int, TokenBucket] = {}
+        # No burst allowance: Telegram counts messages per second, not per average
+        self._global = TokenBucket(self.global_rate, 1)
+        self._paused_until = 0.0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.queued = 0
+        self.in_flight = 0
+        self.counters = {'sent': 0, 'failed': 0, 'retried': 0, 'rate_limited': 0, 'dropped': 0}
+        self.latencies = deque(maxlen=1000)
+
+    # ==================== ENQUEUE ====================
+
+    def send_message(self, bot, chat_id: int, text: str, on_failure=None, on_sent=None, **kwargs) -> bool:
+        """Queue bot.send_message(chat_id, text, **kwargs); False if the queue is full
+
+        on_failure, if given, is awaited with the exception when the message cannot
+        be delivered, or with OutboxFull when it is dropped; on_sent, if given, with the sent Message once it is.
+        """
+        return self._enqueue(OutboundMessage(bot, 'send_message', chat_id, {'text': text, **kwargs},
+                                             on_failure, on_sent))
+
+    def send_photo(self, bot, chat_id: int, photo, on_failure=None, **kwargs) -> bool:
+        """Queue bot.send_photo(chat_id, photo, **kwargs); False if the queue is full"""
+        return self._enqueue(OutboundMessage(bot, 'send_photo', chat_id, {'photo': photo, **kwargs}, on_failure))
+
+    def notify_admins(self, bot, text: str, **kwargs):
+        """Queue the same message to every admin"""
+        for admin_id in config.ADMIN_IDS:
+            self.send_message(bot, admin_id, text, **kwargs)
+
+    def _enqueue(self, message: OutboundMessage) -> bool:
+        self._ensure_running()
+        if self.queued >= self.max_queued:
+            self.counters['dropped'] += 1
+            error = OutboxFull(f"outbox full ({self.queued} waiting)")
+            print(f"Error queueing message to {message.chat_id}: {error}")
+            if message.on_failure:
+                # Callers rely on on_failure, not the return value, to hear about a lost message
+                task = self._loop.create_task(self._notify_failure(message, error))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+            return False
+        waiting = self._chats.get(message.chat_id)
+        if waiting is None:
+            waiting = self._chats[message.chat_id] = deque()
+            self._ready.put_nowait(message.chat_id)
+        waiting.append(message)
+        self.queued += 1
+        self._idle.clear()
+        return True
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the previous event loop is gone along with its workers
+            self._loop = loop
+            self._reset()
+        if not self._tasks:
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    # ==================== DELIVERY ====================
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 10 * self.max_queued:
+                # Forget chats whose bucket has fully refilled; a new one starts full anyway
+                self._buckets = {cid: b for cid, b in self._buckets.items() if cid in self._chats or not b.is_full()}
+            # Negative ids are groups and channels, which Telegram limits per minute
+            bucket = TokenBucket(self.group_rate, 1) if chat_id < 0 else TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            waiting = self._chats[chat_id]
+            message = waiting[0]
+            self.in_flight += 1
+            try:
+                await self._deliver(message)
+            finally:
+                self.in_flight -= 1
+                waiting.popleft()
+                self.queued -= 1
+                if waiting:
+                    # Back of the line, so one busy chat cannot starve the others
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._chats[chat_id]
+                    if not self._chats:
+                        self._idle.set()
+
+    async def _deliver(self, message: OutboundMessage):
+        bucket = self._bucket(message.chat_id)
+        while True:
+            # Only the worker holding this chat spends its tokens, so the one waited for
+            # is still there after the global wait; both are spent right before sending
+            await bucket.wait()
+            await self._global.acquire()
+            bucket.take()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            message.attempts += 1
+            try:
+                result = await getattr(message.bot, message.method)(chat_id=message.chat_id, **message.kwargs)
+            except RetryAfter as e:
+                # Telegram's flood control: everything waits, as the limit may be bot-wide
+                self.counters['rate_limited'] += 1
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if message.attempts <= self.max_retries:
+                    self.counters['retried'] += 1
+                    continue
+                await self._fail(message, e)
+                return
+            except TimedOut as e:
+                # The message may have been delivered already; retrying could send it twice
+                await self._fail(message, e)
+                return
+            except NetworkError as e:
+                if message.attempts <= self.max_retries and type(e) is NetworkError:
+                    self.counters['retried'] += 1
+                    await asyncio.sleep(message.attempts)
+                    continue
+                await self._fail(message, e)
+                return
+            except Exception as e:
+                await self._fail(message, e)
+                return
+            self.counters['sent'] += 1
+            self.latencies.append(time.monotonic() - message.queued_at)
+            if message.on_sent:
+                try:
+                    await message.on_sent(result)
+                except Exception as e:
+                    print(f"Error in outbox sent callback: {e}")
+            return
+
+    async def _fail(self, message: OutboundMessage, error: Exception):
+        self.counters['failed'] += 1
+        print(f"Error sending {message.method} to {message.chat_id}: {error}")
+        await self._notify_failure(message, error)
+
+    @staticmethod
+    async def _notify_failure(message: OutboundMessage, error: Exception):
+        if message.on_failure:
+            try:
+                await message.on_failure(error)
+            except Exception as e:
+                print(f"Error in outbox failure callback: {e}")
+
+    # ==================== LIFECYCLE & METRICS ====================
+
+    async def drain(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is delivered or failed; False on timeout"""
+        if self._loop is not asyncio.get_running_loop():
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float = 10.0):
+        """Deliver what is queued (up to `timeout` seconds), then stop the workers"""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        if not await self.drain(timeout):
+            print(f"Error stopping outbox: {self.queued} message(s) still queued were dropped")
+        if self._callbacks:
+            await asyncio.gather(*self._callbacks, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Metrics stay readable; the next send starts afresh
+        self._tasks = []
+        self._loop = None
+
+    def stats(self) -> dict:
+        """Queue depth, delivery counters and queued-to-sent latency of recent messages"""
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            'queued': self.queued,
+            'chats_waiting': len(self._chats),
+            'in_flight': self.in_flight,
+            **self.counters,
+            'latency_p50_ms': pct(50),
+            'latency_p95_ms': pct(95),
+            'latency_max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+outbox = Outbox()
@@ -17,7 +17,7 @@ from cashfree_pg.models.pay_order_request import PayOrderRequest
 from cashfree_pg.models.upi_payment_method import UPIPaymentMethod
 from cashfree_pg.models.upi import Upi
 import config
-from mongodb import db
+from async_database import db
 from utils import generate_order_id, format_currency
 
 # Configure Cashfree
@@ -157,7 +157,7 @@ class PaymentManager:
             print(f"DEBUG: Generated Links - Bridge: {payment_link}, Raw: {raw_link}")
             
             # Save transaction
-            txn_id = db.create_transaction(
+            txn_id = await db.create_transaction(
                 user_id=user_id,
                 txn_type='wallet_add',
                 amount=amount,
@@ -231,7 +231,7 @@ class PaymentManager:
                 else:
                      payment_link = f"{config.DASHBOARD_URL.rstrip('/')}/pay/{env_tag}/{payment_session_id}"
                 
-                txn_id = db.create_transaction(
+                txn_id = await db.create_transaction(
                     user_id=user_id, txn_type='wallet_add', amount=amount,
                     cashfree_order_id=order_id, payment_link=payment_link,
                     description=f"Add {format_currency(amount)} via UPI Link ({upi_id})"
@@ -242,7 +242,7 @@ class PaymentManager:
                 }
 
             if pay_response and pay_response.data:
-                txn_id = db.create_transaction(
+                txn_id = await db.create_transaction(
                     user_id=user_id, txn_type='wallet_add', amount=amount,
                     cashfree_order_id=order_id, payment_link="UPI_COLLECT",
                     description=f"Add {format_currency(amount)} via UPI Collect ({upi_id})"
@@ -304,7 +304,7 @@ class PaymentManager:
                 qr_path = f"temp_qrs/qr_{order_id}.png"
                 img.save(qr_path)
                 
-                txn_id = db.create_transaction(
+                txn_id = await db.create_transaction(
                     user_id=user_id, txn_type='wallet_add', amount=amount,
                     cashfree_order_id=order_id, payment_link=qr_payload,
                     description=f"Add {format_currency(amount)} to wallet (Link QR)"
@@ -328,7 +328,7 @@ class PaymentManager:
                 qr_path = f"temp_qrs/qr_{order_id}.png"
                 img.save(qr_path)
                 
-                txn_id = db.create_transaction(
+                txn_id = await db.create_transaction(
                     user_id=user_id, txn_type='wallet_add', amount=amount,
                     cashfree_order_id=order_id, payment_link=qr_payload,
                     description=f"Add {format_currency(amount)} to wallet via QR"
@@ -346,7 +346,8 @@ class PaymentManager:
         """Check payment status from Cashfree"""
         try:
             x_api_version = "2023-08-01"
-            api_response = Cashfree().PGOrderFetchPayments(x_api_version, order_id)
+            # The SDK call blocks; keep it off the event loop
+            api_response = await asyncio.to_thread(Cashfree().PGOrderFetchPayments, x_api_version, order_id)
             
             if api_response and api_response.data and len(api_response.data) > 0:
                 payment = api_response.data[0]
@@ -364,11 +365,14 @@ class PaymentManager:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    async def verify_payment(order_id: str) -> bool:
-        """Verify and process successful payment"""
+    async def verify_payment(order_id: str, status: str = None) -> bool:
+        """Verify and process successful payment
+        
+        status: the order's Cashfree status if the caller just fetched it, to skip fetching it again
+        """
         try:
             # Get transaction from database
-            txn = db.get_transaction_by_order_id(order_id)
+            txn = await db.get_transaction_by_order_id(order_id)
             if not txn:
                 return False
             
@@ -377,14 +381,16 @@ class PaymentManager:
                 return True
             
             # Check payment status
-            result = await PaymentManager.check_payment_status(order_id)
+            if status is None:
+                result = await PaymentManager.check_payment_status(order_id)
+                status = result.get('status') if result.get('success') else None
             
-            if result.get('success') and result.get('status') == 'SUCCESS':
+            if status == 'SUCCESS':
                 # Update wallet
-                db.update_wallet(txn['user_id'], txn['amount'])
+                await db.update_wallet(txn['user_id'], txn['amount'])
                 
                 # Update transaction status
-                db.update_transaction_status(txn['txn_id'], 'success')
+                await db.update_transaction_status(txn['txn_id'], 'success')
                 
                 return True
             
@@ -398,9 +404,9 @@ class PaymentManager:
     async def cancel_payment(order_id: str) -> bool:
         """Cancel pending payment"""
         try:
-            txn = db.get_transaction_by_order_id(order_id)
+            txn = await db.get_transaction_by_order_id(order_id)
             if txn and txn['status'] == 'pending':
-                db.update_transaction_status(txn['txn_id'], 'cancelled')
+                await db.update_transaction_status(txn['txn_id'], 'cancelled')
                 return True
             return False
         except Exception as e:
@@ -409,26 +415,24 @@ class PaymentManager:
     
     @staticmethod
     async def monitor_payment(order_id: str, timeout: int = None) -> str:
-        """Monitor payment status with timeout"""
-        timeout = timeout or config.PAYMENT_TIMEOUT
-        start_time = datetime.now()
+        """Wait until an order is paid, fails or times out ('SUCCESS', 'FAILED', 'TIMEOUT' or 'CANCELLED')"""
+        # Checked by the shared scheduler rather than a polling loop of its own
+        from payment_scheduler import payment_scheduler
+        outcome = asyncio.get_running_loop().create_future()
         
-        while (datetime.now() - start_time).seconds < timeout:
-            result = await PaymentManager.check_payment_status(order_id)
-            
-            if result.get('success'):
-                status = result.get('status')
-                if status in ['SUCCESS', 'FAILED']:
-                    return status
-            
-            # Check every 5 seconds
-            await asyncio.sleep(5)
+        async def settle(status: str):
+            if not outcome.done():
+                outcome.set_result(status)
         
-        # Timeout - mark as failed
-        txn = db.get_transaction_by_order_id(order_id)
-        if txn and txn['status'] == 'pending':
-            db.update_transaction_status(txn['txn_id'], 'failed')
+        payment_scheduler.watch(order_id, settle, timeout=timeout)
+        status = await outcome
+        
+        if status == 'TIMEOUT':
+            # Timeout - mark as failed
+            txn = await db.get_transaction_by_order_id(order_id)
+            if txn and txn['status'] == 'pending':
+                await db.update_transaction_status(txn['txn_id'], 'failed')
         
-        return 'TIMEOUT'
+        return status
 
 payment_manager = PaymentManager()
@@ -0,0 +1,208 @@
+"""
+Payment status scheduler for pending wallet top-ups
+Each order waiting for payment used to get its own task that asked Cashfree for
+its status every 5 seconds until PAYMENT_TIMEOUT, about 180 calls per abandoned
+checkout. PaymentScheduler keeps every watched order in one priority queue,
+ordered by when its next check is due. The first check comes PAYMENT_POLL_INITIAL
+seconds after the order is created. Each later gap is PAYMENT_POLL_BACKOFF times
+longer, up to PAYMENT_POLL_MAX, and a last check runs at the deadline. At most
+PAYMENT_POLL_CONCURRENCY Cashfree calls run at once, and an order is never
+checked twice at the same time. Orders already settled or cancelled in the
+database are dropped without asking Cashfree. Each callback watching an order is
+awaited exactly once, with 'SUCCESS', 'FAILED', 'TIMEOUT' or 'CANCELLED'.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import config
+from async_database import db
+from payment import payment_manager
+
+
+class WatchedOrder:
+    """One pending order and when it is next checked"""
+
+    __slots__ = ('order_id', 'callbacks', 'deadline', 'due', 'checks', 'checking')
+
+    def __init__(self, order_id: str, on_result: Callable[[str], Awaitable[None]], deadline: float):
+        self.order_id = order_id
+        self.callbacks = [on_result]
+        self.deadline = deadline
+        self.due = 0.0
+        self.checks = 0
+        self.checking = False
+
+
+class PaymentScheduler:
+    """Polls Cashfree for all pending orders from a single task"""
+
+    def __init__(self, initial: float = None, backoff: float = None, max_interval: float = None,
+                 concurrency: int = None, timeout: float = None):
+        self.initial = initial or config.PAYMENT_POLL_INITIAL
+        self.backoff = backoff or config.PAYMENT_POLL_BACKOFF
+        self.max_interval = max_interval or config.PAYMENT_POLL_MAX
+        self.concurrency = concurrency or config.PAYMENT_POLL_CONCURRENCY
+        self.timeout = timeout or config.PAYMENT_TIMEOUT
+        self._loop = None
+        self._reset()
+
+    def _reset(self):
+        self._task = None
+        self._orders: Dict[str, WatchedOrder] = {}
+        # (due, tiebreak, order_id); entries whose due no longer matches the order are stale
+        self._heap = []
+        self._sequence = itertools.count()
+        self._checks = set()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._wake = asyncio.Event()
+        self.in_flight = 0
+        self.counters = {'watched': 0, 'coalesced': 0, 'checks': 0, 'gateway_calls': 0,
+                         'success': 0, 'failed': 0, 'timeout': 0, 'cancelled': 0}
+
+    # ==================== WATCH ====================
+
+    def watch(self, order_id: str, on_result: Callable[[str], Awaitable[None]], timeout: float = None) -> bool:
+        """Check order_id until it is paid, fails or times out; on_result is awaited with the outcome
+
+        Watching an order that is already watched shares its checks: on_result is
+        added to the order's callbacks and False is returned.
+        """
+        self._ensure_running()
+        if order_id in self._orders:
+            self._orders[order_id].callbacks.append(on_result)
+            self.counters['coalesced'] += 1
+            return False
+        now = time.monotonic()
+        order = WatchedOrder(order_id, on_result, now + (timeout or self.timeout))
+        self._orders[order_id] = order
+        self.counters['watched'] += 1
+        self._schedule(order, now + self.initial)
+        return True
+
+    def discard(self, order_id: str) -> bool:
+        """Stop checking order_id (the user cancelled it); its callbacks get 'CANCELLED'"""
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return False
+        self._spawn(self._dispatch(order, 'CANCELLED'))
+        return True
+
+    def is_watching(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the previous event loop is gone along with its task
+            self._loop = loop
+            self._reset()
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+
+    def _schedule(self, order: WatchedOrder, due: float):
+        order.due = min(due, order.deadline)
+        heapq.heappush(self._heap, (order.due, next(self._sequence), order.order_id))
+        self._wake.set()
+
+    def _spawn(self, coroutine):
+        task = self._loop.create_task(coroutine)
+        self._checks.add(task)
+        task.add_done_callback(self._checks.discard)
+
+    # ==================== CHECKS ====================
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            if not self._heap:
+                await self._wake.wait()
+                continue
+            due, _, order_id = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    # An earlier order may be scheduled meanwhile
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            order = self._orders.get(order_id)
+            if order is None or order.due != due or order.checking:
+                continue
+            order.checking = True
+            # Waiting for a slot here keeps checks in due order when Cashfree is slow
+            await self._slots.acquire()
+            self._spawn(self._check(order))
+
+    async def _check(self, order: WatchedOrder):
+        self.in_flight += 1
+        try:
+            status = await self._fetch_status(order) if self._orders.get(order.order_id) is order else None
+        except Exception as e:
+            print(f"Error checking payment {order.order_id}: {e}")
+            status = None
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            order.checking = False
+        order.checks += 1
+        self.counters['checks'] += 1
+
+        if self._orders.get(order.order_id) is not order:
+            return  # Discarded while the check was running
+        if status is None and time.monotonic() >= order.deadline:
+            status = 'TIMEOUT'
+        if status is None:
+            gap = min(self.max_interval, self.initial * self.backoff ** order.checks)
+            self._schedule(order, time.monotonic() + gap)
+            return
+        del self._orders[order.order_id]
+        await self._dispatch(order, status)
+
+    async def _fetch_status(self, order: WatchedOrder) -> Optional[str]:
+        """'SUCCESS', 'FAILED' or 'CANCELLED' once settled, None while still pending"""
+        txn = await db.get_transaction_by_order_id(order.order_id)
+        if txn is None or txn['status'] in ('cancelled', 'failed'):
+            return 'CANCELLED'
+        if txn['status'] == 'success':
+            return 'SUCCESS'
+        self.counters['gateway_calls'] += 1
+        result = await payment_manager.check_payment_status(order.order_id)
+        if result.get('success') and result.get('status') in ('SUCCESS', 'FAILED'):
+            return result['status']
+        return None
+
+    async def _dispatch(self, order: WatchedOrder, status: str):
+        self.counters[status.lower()] += 1
+        for on_result in order.callbacks:
+            try:
+                await on_result(status)
+            except Exception as e:
+                print(f"Error handling payment {order.order_id} ({status}): {e}")
+
+    # ==================== LIFECYCLE & METRICS ====================
+
+    async def stop(self):
+        """Stop checking; orders still pending get no result"""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        tasks = [self._task, *self._checks] if self._task else list(self._checks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Metrics stay readable; the next watch starts afresh
+        self._orders.clear()
+        self._heap.clear()
+        self._task = None
+        self._loop = None
+
+    def stats(self) -> dict:
+        """Orders being watched, checks in flight and outcome counters"""
+        return {'watching': len(self._orders), 'in_flight': self.in_flight, **self.counters}
+
+
+payment_scheduler = PaymentScheduler()
@@ -0,0 +1,167 @@
+"""
+Callback query routing for the bot
+Inline buttons carry callback_data like "admin_dashboard", "approve_batch_<id>"
+or "ticket_reply_<ticket id>_<user id>". Routes are declared with Flask-style
+patterns by the modules that own the handlers (BuyerHandler, SellerHandler,
+AdminHandler and bot.py). Constant callback_data is looked up in a dict and
+parameterised callback_data by walking a prefix trie. Both cost the same however
+many routes exist, and placeholders come back converted to their declared type.
+Every dispatch is timed per route.
+"""
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+CONVERTERS = {'str': str, 'int': int}
+PLACEHOLDER = re.compile(r'<(?:(\w+):)?(\w+)>')
+
+
+class Route:
+    """One callback_data pattern, its handler and its timing stats"""
+
+    def __init__(self, pattern: str, handler: Callable[..., Awaitable[Any]], name: str = None,
+                 defaults: dict = None, on_timing: Callable[['Route', float], None] = None):
+        self.pattern = pattern
+        self.handler = handler
+        self.name = name or pattern
+        self.defaults = defaults or {}
+        self.on_timing = on_timing
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+        # "ticket_reply_<int:ticket_id>_<int:user_id>" -> prefix "ticket_reply_",
+        # params [("ticket_id", int, "_"), ("user_id", int, "")]
+        pieces = PLACEHOLDER.split(pattern)
+        self.prefix = pieces[0]
+        self.params: List[Tuple[str, Callable, str]] = []
+        for i in range(1, len(pieces), 3):
+            converter, param, separator = pieces[i] or 'str', pieces[i + 1], pieces[i + 2]
+            if converter not in CONVERTERS:
+                raise ValueError(f"Unknown converter '{converter}' in route {pattern}")
+            if not separator and i + 3 < len(pieces):
+                raise ValueError(f"Placeholders need a separator between them in route {pattern}")
+            self.params.append((param, CONVERTERS[converter], separator))
+
+    def match(self, data: str) -> Optional[dict]:
+        """Typed arguments for data (which starts with self.prefix), or None if it does not fit"""
+        rest = data[len(self.prefix):]
+        kwargs = {}
+        for i, (param, converter, separator) in enumerate(self.params):
+            if i == len(self.params) - 1:
+                # The last placeholder takes the rest, so ids may contain the separator
+                if separator:
+                    if not rest.endswith(separator):
+                        return None
+                    rest = rest[:-len(separator)]
+                raw, rest = rest, ''
+            else:
+                raw, found, rest = rest.partition(separator)
+                if not found:
+                    return None
+            if not raw:
+                return None
+            try:
+                value = converter(raw)
+            except ValueError:
+                return None
+            # Placeholders named _<something> must match but are not passed on
+            if not param.startswith('_'):
+                kwargs[param] = value
+        return kwargs
+
+    def record(self, seconds: float, failed: bool = False):
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def stats(self) -> dict:
+        return {
+            'route': self.name,
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'total_ms': self.total * 1000,
+        }
+
+
+class CallbackRouter:
+    """Maps callback_data to handlers: exact matches by dict, parameterised ones by prefix trie"""
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        # Character trie over route prefixes; the None key holds the routes ending at a node
+        self._trie: dict = {}
+        self.routes: List[Route] = []
+        # Called with (route, seconds) after every dispatch, on top of each route's own hook
+        self.timing_hooks: List[Callable[[Route, float], None]] = []
+
+    def add(self, pattern: str, handler: Callable[..., Awaitable[Any]], name: str = None,
+            defaults: dict = None, on_timing: Callable[[Route, float], None] = None) -> Route:
+        """Register handler(update, context, **params, **defaults) for a callback_data pattern
+
+        Placeholders follow Flask: <batch_id> is a string, <int:user_id> an int.
+        """
+        route = Route(pattern, handler, name, defaults, on_timing)
+        if not route.params:
+            if pattern in self._exact:
+                raise ValueError(f"Duplicate callback route {pattern}")
+            self._exact[pattern] = route
+        else:
+            node = self._trie
+            for char in route.prefix:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(route)
+        self.routes.append(route)
+        return route
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], dict]:
+        """Route and typed arguments for callback_data; (None, {}) when nothing matches"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+
+        # Collect routes along the path, then try the longest (most specific) prefix first
+        candidates = []
+        node = self._trie
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                candidates.append(node[None])
+        for routes in reversed(candidates):
+            for route in routes:
+                kwargs = route.match(data)
+                if kwargs is not None:
+                    return route, kwargs
+        return None, {}
+
+    async def dispatch(self, update, context) -> bool:
+        """Run the handler for update.callback_query.data; False when no route matches"""
+        route, kwargs = self.resolve(update.callback_query.data or '')
+        if route is None:
+            return False
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            await route.handler(update, context, **kwargs, **route.defaults)
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            route.record(elapsed, failed)
+            for hook in ([route.on_timing] if route.on_timing else []) + self.timing_hooks:
+                try:
+                    hook(route, elapsed)
+                except Exception as e:
+                    print(f"Error in route timing hook: {e}")
+        return True
+
+    def stats(self) -> List[dict]:
+        """Per-route latency, busiest routes first"""
+        return sorted((route.stats() for route in self.routes if route.count),
+                      key=lambda row: row['total_ms'], reverse=True)
@@ -3,7 +3,10 @@ import threading
 import signal
 import sys
 from dashboard import app
+from broadcast import broadcast_worker
 from bot import create_bot_application
+from webhook import WebhookIngress, serve_webhook
+import config
 from telegram import Update
 import logging
 import asyncio
@@ -21,21 +24,51 @@ def run_flask():
     # Use threaded=True for handling concurrent requests
     app.run(host='0.0.0.0', port=port, threaded=True)
 
-def main():
-    """Run both Bot and Web Dashboard"""
+def run_webhook(bot_app):
+    """Serve Telegram updates from the dashboard's HTTP server (BOT_MODE=webhook)"""
+    ingress = WebhookIngress(bot_app)
+    # Routes must exist before Flask starts serving
+    ingress.register(app)
     
-    # 1. Start Flask in a separate thread
     flask_thread = threading.Thread(target=run_flask)
     flask_thread.daemon = True
     flask_thread.start()
-    logger.info("Web Dashboard started in background thread")
+    logger.info("Web Dashboard and webhook endpoint started in background thread")
+    
+    async def serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+        await serve_webhook(bot_app, ingress, stop)
+    
+    logger.info(f"Receiving updates via webhook at {config.WEBHOOK_PATH}")
+    asyncio.run(serve())
+
+def main():
+    """Run both Bot and Web Dashboard"""
     
-    # 2. Start Bot in main thread (required for proper signal handling)
     try:
         bot_app = create_bot_application()
         logger.info("Bot application created")
         
-        # Run polling (this is blocking)
+        # Dashboard broadcasts run in their own thread; unfinished ones resume here
+        broadcast_worker.start()
+        
+        if config.BOT_MODE == 'webhook':
+            run_webhook(bot_app)
+            return
+        
+        # 1. Start Flask in a separate thread
+        flask_thread = threading.Thread(target=run_flask)
+        flask_thread.daemon = True
+        flask_thread.start()
+        logger.info("Web Dashboard started in background thread")
+        
+        # 2. Run polling in main thread (required for proper signal handling; this is blocking)
         logger.info("Starting bot polling...")
         bot_app.run_polling(allowed_updates=Update.ALL_TYPES)
         
@@ -3,7 +3,8 @@ Seller Module - Handle seller operations
 """
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from async_database import db
+from outbox import outbox
 from utils import (
     parse_gmail_list, generate_batch_id, format_currency,
     build_seller_wizard_keyboard, build_withdrawal_keyboard
@@ -16,7 +17,7 @@ class SellerHandler:
     @staticmethod
     async def check_seller_status(user_id: int) -> dict:
         """Check if user is registered as seller"""
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         return seller if seller else None
     
     @staticmethod
@@ -30,32 +31,28 @@ class SellerHandler:
         is_new_seller = False
         if not seller:
             # Auto-register as approved seller
-            success = db.create_seller(user_id, upi_qr_path="pending")
+            success = await db.create_seller(user_id, upi_qr_path="pending")
             if success:
                 # Auto-approve the seller immediately
-                seller_record = db.get_seller(user_id)
+                seller_record = await db.get_seller(user_id)
                 if seller_record:
                     # Use first admin ID from config for auto-approval
                     admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else user_id
-                    db.approve_seller(seller_record['seller_id'], admin_id, approved=True)
+                    await db.approve_seller(seller_record['seller_id'], admin_id, approved=True)
                     is_new_seller = True
                     
                     # Notify admins about new seller
                     username = update.effective_user.username or "No username"
                     full_name = update.effective_user.full_name or "No name"
-                    for admin_id in config.ADMIN_IDS:
-                        try:
-                            await context.bot.send_message(
-                                admin_id,
-                                f"👤 **New Seller Joined!**\n\n"
-                                f"🆔 User ID: `{user_id}`\n"
-                                f"👤 Username: @{username}\n"
-                                f"📛 Name: {full_name}\n\n"
-                                f"User registered as seller.",
-                                parse_mode='Markdown'
-                            )
-                        except:
-                            pass
+                    outbox.notify_admins(
+                        context.bot,
+                        f"👤 **New Seller Joined!**\n\n"
+                        f"🆔 User ID: `{user_id}`\n"
+                        f"👤 Username: @{username}\n"
+                        f"📛 Name: {full_name}\n\n"
+                        f"User registered as seller.",
+                        parse_mode='Markdown'
+                    )
         
         # Show registration confirmation for new sellers
         registration_msg = "✅ **Registered as seller!**\n\n" if is_new_seller else ""
@@ -195,15 +192,15 @@ class SellerHandler:
             return
         
         # Check if already a seller
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         
         if not seller:
             # Create seller account
-            success = db.create_seller(user_id, upi_qr_path)
+            success = await db.create_seller(user_id, upi_qr_path)
             if not success:
                 await query.edit_message_text("❌ Error creating seller account. Please try again.")
                 return
-            seller = db.get_seller(user_id)
+            seller = await db.get_seller(user_id)
         
         # Validate Gmail credentials
         from utils import check_gmail_credentials
@@ -267,23 +264,30 @@ class SellerHandler:
             return
         
         # Check if already a seller
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         
         if not seller:
             # Create seller account with UPI QR
-            success = db.create_seller(user_id, upi_qr_path)
+            success = await db.create_seller(user_id, upi_qr_path)
             if not success:
                 await update.message.reply_text("❌ Error creating seller account. Please try again.")
                 return
-            seller = db.get_seller(user_id)
+            seller = await db.get_seller(user_id)
         
         # Add valid Gmails to database
-        success = db.add_gmails(seller['seller_id'], valid_gmails, batch_id)
+        result = await db.ingest_gmails(seller['seller_id'], valid_gmails, batch_id)
         
-        if success:
+        if result.get('success') and not result['inserted']:
+            await update.message.reply_text("❌ All submitted Gmails are already listed on the marketplace.")
+            context.user_data.clear()
+        elif result.get('success'):
+            submitted = result['inserted']
+            if result['duplicates']:
+                validation_msg += f"\n♻️ Duplicates: {result['duplicates']} (already listed, skipped)"
+            
             await update.message.reply_text(
                 "✅ **Submission Successful!**\n\n"
-                f"📧 {len(valid_gmails)} Gmails submitted for approval\n"
+                f"📧 {submitted} Gmails submitted for approval\n"
                 f"🆔 Batch ID: `{batch_id}`\n"
                 f"{validation_msg}\n\n"
                 "⏳ Your submission is pending admin approval.\n"
@@ -295,7 +299,7 @@ class SellerHandler:
             context.user_data.clear()
             
             # Notify admins
-            await SellerHandler.notify_admins_new_submission(context, user_id, len(valid_gmails), batch_id)
+            await SellerHandler.notify_admins_new_submission(context, user_id, submitted, batch_id)
         else:
             await update.message.reply_text("❌ Error submitting Gmails. Please try again.")
 
@@ -304,7 +308,7 @@ class SellerHandler:
     async def notify_admins_new_submission(context: ContextTypes.DEFAULT_TYPE, 
                                           user_id: int, count: int, batch_id: str):
         """Notify admins of new seller submission"""
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         username = user.get('username', str(user_id)) if user else str(user_id)
         
         message = (
@@ -315,18 +319,14 @@ class SellerHandler:
             f"Review in Admin Panel ⚙️"
         )
         
-        for admin_id in config.ADMIN_IDS:
-            try:
-                await context.bot.send_message(admin_id, message, parse_mode='Markdown')
-            except:
-                pass
+        outbox.notify_admins(context.bot, message, parse_mode='Markdown')
     
     @staticmethod
     async def show_sales_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show seller sales statistics"""
         user_id = update.effective_user.id
         
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         if not seller:
             await update.callback_query.edit_message_text(
                 "❌ You're not registered as a seller yet.\n"
@@ -334,7 +334,7 @@ class SellerHandler:
             )
             return
         
-        stats = db.get_seller_sales(seller['seller_id'])
+        stats = await db.get_seller_sales(seller['seller_id'])
         
         message = (
             "📊 **My Sales Statistics**\n\n"
@@ -357,7 +357,7 @@ class SellerHandler:
         query = update.callback_query
         await query.answer()
         
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         if not seller or seller['total_earnings'] <= 0:
             await query.edit_message_text("❌ No earnings available for withdrawal.")
             return
@@ -378,7 +378,7 @@ class SellerHandler:
             await update.message.reply_text("❌ Please send a valid QR code image.")
             return
         
-        seller = db.get_seller(user_id)
+        seller = await db.get_seller(user_id)
         if not seller:
             return
         
@@ -389,7 +389,7 @@ class SellerHandler:
         await file.download_to_drive(file_path)
         
         # Create withdrawal request
-        withdrawal_id = db.create_withdrawal(
+        withdrawal_id = await db.create_withdrawal(
             seller['seller_id'],
             user_id,
             seller['total_earnings'],
@@ -405,19 +405,30 @@ class SellerHandler:
             )
             
             # Notify admins
-            for admin_id in config.ADMIN_IDS:
-                try:
-                    await context.bot.send_message(
-                        admin_id,
-                        f"🔔 **New Withdrawal Request**\n\n"
-                        f"👤 Seller: {seller['user_id']}\n"
-                        f"💰 Amount: {format_currency(seller['total_earnings'])}\n"
-                        f"Review in Admin Panel ⚙️",
-                        parse_mode='Markdown'
-                    )
-                except:
-                    pass
+            outbox.notify_admins(
+                context.bot,
+                f"🔔 **New Withdrawal Request**\n\n"
+                f"👤 Seller: {seller['user_id']}\n"
+                f"💰 Amount: {format_currency(seller['total_earnings'])}\n"
+                f"Review in Admin Panel ⚙️",
+                parse_mode='Markdown'
+            )
         else:
             await update.message.reply_text("❌ Error submitting withdrawal request.")
 
+    @staticmethod
+    async def restart_selling(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Go back to the first step of the selling flow"""
+        context.user_data['seller_step'] = 1
+        await SellerHandler.start_selling(update, context)
+
+    @staticmethod
+    def register_routes(router):
+        """Add the selling flow's callback routes to a CallbackRouter"""
+        router.add("seller_step1", SellerHandler.restart_selling)
+        router.add("seller_submit", SellerHandler.submit_for_approval)
+        router.add("activity_sales", SellerHandler.show_sales_stats)
+        router.add("activity_withdrawals", SellerHandler.request_withdrawal)
+        router.add("withdrawal_request", SellerHandler.request_withdrawal)
+
 seller_handler = SellerHandler()
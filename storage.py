@@ -0,0 +1,139 @@
+"""
+Storage backend selection for the bot, payments and dashboard
+STORAGE_BACKEND picks SQLite (database.Database) or MongoDB
+(mongodb.MongoDatabase). Only the configured module is imported, and only on
+first use, so a SQLite deployment never opens a MongoClient. Every module
+goes through `db` here and sees the same data.
+"""
+import importlib
+import threading
+from typing import Dict, List, Optional, Protocol, Tuple, Union, runtime_checkable
+import config
+
+# SQLite ids are integers; MongoDB ids are ObjectId strings
+RecordId = Union[int, str]
+
+# STORAGE_BACKEND value -> (module, global instance in it)
+BACKENDS = {
+    'sqlite': ('database', 'db'),
+    'mongodb': ('mongodb', 'db'),
+}
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """Data-access methods every backend implements"""
+
+    # ==================== USER OPERATIONS ====================
+
+    def create_user(self, user_id: int, username: str, full_name: str) -> bool: ...
+    def get_user(self, user_id: int) -> Optional[Dict]: ...
+    def get_all_users(self, after_id: int = None, limit: int = None) -> List[Dict]: ...
+    def update_wallet(self, user_id: int, amount: float) -> bool: ...
+    def get_wallet_balance(self, user_id: int) -> float: ...
+    def ban_user(self, user_id: int, banned: bool = True) -> bool: ...
+    def get_users_with_stats(self, after_id: int = None, limit: int = None) -> List[Dict]: ...
+    def get_user_detail(self, user_id: int) -> Optional[Dict]: ...
+
+    # ==================== SELLER OPERATIONS ====================
+
+    def create_seller(self, user_id: int, upi_qr_path: str) -> bool: ...
+    def get_seller(self, user_id: int) -> Optional[Dict]: ...
+    def get_seller_by_id(self, seller_id: RecordId) -> Optional[Dict]: ...
+    def approve_seller(self, seller_id: RecordId, admin_id: int, approved: bool = True) -> bool: ...
+    def get_pending_sellers(self) -> List[Dict]: ...
+    def get_all_sellers_with_stats(self, after_id: RecordId = None, limit: int = None) -> List[Dict]: ...
+    def update_seller_earnings(self, seller_id: RecordId, amount: float) -> bool: ...
+    def get_seller_sales(self, seller_id: RecordId) -> Dict: ...
+    def get_seller_gmail_batches(self, seller_id: RecordId) -> List[Dict]: ...
+    def get_sold_gmails_by_seller(self, seller_id: RecordId) -> List[Dict]: ...
+    def get_sellers_awaiting_payment(self) -> List[Dict]: ...
+    def mark_seller_gmails_as_paid(self, user_id: int) -> int: ...
+
+    # ==================== GMAIL OPERATIONS ====================
+
+    def add_gmails(self, seller_id: RecordId, gmails: List[Tuple[str, str]], batch_id: str) -> bool: ...
+    def ingest_gmails(self, seller_id: RecordId, gmails: List[Tuple[str, str]], batch_id: str,
+                      chunk_size: int = None) -> Dict: ...
+    def approve_gmail_batch(self, batch_id: str, approved: bool = True) -> bool: ...
+    def get_pending_gmail_batches(self) -> List[Dict]: ...
+    def get_available_gmails_count(self) -> int: ...
+    def get_inventory_counts(self, seller_id: RecordId = None) -> Dict[str, int]: ...
+    def purchase_gmails(self, buyer_id: int, quantity: int) -> List[Dict]: ...
+    def checkout(self, buyer_id: int, quantity: int, price: float, seller_rate: float = None) -> Dict: ...
+    def get_user_purchases(self, user_id: int) -> List[Dict]: ...
+    def get_all_purchases(self, after_id: RecordId = None, limit: int = None) -> List[Dict]: ...
+    def get_all_gmails(self, after_id: RecordId = None, limit: int = None) -> List[Dict]: ...
+
+    # ==================== TRANSACTION OPERATIONS ====================
+
+    def create_transaction(self, user_id: int, txn_type: str, amount: float,
+                           cashfree_order_id: str = None, payment_link: str = None,
+                           description: str = None) -> RecordId: ...
+    def update_transaction_status(self, txn_id: RecordId, status: str) -> bool: ...
+    def get_transaction_by_order_id(self, order_id: str) -> Optional[Dict]: ...
+    def get_user_transactions(self, user_id: int, limit: int = 10) -> List[Dict]: ...
+    def get_all_transactions(self, after_id: RecordId = None, limit: int = None) -> List[Dict]: ...
+
+    # ==================== WITHDRAWAL OPERATIONS ====================
+
+    def create_withdrawal(self, seller_id: RecordId, user_id: int, amount: float, upi_qr_path: str) -> RecordId: ...
+    def get_pending_withdrawals(self, after_id: RecordId = None, limit: int = None) -> List[Dict]: ...
+    def get_pending_withdrawals_with_sales(self) -> List[Dict]: ...
+    def process_withdrawal(self, withdrawal_id: RecordId, admin_id: int, approved: bool = True) -> bool: ...
+
+    # ==================== STATISTICS ====================
+
+    def get_stats(self, fresh: bool = False) -> Dict: ...
+    def invalidate_stats(self): ...
+    def get_time_based_analytics(self) -> Dict: ...
+    def rebuild_revenue_daily(self) -> int: ...
+
+    # ==================== SUPPORT ====================
+
+    def save_support_message(self, user_id: int, message: str) -> bool: ...
+    def get_support_messages(self, unread_only: bool = True, after_id: RecordId = None,
+                             limit: int = None) -> List[Dict]: ...
+    def create_support_ticket(self, user_id: int, subject: str, message: str) -> int: ...
+    def get_all_tickets(self, status: str = None, after_id: int = None, limit: int = None) -> List[Dict]: ...
+    def update_ticket_status(self, ticket_id: int, status: str, admin_reply: str = None) -> bool: ...
+
+    # ==================== BROADCASTS ====================
+
+    def create_broadcast(self, message: str, created_by: int = None) -> int: ...
+    def get_broadcast(self, broadcast_id: int) -> Optional[Dict]: ...
+    def get_broadcasts(self, limit: int = 20) -> List[Dict]: ...
+    def get_unfinished_broadcasts(self) -> List[Dict]: ...
+    def get_pending_broadcast_recipients(self, broadcast_id: int, after_id: int = None,
+                                         limit: int = None) -> List[int]: ...
+    def record_broadcast_results(self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]) -> int: ...
+    def update_broadcast_status(self, broadcast_id: int, status: str) -> bool: ...
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """Import and return the configured backend, building it on the first call"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if config.STORAGE_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown STORAGE_BACKEND {config.STORAGE_BACKEND!r} "
+                                     f"(expected one of: {', '.join(BACKENDS)})")
+                module_name, attr = BACKENDS[config.STORAGE_BACKEND]
+                _backend = getattr(importlib.import_module(module_name), attr)
+    return _backend
+
+
+class LazyBackend:
+    """Stand-in for the configured backend that connects on first attribute access"""
+
+    def __getattr__(self, name):
+        return getattr(get_backend(), name)
+
+
+# Shared handle used by every module
+db = LazyBackend()
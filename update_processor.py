@@ -0,0 +1,76 @@
+"""
+Concurrent update processing for the bot Application, ordered per user
+Handlers for different users run side by side (up to BOT_CONCURRENT_UPDATES at
+once), so one user waiting on Cashfree or a slow query no longer stalls the
+rest. Updates from the same user still run strictly one after another, in
+arrival order: context.user_data drives the seller, withdrawal, ticket and
+custom-amount flows in handle_message, and those must never interleave.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import config
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to `concurrency` updates at once, never two from the same user"""
+
+    def __init__(self, concurrency: int = None, max_pending: int = None):
+        concurrency = concurrency or config.BOT_CONCURRENT_UPDATES
+        # PTB's semaphore caps updates past it, including ones queued behind the same
+        # user; handlers actually running are bounded by _running below, which is only
+        # taken once the user's turn comes, so a busy user cannot hold slots other
+        # users could use. Neither bounds memory: PTB starts a task per update as soon
+        # as it leaves update_queue and the semaphore is taken inside that task. The
+        # webhook bounds the backlog with `finished` (see WebhookIngress.backlog).
+        super().__init__(max(max_pending or config.BOT_MAX_PENDING_UPDATES, concurrency))
+        self.concurrency = concurrency
+        self._running = asyncio.Semaphore(concurrency)
+        # user/chat id -> [lock, number of updates holding or waiting for it]
+        self._users: Dict[int, list] = {}
+        # Updates taken off update_queue and done with, however they ended
+        self.finished = 0
+
+    @staticmethod
+    def ordering_key(update: object) -> Optional[int]:
+        """Id whose updates must run in order (user, else chat); None for unordered updates"""
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.finished += 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.ordering_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        # Registered before the first await, so arrival order is the lock's (FIFO) order
+        entry = self._users.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._users[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,165 @@
+"""
+Webhook ingestion for the bot, served by the dashboard's Flask app
+Telegram POSTs each update to WEBHOOK_PATH. The Flask thread checks the secret
+token, drops update_ids it has already accepted and hands the update to the
+bot's event loop, where it joins the Application's update queue. With
+concurrent updates PTB empties that queue at once, starting a task per update,
+so admission counts every update accepted and not yet finished (queued, waiting
+for its user's turn or running). When that backlog reaches WEBHOOK_QUEUE_SIZE
+the endpoint answers 503 and Telegram retries later, so a burst waits at
+Telegram instead of piling up in memory.
+"""
+import asyncio
+import hmac
+import logging
+from collections import Counter, deque
+
+from flask import jsonify, request
+from telegram import Update
+
+import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class UpdateDeduper:
+    """Remembers the last `size` update_ids so redelivered updates are dropped"""
+
+    def __init__(self, size: int):
+        self._order = deque()
+        self._seen = set()
+        self.size = size
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._seen
+
+    def add(self, update_id: int):
+        self._order.append(update_id)
+        self._seen.add(update_id)
+        if len(self._order) > self.size:
+            self._seen.discard(self._order.popleft())
+
+
+class WebhookIngress:
+    """Hands webhook POSTs from the dashboard's threads to the bot's event loop"""
+
+    def __init__(self, application, secret: str = None, dedupe_window: int = None, timeout: float = 5.0,
+                 max_backlog: int = None):
+        self.application = application
+        self.secret = secret if secret is not None else config.WEBHOOK_SECRET
+        self.deduper = UpdateDeduper(dedupe_window or config.WEBHOOK_DEDUPE_WINDOW)
+        self.timeout = timeout
+        self.max_backlog = max_backlog or config.WEBHOOK_QUEUE_SIZE
+        self.loop = None
+        self.stats = Counter()
+        # Updates put on update_queue; compared with the processor's `finished`
+        self.accepted = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Start accepting updates; called from the bot's event loop"""
+        self.loop = loop
+
+    def detach(self):
+        """Stop accepting updates (the endpoint answers 503 until attached again)"""
+        self.loop = None
+
+    def backlog(self) -> int:
+        """Updates accepted and not yet finished: queued, waiting for their user's turn or running"""
+        finished = getattr(self.application.update_processor, 'finished', None)
+        if finished is None:
+            # PTB awaits each update before taking the next, so the queue is the backlog
+            return self.application.update_queue.qsize()
+        return self.accepted - finished
+
+    def _offer(self, update: Update) -> str:
+        # Runs on the event loop, so the dedupe window and counters need no lock
+        if update.update_id in self.deduper:
+            return 'duplicate'
+        if self.backlog() >= self.max_backlog:
+            # Not remembered: Telegram's retry of this update must get through
+            return 'busy'
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return 'busy'
+        self.accepted += 1
+        self.deduper.add(update.update_id)
+        return 'accepted'
+
+    def submit(self, payload: dict) -> str:
+        """Queue one update from any thread: 'accepted', 'duplicate', 'busy' or 'unavailable'"""
+        loop = self.loop
+        if loop is None:
+            return 'unavailable'
+        # Parse here so the event loop only does the queue handoff
+        update = Update.de_json(payload, self.application.bot)
+
+        async def offer():
+            return self._offer(update)
+
+        try:
+            return asyncio.run_coroutine_threadsafe(offer(), loop).result(self.timeout)
+        except Exception as e:
+            print(f"Error queueing webhook update: {e}")
+            return 'unavailable'
+
+    def handle_request(self):
+        """Flask view for WEBHOOK_PATH"""
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            self.stats['forbidden'] += 1
+            return jsonify({'ok': False, 'error': 'forbidden'}), 403
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or not isinstance(payload.get('update_id'), int):
+            self.stats['malformed'] += 1
+            return jsonify({'ok': False, 'error': 'malformed update'}), 400
+
+        result = self.submit(payload)
+        self.stats[result] += 1
+        if result in ('accepted', 'duplicate'):
+            return jsonify({'ok': True}), 200
+        # Telegram keeps the update and retries, backing off while we answer 5xx
+        return jsonify({'ok': False, 'error': result}), 503, {'Retry-After': '1'}
+
+    def register(self, flask_app, path: str = None):
+        """Add the webhook endpoint to the dashboard app (before it starts serving)"""
+        flask_app.add_url_rule(path or config.WEBHOOK_PATH, 'telegram_webhook',
+                               self.handle_request, methods=['POST'])
+
+
+def webhook_url() -> str:
+    """Public URL Telegram should POST updates to"""
+    base = config.WEBHOOK_URL or config.DASHBOARD_URL
+    return f"{base.rstrip('/')}/{config.WEBHOOK_PATH.lstrip('/')}"
+
+
+async def serve_webhook(application, ingress: WebhookIngress, stop: asyncio.Event = None,
+                        register: bool = True):
+    """Run the Application on webhook updates until `stop` is set
+
+    With register=False the webhook is not (re)set with Telegram, for local runs
+    where updates come from a fake poster.
+    """
+    stop = stop or asyncio.Event()
+    await application.initialize()
+    try:
+        if register:
+            await application.bot.set_webhook(
+                url=webhook_url(),
+                secret_token=ingress.secret,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook set to {webhook_url()}")
+        await application.start()
+        ingress.attach(asyncio.get_running_loop())
+        try:
+            await stop.wait()
+        finally:
+            ingress.detach()
+            await application.stop()
+            # run_polling() calls this hook itself; here it is up to us
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()